@@ -6,17 +6,20 @@ from . import analyses1
 Timeseries.add_analyses(analyses1)
 
 from .nsim import (
-        Model, ODEModel, ItoModel, StratonovichModel, NetworkModel,
-        DelayItoModel, Simulation, MultipleSim, RepeatedSim, ParameterSim,
-        newmodel, newsim, DistTimeseries, Error, SimTypeError, SimValueError)
+        Model, ODEModel, ItoModel, StratonovichModel, DDEModel, NetworkModel,
+        DelayItoModel, LinearItoModel, Simulation, MultipleSim, RepeatedSim,
+        ParameterSim, AdaptiveParameterSim, ContinuationSim, newmodel,
+        newsim, DistTimeseries, Error, SimTypeError, SimValueError)
 
 from . import analysesN
 DistTimeseries.add_analyses(analyses1, vectorize=True)
 DistTimeseries.add_analyses(analysesN)
 
+from . import integrators
 from . import models
 from .readfile import (
         timeseries_from_mat, timeseries_from_file, annotations_from_file,
-        save_mat)
+        save_mat, timeseries_from_memmap)
+from .cache import ResultCache
 
 __version__ = '0.1.18'
@@ -0,0 +1,234 @@
+# Copyright 2016 Matthew J. Aburn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version. See <http://www.gnu.org/licenses/>.
+
+"""
+On-disk cache of simulation results, addressed by their content.
+
+Each result is stored under a hash of everything that determines it (the
+model class and all its parameter values, y0, T, dt, the integrator and the
+state of the model's random number generator), as a memory-mapped file of the
+kind written by `Simulation(..., filename=...)`. So a simulation that was
+already done, in any process, is opened from the cache instead of computed.
+
+Note that the hash does not cover the code of the model: after changing the
+equations of a model class, clear the cache.
+
+classes:
+  `ResultCache`  directory of cached results, with size-bounded LRU eviction
+"""
+
+from __future__ import absolute_import
+from .readfile import _create_memmap, _open_memmap
+from scipy import sparse
+import numpy as np
+import hashlib
+import inspect
+import numbers
+import os
+import pickle
+
+
+class ResultCache(object):
+    """A directory holding simulation results, each in a memory-mapped file
+    named by the hash of what was simulated. When the files in the directory
+    exceed `max_bytes` in total, the least recently used results are deleted.
+
+    Attributes:
+      directory (str): where the results are kept. (To share the cache with
+        simulations on remote compute engines, this must be on storage that
+        the engines can reach.)
+      max_bytes (int): maximum total size of the cached results
+    """
+    def __init__(self, directory, max_bytes=2**30):
+        """
+        Args:
+          directory (str): where to keep the results. Created if needed.
+          max_bytes (int, optional): maximum total size of the cache in bytes
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, *parts):
+        """Hash of the content of any number of objects (models, arrays,
+        numbers, functions...), to address a result in the cache"""
+        h = hashlib.sha1()
+        for part in parts:
+            _digest(part, h, set())
+        return h.hexdigest()
+
+    def get(self, key):
+        """Open a cached result, marking it as recently used.
+
+        Returns:
+          (ar, info, state) where ar is a read-only np.memmap of the results,
+          info is the metadata (see `nsim.readfile.timeseries_from_memmap`)
+          and state is the object that was stored with them. Or None if the
+          key is not in the cache.
+        """
+        path = self._path(key)
+        if not (os.path.isfile(path) and os.path.isfile(path + '.json')):
+            return None
+        try:
+            ar, info = _open_memmap(path, 'r')
+            with open(path + '.state', 'rb') as f:
+                state = pickle.load(f)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError, EOFError):
+            return None # was evicted meanwhile
+        return ar, info, state
+
+    def put(self, key, ar, t0, dt, labels, state=None):
+        """Store results of evenly spaced time points under a key, then evict
+        old results if the cache has grown too large.
+
+        Args:
+          key (str): as made by `key()`
+          ar (array): the results, with time along axis 0
+          t0 (Number): time of the first point
+          dt (Number): time step between points
+          labels (list): axis labels of the results
+          state (optional): any other picklable object to keep with them
+        """
+        path = self._path(key)
+        # write under a temporary name, so no process sees a partial result
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        out = _create_memmap(tmp, ar.shape, ar.dtype, t0, dt, labels)
+        out[:] = ar
+        out.flush()
+        del out
+        with open(tmp + '.state', 'wb') as f:
+            pickle.dump(state, f, protocol=2)
+        os.rename(tmp + '.state', path + '.state')
+        os.rename(tmp + '.json', path + '.json')
+        os.rename(tmp, path)
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Delete the least recently used results until the cache is no
+        larger than max_bytes (but never the result with key `keep`)"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.dat'):
+                continue
+            key = name[:-4]
+            path = self._path(key)
+            try:
+                size = sum(os.path.getsize(path + ext) for
+                           ext in ('', '.json', '.state'))
+                entries.append((os.path.getmtime(path), key, size))
+            except OSError:
+                continue
+            total += size
+        for mtime, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key != keep:
+                self._remove(key)
+                total -= size
+
+    def clear(self):
+        """Delete all cached results"""
+        for name in os.listdir(self.directory):
+            if name.endswith('.dat'):
+                self._remove(name[:-4])
+
+    def _remove(self, key):
+        path = self._path(key)
+        for ext in ('', '.json', '.state'):
+            try:
+                os.remove(path + ext)
+            except OSError:
+                pass
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.dat')
+
+    def __repr__(self):
+        return '%s(%r, max_bytes=%d)' % (self.__class__.__name__,
+                                         self.directory, self.max_bytes)
+
+
+def _digest(obj, h, seen):
+    """Update hash h with the content of obj. Objects are hashed by their
+    type and public attributes (skipping properties and methods, which are
+    derived from the others), so a model is identified by its class and
+    parameter values. Functions are identified by their qualified name and,
+    for functions written in Python, their code, default arguments and the
+    values of the variables they enclose (so that two lambdas differ). Global
+    variables that a function refers to are not hashed."""
+    if obj is None or isinstance(obj, (bool, numbers.Number, str, bytes)):
+        _update(h, '%s:%r;' % (type(obj).__name__, obj))
+    elif isinstance(obj, np.ndarray):
+        _update(h, 'ndarray:%s:%s;' % (obj.dtype.str, obj.shape))
+        if obj.dtype.hasobject:
+            for item in obj.flat:
+                _digest(item, h, seen)
+        else:
+            h.update(np.ascontiguousarray(obj).tobytes())
+    elif sparse.issparse(obj):
+        m = sparse.csr_matrix(obj)
+        _update(h, 'sparse:%s;' % (m.shape,))
+        for part in (m.data, m.indices, m.indptr):
+            _digest(part, h, seen)
+    elif isinstance(obj, np.random.Generator):
+        _update(h, 'Generator;')
+        _digest(obj.bit_generator.state, h, seen)
+    elif isinstance(obj, dict):
+        _update(h, 'dict:%d;' % len(obj))
+        for k in sorted(obj, key=repr):
+            _digest(k, h, seen)
+            _digest(obj[k], h, seen)
+    elif isinstance(obj, (list, tuple, range)):
+        _update(h, '%s:%d;' % (type(obj).__name__, len(obj)))
+        for item in obj:
+            _digest(item, h, seen)
+    elif isinstance(obj, type) or inspect.isroutine(obj):
+        _update(h, 'routine:%s.%s;' % (
+                getattr(obj, '__module__', None),
+                getattr(obj, '__qualname__', getattr(obj, '__name__', obj))))
+        if inspect.isfunction(obj):
+            if id(obj) in seen:
+                return
+            seen.add(id(obj))
+            _digest(obj.__code__, h, seen)
+            _digest(obj.__defaults__, h, seen)
+            _digest(obj.__kwdefaults__, h, seen)
+            for cell in obj.__closure__ or ():
+                try:
+                    _digest(cell.cell_contents, h, seen)
+                except ValueError: # cell not yet assigned
+                    _update(h, 'emptycell;')
+    elif inspect.iscode(obj):
+        _update(h, 'code;')
+        h.update(obj.co_code)
+        _digest(obj.co_consts, h, seen)
+        _digest(obj.co_names, h, seen)
+    elif hasattr(obj, '__dict__'):
+        if id(obj) in seen:
+            _update(h, 'cycle;')
+            return
+        seen.add(id(obj))
+        cls = type(obj)
+        _update(h, 'object:%s.%s;' % (cls.__module__, cls.__name__))
+        for name in dir(obj):
+            if (name.startswith('_') or
+                    isinstance(getattr(cls, name, None), property)):
+                continue
+            value = getattr(obj, name)
+            if inspect.ismethod(value):
+                continue
+            _update(h, name)
+            _digest(value, h, seen)
+    else:
+        _update(h, '%s:%r;' % (type(obj).__name__, obj))
+
+
+def _update(h, text):
+    h.update(text.encode('utf-8'))
@@ -0,0 +1,1137 @@
+# Copyright 2016 Matthew J. Aburn
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version. See <http://www.gnu.org/licenses/>.
+
+"""
+Fixed-step numerical integration algorithms for ODE and SDE systems.
+
+These accept the same arguments as the sdeint library, so any of them can be
+given as the `integrator` argument of a Simulation, e.g.
+  Simulation(model, integrator=nsim.integrators.itoEuler)
+
+The output array is allocated once at the start, Wiener increments are drawn
+in large blocks rather than once per time step, and the intermediate results
+of each step are written into scratch buffers that are reused across steps.
+
+The initial state y0 can be an array of shape (d,) for a single trajectory, or
+of shape (d, n) to integrate n realizations at once. In the batch case the
+functions f and G must accept a state of shape (d, n) and return arrays of
+shape (d, n) and (d, m, n) respectively (a G of shape (d, m) that does not vary
+between realizations is also fine). The result has shape (len(tspan),) +
+y0.shape, so axis 0 is time and the realizations range along the last axis.
+
+Delay equations take the delays as an extra argument, and keep the recent
+history of the state in a `DelayBuffer`.
+
+For a single trajectory, G may also return a `BlockDiagonal` noise matrix,
+which is multiplied by the Wiener increments block by block without ever
+forming the dense (d, m) matrix.
+
+The SDE algorithms also take a `noise` argument declaring the structure of G:
+  'general'  G(y, t) returns the (d, m) matrix as above (the default)
+  'additive'  G does not depend on y or t, so it is evaluated only once
+  'diagonal'  G(y, t) returns only the diagonal of a (d, d) matrix, an array
+    of shape (d,) (or (d, n) for a batch), that multiplies dW elementwise.
+    Each element G_i must depend on the state only through y_i (so each
+    variable has its own noise), which `itoSRI2` exploits.
+
+and an `rng` argument: a numpy.random.Generator to draw the random numbers
+from, for reproducible results. For a batch, this may instead be a sequence
+of n Generators, one for each realization. Realization i then receives the
+same Wiener increments as a single trajectory integrated with Generator i,
+however the time span is split into blocks. If rng is None, numpy's global
+random state is used. `itoSRI2` also takes `levy_rng`, a separate Generator
+(or sequence) for the random numbers of the Levy areas, so that the Wiener
+increments drawn from rng are the same as for the other algorithms.
+
+classes:
+  `DelayBuffer`  ring buffer of recent history, for systems with delays
+  `BlockDiagonal`  block diagonal noise coefficient matrix
+
+functions:
+  `odeint()`  ODE integration by scipy LSODA, with batch support
+  `bdf()`  stiff ODE integration by implicit BDF, with sparse Jacobians
+  `radau()`  stiff ODE integration by implicit Radau IIA, with sparse Jacobians
+  `itoEuler()`  Euler-Maruyama algorithm for Ito equations
+  `itoSRI2()`  Roessler2010 order 1.0 strong Stochastic Runge-Kutta for Ito
+  `stratHeun()`  Stratonovich Heun algorithm for Stratonovich equations
+  `ddeRK4()`  classical Runge-Kutta algorithm for delay differential equations
+  `itoEulerDelay()`  Euler-Maruyama algorithm for Ito delay equations
+  `itoLinear()`  exact solution of linear Ito equations with additive noise
+"""
+
+from __future__ import absolute_import
+from scipy import integrate
+import scipy.linalg
+import sdeint
+import numpy as np
+import numbers
+
+# Wiener increments are generated in blocks of about this many numbers
+block_size = 2**18
+
+
+def odeint(f, y0, tspan, jac=None, jac_sparsity=None):
+    """Integrate the ODE system dy/dt = f(y, t) using scipy odeint (LSODA).
+
+    A batch of states of shape (d, n) is integrated as one flattened system.
+
+    Args:
+      f: callable(y, t) returning array of the same shape as y
+      y0 (array of shape (d,) or (d, n)): initial state
+      tspan (array): the sequence of time points to integrate over
+      jac (callable(y, t), optional): Jacobian matrix of f, array (d, d)
+        (or a scipy.sparse matrix, which is converted). Used for a single
+        trajectory only. If None, LSODA estimates it by finite differences.
+      jac_sparsity: not used by LSODA (accepted for compatibility with bdf)
+
+    Returns:
+      y: array of shape (len(tspan),) + y0.shape
+    """
+    y0 = np.asarray(y0)
+    if y0.ndim < 2:
+        if jac is None:
+            return integrate.odeint(f, y0, tspan)
+        return integrate.odeint(f, y0, tspan, Dfun=_dense_jac(jac))
+    shape = y0.shape
+    def flat_f(yflat, t):
+        res = np.empty(shape)
+        res[...] = f(yflat.reshape(shape), t)
+        return res.ravel()
+    ar = integrate.odeint(flat_f, y0.ravel(), tspan)
+    return ar.reshape((len(tspan),) + shape)
+
+
+def bdf(f, y0, tspan, jac=None, jac_sparsity=None):
+    """Integrate a stiff ODE system dy/dt = f(y, t) using the implicit
+    variable order BDF method of scipy.integrate.solve_ivp.
+
+    Giving the Jacobian, or at least its sparsity pattern, saves estimating
+    it by many extra evaluations of f. For a large sparsely coupled system
+    (such as a NetworkModel) a sparse Jacobian also makes the linear algebra
+    sparse.
+
+    Args:
+      f: callable(y, t) returning array of the same shape as y
+      y0 (array of shape (d,) or (d, n)): initial state
+      tspan (array): the sequence of time points at which to output y
+      jac (callable(y, t), optional): Jacobian matrix of f, either an array of
+        shape (d, d) or a scipy.sparse matrix. Used for a single trajectory
+        only.
+      jac_sparsity (array or scipy.sparse matrix of shape (d, d), optional):
+        which entries of the Jacobian can be nonzero, so that it can be
+        estimated by finite differences with few evaluations of f. Used if
+        jac is not given.
+
+    Returns:
+      y: array of shape (len(tspan),) + y0.shape
+    """
+    return _solve_ivp('BDF', f, y0, tspan, jac, jac_sparsity)
+
+
+def radau(f, y0, tspan, jac=None, jac_sparsity=None):
+    """Integrate a stiff ODE system dy/dt = f(y, t) using the implicit
+    Runge-Kutta method Radau IIA of order 5, from scipy.integrate.solve_ivp.
+
+    Arguments and return value are as for bdf().
+    """
+    return _solve_ivp('Radau', f, y0, tspan, jac, jac_sparsity)
+
+
+def _solve_ivp(method, f, y0, tspan, jac, jac_sparsity):
+    """Use scipy solve_ivp with the given method, at the same tolerances as
+    scipy odeint. A batch of states is integrated as one flattened system."""
+    y0 = np.asarray(y0, dtype=np.float64)
+    shape = y0.shape
+    def fun(t, y):
+        return np.ravel(f(y.reshape(shape), t))
+    options = dict(method=method, t_eval=tspan, rtol=1.49012e-8,
+                   atol=1.49012e-8)
+    if y0.ndim < 2:
+        if jac is not None:
+            options['jac'] = lambda t, y: jac(y, t)
+        elif jac_sparsity is not None:
+            options['jac_sparsity'] = jac_sparsity
+    sol = integrate.solve_ivp(fun, (tspan[0], tspan[-1]), y0.ravel(),
+                              **options)
+    if not sol.success:
+        raise RuntimeError('%s integration failed: %s' % (method, sol.message))
+    return sol.y.T.reshape((len(tspan),) + shape)
+
+
+def _dense_jac(jac):
+    """Wrap a Jacobian function that may return a scipy.sparse matrix"""
+    def dense_jac(y, t):
+        J = jac(y, t)
+        return J.toarray() if hasattr(J, 'toarray') else J
+    return dense_jac
+
+
+def itoEuler(f, G, y0, tspan, dW=None, noise='general', rng=None):
+    """Use the Euler-Maruyama algorithm to integrate the Ito equation
+    dy = f(y,t)dt + G(y,t) dW
+
+    where y is the d-dimensional state vector, f is a vector-valued function,
+    G is an d x m matrix-valued function giving the noise coefficients and
+    dW(t) = (dW_1, dW_2, ... dW_m) is a vector of independent Wiener increments
+
+    Args:
+      f: callable(y, t) returning (d,) array (or (d, n) for a batch)
+      G: callable(y, t) returning (d,m) array (or (d, m, n) for a batch)
+      y0 (array of shape (d,) or (d, n)): initial state
+      tspan (array): the sequence of time points to integrate over. Time steps
+        must be equally spaced.
+      dW (array of shape (len(tspan)-1, m) or (len(tspan)-1, m, n), optional):
+        Wiener increments to use. If None, these are generated in blocks.
+      noise (str, optional): structure of G: 'general', 'additive' or
+        'diagonal' (see module docstring)
+      rng (numpy.random.Generator, optional): source of the random numbers
+        (see module docstring). If None, numpy's global random state is used.
+
+    Returns:
+      y: array of shape (len(tspan),) + y0.shape
+    """
+    f, G, y0, h, m, dot = _check_args(f, G, y0, tspan, noise)
+    N = len(tspan)
+    y = np.empty((N,) + y0.shape, dtype=y0.dtype)
+    y[0] = y0
+    Gdw = np.empty(y0.shape, dtype=_noise_dtype(G(y0, tspan[0]), h))
+    n = 0
+    for dWblock in _wiener_blocks(dW, N - 1, m, h, y0.shape[1:],
+                                  rng):
+        for dWn in dWblock:
+            tn = tspan[n]
+            yn = y[n]
+            yn1 = y[n+1]
+            np.multiply(f(yn, tn), h, out=yn1)
+            yn1 += yn
+            yn1 += dot(G(yn, tn), dWn, Gdw)
+            n += 1
+    return y
+
+
+def itoSRI2(f, G, y0, tspan, dW=None, noise='general', rng=None,
+            levy_rng=None):
+    """Use the Roessler2010 order 1.0 strong Stochastic Runge-Kutta algorithm
+    SRI2 to integrate the Ito equation  dy = f(y,t)dt + G(y,t) dW
+
+    where y is the d-dimensional state vector, f is a vector-valued function,
+    G is an d x m matrix-valued function giving the noise coefficients and
+    dW(t) = (dW_1, dW_2, ... dW_m) is a vector of independent Wiener increments
+
+    The repeated Ito integrals are approximated by the method of Kloeden,
+    Platen and Wright (1992) via sdeint.Ikpw, generated a block at a time.
+    Each step evaluates G at 2m + 1 points. (For additive noise those terms
+    vanish, so the repeated integrals are not needed and G is not evaluated.
+    For diagonal noise only the integrals I_kk = (dW_k**2 - h)/2 are needed,
+    and the diagonal of G is evaluated elementwise at 3 points per step. If
+    G returns a BlockDiagonal matrix, only the integrals within each block
+    are needed, and G is evaluated at 2mb + 1 points, where mb is the largest
+    number of columns of a block. It is never formed as a dense matrix.)
+
+    Args:
+      f: callable(y, t) returning (d,) array (or (d, n) for a batch)
+      G: callable(y, t) returning (d,m) array (or (d, m, n) for a batch)
+      y0 (array of shape (d,) or (d, n)): initial state
+      tspan (array): the sequence of time points to integrate over. Time steps
+        must be equally spaced.
+      dW (array of shape (len(tspan)-1, m) or (len(tspan)-1, m, n), optional):
+        Wiener increments to use. If None, these are generated in blocks.
+      noise (str, optional): structure of G: 'general', 'additive' or
+        'diagonal' (see module docstring)
+      rng (numpy.random.Generator, optional): source of the random numbers
+        (see module docstring). If None, numpy's global random state is used.
+      levy_rng (numpy.random.Generator, optional): source of the random
+        numbers for the Levy areas. If None, rng is used for these too.
+
+    Returns:
+      y: array of shape (len(tspan),) + y0.shape
+
+    See also:
+      A. Roessler (2010) Runge-Kutta Methods for the Strong Approximation of
+        Solutions of Stochastic Differential Equations
+    """
+    f, G, y0, h, m, dot = _check_args(f, G, y0, tspan, noise)
+    additive = (noise == 'additive')
+    diagonal = (noise == 'diagonal')
+    G0 = G(y0, tspan[0])
+    blockwise = (noise == 'general' and isinstance(G0, BlockDiagonal))
+    if blockwise:
+        mb = max([0] + [b.shape[1] for b in G0.blocks])
+    elif not additive and not diagonal:
+        G = _dense_noise(G) # this scheme needs the individual columns of G
+    if levy_rng is None:
+        levy_rng = rng
+    N = len(tspan)
+    batch = y0.shape[1:]
+    sqrth = np.sqrt(h)
+    y = np.empty((N,) + y0.shape, dtype=y0.dtype)
+    y[0] = y0
+    Gdw = np.empty(y0.shape, dtype=_noise_dtype(G0, h))
+    H20 = np.empty(y0.shape, dtype=y0.dtype)
+    n = 0
+    for dWblock in _wiener_blocks(dW, N - 1, m, h, batch, rng):
+        if additive or diagonal:
+            Iblock = [None] * len(dWblock)
+        elif blockwise:
+            Iblock = _block_ito_integrals(G0, dWblock, h, levy_rng)
+        else:
+            Iblock = _repeated_ito_integrals(dWblock, h, levy_rng)
+        for dWn, Iij in zip(dWblock, Iblock):
+            tn = tspan[n]
+            tn1 = tspan[n+1]
+            yn = y[n]
+            yn1 = y[n+1]
+            Gn = G(yn, tn)
+            fnh = f(yn, tn)*h
+            np.add(yn, fnh, out=H20)
+            np.multiply(fnh + f(H20, tn1)*h, 0.5, out=yn1)
+            yn1 += yn
+            yn1 += dot(Gn, dWn, Gdw)
+            n += 1
+            if additive:
+                continue
+            if diagonal:
+                # the kth stage of SRI2 moves only component k, so all the
+                # stages are evaluated together
+                sum1 = Gn*(0.5*(dWn*dWn - h)/sqrth)
+                yn1 += 0.5*sqrth*(G(H20 + sum1, tn1) - G(H20 - sum1, tn1))
+                continue
+            if blockwise:
+                # the jth stages of all blocks are evaluated together, as
+                # each block of G depends only on the variables of its block
+                for j in range(mb):
+                    stage = _block_stage(Gn, Iij, j)/sqrth
+                    yn1 += 0.5*sqrth*(_block_column(G(H20 + stage, tn1), j) -
+                                      _block_column(G(H20 - stage, tn1), j))
+                continue
+            sum1 = np.einsum('ij...,jk...->ik...', Gn, Iij)/sqrth # (d, m, ..)
+            H2 = H20[:, np.newaxis] + sum1
+            H3 = H20[:, np.newaxis] - sum1
+            for k in range(0, m):
+                diff = G(H2[:, k], tn1)[:, k] - G(H3[:, k], tn1)[:, k]
+                if diff.ndim < yn1.ndim:
+                    # G does not vary between realizations of the batch
+                    diff = diff[:, np.newaxis]
+                yn1 += 0.5*sqrth*diff
+    return y
+
+
+def stratHeun(f, G, y0, tspan, dW=None, noise='general', rng=None):
+    r"""Use the Stratonovich Heun algorithm to integrate Stratonovich equation
+    dy = f(y,t)dt + G(y,t) \circ dW(t)
+
+    where y is the d-dimensional state vector, f is a vector-valued function,
+    G is an d x m matrix-valued function giving the noise coefficients and
+    dW(t) = (dW_1, dW_2, ... dW_m) is a vector of independent Wiener increments
+
+    Args:
+      f: callable(y, t) returning (d,) array (or (d, n) for a batch)
+      G: callable(y, t) returning (d,m) array (or (d, m, n) for a batch)
+      y0 (array of shape (d,) or (d, n)): initial state
+      tspan (array): the sequence of time points to integrate over. Time steps
+        must be equally spaced.
+      dW (array of shape (len(tspan)-1, m) or (len(tspan)-1, m, n), optional):
+        Wiener increments to use. If None, these are generated in blocks.
+      noise (str, optional): structure of G: 'general', 'additive' or
+        'diagonal' (see module docstring)
+      rng (numpy.random.Generator, optional): source of the random numbers
+        (see module docstring). If None, numpy's global random state is used.
+
+    Returns:
+      y: array of shape (len(tspan),) + y0.shape
+    """
+    f, G, y0, h, m, dot = _check_args(f, G, y0, tspan, noise)
+    additive = (noise == 'additive')
+    N = len(tspan)
+    y = np.empty((N,) + y0.shape, dtype=y0.dtype)
+    y[0] = y0
+    dtype = _noise_dtype(G(y0, tspan[0]), h)
+    Gdw = np.empty(y0.shape, dtype=dtype)
+    Gdwbar = np.empty(y0.shape, dtype=dtype)
+    ybar = np.empty(y0.shape, dtype=y0.dtype)
+    n = 0
+    for dWblock in _wiener_blocks(dW, N - 1, m, h, y0.shape[1:],
+                                  rng):
+        for dWn in dWblock:
+            tn = tspan[n]
+            tn1 = tspan[n+1]
+            yn = y[n]
+            yn1 = y[n+1]
+            fnh = f(yn, tn)*h
+            dot(G(yn, tn), dWn, Gdw)
+            np.add(yn, fnh, out=ybar)
+            ybar += Gdw
+            fnh += f(ybar, tn1)*h
+            if additive:
+                # G is constant, so both noise terms are the same
+                fnh += 2.0*Gdw
+            else:
+                dot(G(ybar, tn1), dWn, Gdwbar)
+                fnh += Gdw
+                fnh += Gdwbar
+            np.multiply(fnh, 0.5, out=yn1)
+            yn1 += yn
+            n += 1
+    return y
+
+
+def ddeRK4(f, y0, tspan, delays, buffer=None):
+    """Use the classical 4th order Runge-Kutta algorithm to integrate the
+    delay differential equation system  dy/dt = f(y, t, ylag)
+
+    where ylag[k] is the delayed state y(t - delays[k]). Delayed states are
+    read from a ring buffer of the recent history by cubic Hermite
+    interpolation between time steps, using the derivatives already computed
+    at each step, which preserves the order of the method.
+
+    Args:
+      f: callable(y, t, ylag) returning (d,) array (or (d, n) for a batch),
+        where ylag is an array of shape (len(delays),) + y.shape
+      y0 (array of shape (d,) or (d, n)): state at time tspan[0]
+      tspan (array): the sequence of time points to integrate over. Time steps
+        must be equally spaced and no longer than the shortest delay.
+      delays (sequence of float): the time delays, each at least one time step
+      buffer (DelayBuffer, optional): history of the system up to tspan[0],
+        to continue an earlier integration. It is updated as the integration
+        proceeds. If None, the history is taken to be constant, equal to y0.
+
+    Returns:
+      y: array of shape (len(tspan),) + y0.shape
+    """
+    y0, h, delays = _check_delay_args(y0, tspan, delays)
+    if buffer is None:
+        buffer = DelayBuffer(y0, tspan[0], h, max(delays))
+    N = len(tspan)
+    y = np.empty((N,) + y0.shape, dtype=y0.dtype)
+    y[0] = y0
+    ylag = np.empty((len(delays),) + y0.shape)
+    ytmp = np.empty(y0.shape)
+    def lags(t):
+        for k, tau in enumerate(delays):
+            buffer.lag(t - tau, ylag[k])
+        return ylag
+    for n in range(N - 1):
+        tn = tspan[n]
+        yn = y[n]
+        k1 = f(yn, tn, lags(tn))
+        buffer.set_derivative(k1)
+        np.multiply(k1, 0.5*h, out=ytmp)
+        ytmp += yn
+        k2 = f(ytmp, tn + 0.5*h, lags(tn + 0.5*h))
+        np.multiply(k2, 0.5*h, out=ytmp)
+        ytmp += yn
+        k3 = f(ytmp, tn + 0.5*h, lags(tn + 0.5*h))
+        np.multiply(k3, h, out=ytmp)
+        ytmp += yn
+        k4 = f(ytmp, tn + h, lags(tn + h))
+        y[n+1] = yn + (h/6.0)*(k1 + 2.0*k2 + 2.0*k3 + k4)
+        buffer.push(y[n+1], tspan[n+1])
+    return y
+
+
+def itoEulerDelay(f, G, y0, tspan, delays, buffer=None, dW=None,
+                  noise='general', rng=None):
+    """Use the Euler-Maruyama algorithm to integrate the Ito stochastic delay
+    differential equation system  dy = f(y, t, ylag)dt + G(y, t) dW
+
+    where ylag[k] is the delayed state y(t - delays[k]). Delayed states are
+    read from a ring buffer of the recent history, by linear interpolation
+    between time steps.
+
+    Args:
+      f: callable(y, t, ylag) returning (d,) array (or (d, n) for a batch),
+        where ylag is an array of shape (len(delays),) + y.shape
+      G: callable(y, t) returning (d,m) array (or (d, m, n) for a batch)
+      y0 (array of shape (d,) or (d, n)): state at time tspan[0]
+      tspan (array): the sequence of time points to integrate over. Time steps
+        must be equally spaced and no longer than the shortest delay.
+      delays (sequence of float): the time delays, each at least one time step
+      buffer (DelayBuffer, optional): history of the system up to tspan[0],
+        to continue an earlier integration. It is updated as the integration
+        proceeds. If None, the history is taken to be constant, equal to y0.
+      dW (array of shape (len(tspan)-1, m) or (len(tspan)-1, m, n), optional):
+        Wiener increments to use. If None, these are generated in blocks.
+      noise (str, optional): structure of G: 'general', 'additive' or
+        'diagonal' (see module docstring)
+      rng (numpy.random.Generator, optional): source of the random numbers
+        (see module docstring). If None, numpy's global random state is used.
+
+    Returns:
+      y: array of shape (len(tspan),) + y0.shape
+    """
+    y0, h, delays = _check_delay_args(y0, tspan, delays)
+    G, G0, m, dot = _check_noise(G, y0, tspan[0], noise)
+    if buffer is None:
+        buffer = DelayBuffer(y0, tspan[0], h, max(delays), hermite=False)
+    N = len(tspan)
+    y = np.empty((N,) + y0.shape, dtype=y0.dtype)
+    y[0] = y0
+    ylag = np.empty((len(delays),) + y0.shape)
+    Gdw = np.empty(y0.shape, dtype=_noise_dtype(G0, h))
+    # each delay is always the same number of time steps back
+    back, frac = buffer.steps_back(delays, y0.ndim)
+    n = 0
+    for dWblock in _wiener_blocks(dW, N - 1, m, h, y0.shape[1:],
+                                  rng):
+        for dWn in dWblock:
+            tn = tspan[n]
+            yn = y[n]
+            yn1 = y[n+1]
+            buffer.lags(back, frac, ylag)
+            np.multiply(f(yn, tn, ylag), h, out=yn1)
+            yn1 += yn
+            yn1 += dot(G(yn, tn), dWn, Gdw)
+            buffer.push(yn1, tspan[n+1])
+            n += 1
+    return y
+
+
+def itoLinear(A, B, y0, tspan, c=None, transition=None, rng=None):
+    """Integrate the linear Ito equation  dy = (A.dot(y) + c)dt + B dW
+    exactly, by its transition over each time step h:
+
+    y(t+h) = expm(A h).dot(y(t)) + drift + xi,  xi ~ N(0, Q)
+
+    where Q is the exact covariance of the noise accumulated over the step.
+    These are computed once (see `_linear_transition`), so each step is one
+    matrix-vector product and one correlated normal draw, with no
+    discretization error however large the time step.
+
+    For a batch of n realizations, A, B and c may also differ between the
+    realizations, given as arrays of shape (d, d, n), (d, m, n) and (d, n).
+
+    Args:
+      A (array of shape (d, d)): drift matrix
+      B (array of shape (d, m)): noise coefficient matrix
+      y0 (array of shape (d,) or (d, n)): initial state
+      tspan (array): the sequence of time points to integrate over. Time steps
+        must be equally spaced.
+      c (array of shape (d,), optional): constant drift term
+      transition (tuple, optional): the result of _linear_transition(A, B, h,
+        c), if already computed for this time step.
+      rng (numpy.random.Generator, optional): source of the random numbers
+        (see module docstring). If None, numpy's global random state is used.
+
+    Returns:
+      y: array of shape (len(tspan),) + y0.shape
+    """
+    if not np.isclose(min(np.diff(tspan)), max(np.diff(tspan))):
+        raise ValueError('Currently time steps must be equally spaced.')
+    y0 = np.asarray(y0, dtype=np.float64)
+    h = (tspan[len(tspan)-1] - tspan[0])/(len(tspan) - 1)
+    if transition is None:
+        transition = _linear_transition(A, B, h, c)
+    Phi, drift, L = transition
+    if Phi.shape[0] != y0.shape[0]:
+        raise ValueError('A should have shape (%d, %d)' % (y0.shape[0],
+                                                            y0.shape[0]))
+    if drift.ndim < y0.ndim:
+        drift = drift.reshape(drift.shape + (1,)*(y0.ndim - drift.ndim))
+    N = len(tspan)
+    y = np.empty((N,) + y0.shape)
+    y[0] = y0
+    n = 0
+    # standard normal draws, a block at a time
+    for zblock in _wiener_blocks(None, N - 1, L.shape[1], 1.0, y0.shape[1:],
+                                 rng):
+        noise = np.einsum('ij...,kj...->ki...', L, zblock)
+        noise += drift
+        for xi in noise:
+            if Phi.ndim == 2:
+                np.dot(Phi, y[n], out=y[n+1])
+            else:
+                np.einsum('ij...,j...->i...', Phi, y[n], out=y[n+1])
+            y[n+1] += xi
+            n += 1
+    return y
+
+
+def _linear_transition(A, B, h, c=None):
+    """Exact transition over a time step h of the linear Ito system
+    dy = (A.dot(y) + c)dt + B dW, using the method of Van Loan (1978).
+
+    Returns:
+      (Phi, drift, L) where Phi = expm(A h), drift is the contribution of c
+      and L.dot(L.T) is the covariance of the noise accumulated over the step
+      (with a trailing axis of length n if A, B or c vary between n
+      realizations)
+    """
+    A = np.atleast_2d(np.asarray(A, dtype=np.float64))
+    B = np.atleast_2d(np.asarray(B, dtype=np.float64))
+    if c is not None:
+        c = np.asarray(c, dtype=np.float64)
+    if A.ndim > 2 or B.ndim > 2 or (c is not None and c.ndim > 1):
+        # a separate transition for each realization
+        n = max(A.shape[2:] + B.shape[2:] + ((c.shape[1],) if
+                c is not None and c.ndim > 1 else ()))
+        A = np.broadcast_to(A.reshape(A.shape[:2] + (-1,)),
+                            A.shape[:2] + (n,))
+        B = np.broadcast_to(B.reshape(B.shape[:2] + (-1,)),
+                            B.shape[:2] + (n,))
+        if c is not None:
+            c = np.broadcast_to(c.reshape(c.shape[:1] + (-1,)),
+                                c.shape[:1] + (n,))
+        each = [_linear_transition(A[..., k], B[..., k], h,
+                                   None if c is None else c[:, k]) for
+                k in range(n)]
+        return tuple(np.stack(parts, axis=-1) for parts in zip(*each))
+    d = A.shape[0]
+    if A.shape != (d, d) or B.shape[0] != d:
+        raise ValueError('A should be square and B should have shape (%d, m)'
+                         % d)
+    M = np.zeros((2*d, 2*d))
+    M[:d, :d] = -A
+    M[:d, d:] = B.dot(B.T)
+    M[d:, d:] = A.T
+    F = scipy.linalg.expm(M*h)
+    Phi = F[d:, d:].T
+    Q = Phi.dot(F[:d, d:])
+    Q = 0.5*(Q + Q.T)
+    if c is None:
+        drift = np.zeros(d)
+    else:
+        K = np.zeros((d + 1, d + 1))
+        K[:d, :d] = A
+        K[:d, d] = c
+        drift = scipy.linalg.expm(K*h)[:d, d]
+    # Q may be singular (if the noise does not reach every variable), so
+    # take its square root by eigendecomposition rather than Cholesky
+    w, V = np.linalg.eigh(Q)
+    L = V * np.sqrt(np.clip(w, 0.0, None))
+    return Phi, drift, L
+
+
+class DelayBuffer(object):
+    """Ring buffer holding the history of a system's state at equally spaced
+    time points, just long enough to cover the maximum delay. Appending a new
+    time point overwrites the oldest one, so memory use is bounded however
+    long the integration. Delayed states are found by O(1) indexing, with
+    interpolation between time points.
+
+    Attributes:
+      t (float): time of the most recent state in the buffer
+      h (float): time step between states
+    """
+    def __init__(self, y0, t0, h, max_delay, hermite=True):
+        """Create a buffer whose history up to time t0 is constant, equal to y0
+
+        Args:
+          y0 (array): state at time t0
+          t0 (float): initial time
+          h (float): time step
+          max_delay (float): the longest delay that will be looked up
+          hermite (bool, optional): If True, interpolate between time points
+            by cubic Hermite interpolation, using the derivatives given by
+            set_derivative(). If False, use linear interpolation.
+        """
+        y0 = np.asarray(y0, dtype=np.float64)
+        self.size = int(np.ceil(max_delay / h)) + 2
+        self.h = h
+        self.t = t0
+        self.hermite = hermite
+        self._y = np.empty((self.size,) + y0.shape)
+        self._y[:] = y0
+        if hermite:
+            self._dydt = np.zeros((self.size,) + y0.shape)
+        self._head = 0 # index of the most recent state
+        self._t0 = t0
+        self._y0 = y0.copy()
+
+    @property
+    def y(self):
+        """the most recent state in the buffer"""
+        return self._y[self._head]
+
+    def push(self, y, t):
+        """Append the state y at time t (which should be t + h)"""
+        self._head = (self._head + 1) % self.size
+        self._y[self._head] = y
+        if self.hermite:
+            self._dydt[self._head] = 0.0
+        self.t = t
+
+    def set_derivative(self, dydt):
+        """Record the time derivative at the most recent state"""
+        self._dydt[self._head] = dydt
+
+    def lag(self, t, out=None):
+        """Interpolated state at an earlier time t, within the buffer"""
+        if t <= self._t0:
+            # constant initial history (the derivative is discontinuous at t0)
+            if out is None:
+                return self._y0.copy()
+            out[...] = self._y0
+            return out
+        s = max(0.0, (self.t - t) / self.h) # how many steps back in time
+        k = int(s)
+        if k >= self.size - 1:
+            raise ValueError('time %g is older than the buffer history' % t)
+        i1 = (self._head - k) % self.size
+        if s == k:
+            if out is None:
+                return self._y[i1].copy()
+            out[...] = self._y[i1]
+            return out
+        i0 = (i1 - 1) % self.size
+        theta = 1.0 - (s - k) # position in the interval [i0, i1]
+        y0 = self._y[i0]
+        y1 = self._y[i1]
+        if self.hermite:
+            th2 = theta*theta
+            th3 = th2*theta
+            res = ((2*th3 - 3*th2 + 1)*y0 + (-2*th3 + 3*th2)*y1 +
+                   self.h*((th3 - 2*th2 + theta)*self._dydt[i0] +
+                           (th3 - th2)*self._dydt[i1]))
+        else:
+            res = y0 + theta*(y1 - y0)
+        if out is None:
+            return res
+        out[...] = res
+        return out
+
+    def steps_back(self, delays, ndim):
+        """Express delays as numbers of time steps back from the most recent
+        state, for use with lags().
+
+        Args:
+          delays (array of shape (k,))
+          ndim (int): number of dimensions of the state array
+
+        Returns:
+          (back, frac) where back (array of int) is the time point at or just
+          after each delay and frac (array, or None if all delays are whole
+          numbers of time steps) is the fraction of a step further back.
+        """
+        steps = np.asarray(delays) / self.h
+        back = np.floor(steps + 1e-9)
+        frac = steps - back
+        if np.all(frac < 1e-9):
+            frac = None
+        else:
+            frac = frac.reshape((-1,) + (1,)*ndim)
+        return back.astype(int), frac
+
+    def lags(self, back, frac, out):
+        """States at several earlier times at once, by linear interpolation.
+        This is faster than calling lag() for each one, as needed at every
+        time step by a fixed step integrator.
+
+        Args:
+          back, frac: the delays, as given by steps_back()
+          out (array of shape (k,) + y.shape): array to hold the results
+        """
+        i1 = self._head - back
+        i1 %= self.size
+        np.take(self._y, i1, axis=0, out=out)
+        if frac is not None:
+            out += frac * (self._y[(i1 - 1) % self.size] - out)
+        return out
+
+    def continues(self, y0, t0):
+        """Whether the buffer ends with state y0 at time t0, so that an
+        integration starting from y0 at t0 can continue from this history"""
+        return (np.isclose(self.t, t0) and
+                np.shape(y0) == self.y.shape and np.array_equal(y0, self.y))
+
+
+class BlockDiagonal(object):
+    """A noise coefficient matrix G that is block diagonal, as for a system
+    made of k subsystems driven by independent noise. Only the blocks are
+    stored: the product with the Wiener increments is computed block by block.
+    (A function G(y, t) returning this should make each block depend on y
+    only through the variables of its own block, as `itoSRI2` assumes.)
+
+    Attributes:
+      shape (tuple): shape (d, m) of the full matrix
+      dtype (np.dtype)
+    """
+    ndim = 2
+
+    def __init__(self, blocks):
+        """
+        Args:
+          blocks: either an array of shape (k, db, mb) holding k blocks of
+            equal shape, or a sequence of k arrays of shape (db_i, mb_i).
+            (A block may have no columns, for a subsystem without noise.)
+        """
+        if isinstance(blocks, np.ndarray):
+            if blocks.ndim != 3:
+                raise ValueError('blocks should be an array of shape '
+                                 '(k, db, mb) or a sequence of 2D arrays')
+            k, db, mb = blocks.shape
+            self.shape = (k*db, k*mb)
+        else:
+            blocks = [np.asarray(b) for b in blocks]
+            if any(b.ndim != 2 for b in blocks):
+                raise ValueError('each block should be a 2D array')
+            self.shape = (sum(b.shape[0] for b in blocks),
+                          sum(b.shape[1] for b in blocks))
+        self.blocks = blocks
+        self.dtype = np.result_type(*blocks) if len(blocks) else np.float64
+
+    def dot(self, dW, out=None):
+        """Product with a vector of Wiener increments dW of shape (m,)
+
+        Args:
+          dW (array of shape (m,))
+          out (array of shape (d,), optional): array to hold the result
+
+        Returns:
+          array of shape (d,)
+        """
+        if out is None:
+            out = np.empty(self.shape[0], dtype=np.result_type(self.dtype, dW))
+        if isinstance(self.blocks, np.ndarray):
+            k, db, mb = self.blocks.shape
+            np.einsum('kij,kj->ki', self.blocks, dW.reshape((k, mb)),
+                      out=out.reshape((k, db)))
+            return out
+        row, col = 0, 0
+        for b in self.blocks:
+            db, mb = b.shape
+            if mb == 0:
+                out[row:row+db] = 0.0
+            else:
+                np.dot(b, dW[col:col+mb], out[row:row+db])
+            row += db
+            col += mb
+        return out
+
+    def toarray(self):
+        """The full matrix, as a dense array of shape (d, m)"""
+        res = np.zeros(self.shape, dtype=self.dtype)
+        if isinstance(self.blocks, np.ndarray):
+            k, db, mb = self.blocks.shape
+            i = np.arange(k)
+            res.reshape((k, db, k, mb))[i, :, i, :] = self.blocks
+            return res
+        row, col = 0, 0
+        for b in self.blocks:
+            db, mb = b.shape
+            res[row:row+db, col:col+mb] = b
+            row += db
+            col += mb
+        return res
+
+    def __array__(self, dtype=None, copy=None):
+        res = self.toarray()
+        return res if dtype is None else res.astype(dtype)
+
+
+def _check_delay_args(y0, tspan, delays):
+    """Validation common to the delay equation algorithms.
+
+    Returns:
+      (y0, h, delays) where y0 is the initial state as a float array, h is the
+      time step and delays is a 1D array.
+    """
+    if not np.isclose(min(np.diff(tspan)), max(np.diff(tspan))):
+        raise ValueError('Currently time steps must be equally spaced.')
+    y0 = np.asarray(y0, dtype=np.float64)
+    if y0.ndim == 0:
+        y0 = y0.reshape((1,))
+    h = (tspan[len(tspan)-1] - tspan[0])/(len(tspan) - 1)
+    delays = np.atleast_1d(np.asarray(delays, dtype=np.float64))
+    if len(delays) == 0:
+        raise ValueError('no delays given')
+    if delays.min() < h*(1.0 - 1e-9):
+        raise ValueError(
+            'delay %g is shorter than the time step %g. Please use a smaller '
+            'time step dt.' % (delays.min(), h))
+    return y0, h, delays
+
+
+def _dot(G, dW, out=None):
+    """Product of noise coefficients G with Wiener increments dW, for a single
+    state (G of shape (d, m)) or a batch (G of shape (d, m, n)). If given, the
+    scratch array `out` is reused to hold the result."""
+    if isinstance(G, BlockDiagonal):
+        return G.dot(dW, out)
+    elif G.ndim == 2 and (out is None or out.ndim == 1):
+        return np.dot(G, dW, out)
+    else:
+        return np.einsum('ij...,j...->i...', G, dW, out=out)
+
+
+def _wiener_blocks(dW, N, m, h, batch, rng=None):
+    """Yield the Wiener increments for N time steps, a block at a time.
+
+    Args:
+      dW (array, optional): increments given by the caller. If None, they are
+        drawn from the normal distribution in blocks of about `block_size`
+        numbers, so that the cost of random number generation is amortized
+        without holding the whole noise sequence in memory.
+      N (int): number of time steps
+      m (int): number of independent Wiener processes
+      h (float): time step
+      batch (tuple): trailing shape for a batch of realizations, or ()
+      rng (Generator or sequence of Generators, optional): where to draw
+        the increments from (if None, numpy's global random state)
+
+    Yields:
+      array of shape (k, m) + batch, for successive blocks of k time steps
+    """
+    if dW is not None:
+        if dW.shape != (N, m) + batch:
+            raise ValueError('dW should have shape %s' % ((N, m) + batch,))
+        yield dW
+        return
+    if rng is None:
+        rng = np.random
+    elif isinstance(rng, (list, tuple)) and len(rng) != int(np.prod(batch)):
+        raise ValueError('expected one random generator for each of the %d '
+                         'realizations' % int(np.prod(batch)))
+    sqrth = np.sqrt(h)
+    if isinstance(rng, (list, tuple)):
+        # block length must not depend on the number of realizations, so
+        # that each stream is consumed as by a single trajectory
+        steps = max(1, block_size // m)
+    else:
+        steps = max(1, block_size // (m * int(np.prod(batch))))
+    for start in range(0, N, steps):
+        k = min(steps, N - start)
+        if isinstance(rng, (list, tuple)):
+            # each realization draws from its own stream
+            yield np.stack([g.normal(0.0, sqrth, (k, m)) for g in rng],
+                           axis=-1).reshape((k, m) + batch)
+        else:
+            yield rng.normal(0.0, sqrth, (k, m) + batch)
+
+
+def _repeated_ito_integrals(dW, h, rng=None, terms=5):
+    """Approximate repeated Ito integrals I_ij for a block of time steps, by
+    the method of Kloeden, Platen and Wright (1992).
+
+    If rng is None this uses sdeint.Ikpw. Given a generator, the same
+    approximation is computed here, drawing the random numbers for each time
+    step (and each realization) contiguously, so that the results do not
+    depend on how the time steps are split into blocks.
+
+    Args:
+      dW (array of shape (k, m) or (k, m, n))
+      h (float): time step
+      rng (Generator or sequence of Generators, optional): where to draw the
+        random numbers for the Levy areas (as for `_wiener_blocks`)
+      terms (int, optional): number of terms of the series for Levy areas
+
+    Returns:
+      I (array of shape (k, m, m) or (k, m, m, n))
+    """
+    if rng is None:
+        if dW.ndim == 2:
+            return sdeint.Ikpw(dW, h, terms)[1]
+        k, m, n = dW.shape
+        # compute all realizations together, treating each as extra steps
+        flat = dW.transpose((0, 2, 1)).reshape((k*n, m))
+        I = sdeint.Ikpw(flat, h, terms)[1].reshape((k, n, m, m))
+        return I.transpose((0, 2, 3, 1))
+    k, m = dW.shape[:2]
+    return _ito_integrals(dW, _levy_normals(k, m, dW.shape[2:], rng, terms),
+                          h)
+
+
+def _block_ito_integrals(G0, dW, h, rng=None, terms=5):
+    """Approximate the repeated Ito integrals I_ij for a block of time steps,
+    for noise coefficients that are a BlockDiagonal matrix G0: only those
+    between the Wiener processes of the same block are needed. (As for
+    `_repeated_ito_integrals` with a generator, the results do not depend on
+    how the time steps are split into blocks.)
+
+    Args:
+      G0 (BlockDiagonal): gives the block structure
+      dW (array of shape (k, m))
+      h (float): time step
+      rng (Generator, optional): where to draw the random numbers for the
+        Levy areas. If None, numpy's global random state is used.
+      terms (int, optional): number of terms of the series for Levy areas
+
+    Returns:
+      for G0 with K blocks of equal shape (db, mb), an array of shape
+      (k, mb, mb, K). Otherwise a list of k tuples, each holding an (mb, mb)
+      array for each block.
+    """
+    k, m = dW.shape
+    if rng is None:
+        rng = np.random
+    Z = _levy_normals(k, m, (), rng, terms)
+    if isinstance(G0.blocks, np.ndarray):
+        K, db, mb = G0.blocks.shape
+        def split(a):
+            return a.reshape(a.shape[:-1] + (K, mb)).swapaxes(-1, -2)
+        return _ito_integrals(split(dW), split(Z), h)
+    res = []
+    col = 0
+    for b in G0.blocks:
+        mb = b.shape[1]
+        res.append(_ito_integrals(dW[:, col:col+mb], Z[..., col:col+mb], h))
+        col += mb
+    return list(zip(*res))
+
+
+def _levy_normals(k, m, batch, rng, terms):
+    """Draw the standard normal random numbers for the Levy areas of k time
+    steps, those of each step (and each realization) contiguously.
+
+    Returns:
+      Z (array of shape (k, terms, 2, m) + batch)
+    """
+    if isinstance(rng, (list, tuple)):
+        return np.stack([g.standard_normal((k, terms, 2, m)) for g in rng],
+                        axis=-1).reshape((k, terms, 2, m) + batch)
+    return rng.standard_normal((k, terms, 2, m) + batch)
+
+
+def _ito_integrals(dW, Z, h):
+    """Repeated Ito integrals from Wiener increments dW of shape (k, m, ...)
+    and the random numbers Z of shape (k, terms, 2, m, ...) for their Levy
+    areas (see `_repeated_ito_integrals`)"""
+    k, m = dW.shape[:2]
+    batch = dW.shape[2:]
+    terms = Z.shape[1]
+    sqrt2h = np.sqrt(2.0/h)
+    A = np.zeros((k, m, m) + batch)
+    for r in range(terms):
+        X = Z[:, r, 0]
+        Y = Z[:, r, 1] + sqrt2h*dW
+        A += (np.einsum('ki...,kj...->kij...', X, Y) -
+              np.einsum('ki...,kj...->kij...', Y, X)) / (r + 1.0)
+    A *= h/(2.0*np.pi)
+    I = 0.5*np.einsum('ki...,kj...->kij...', dW, dW) + A
+    diag = np.arange(m)
+    I[:, diag, diag] -= 0.5*h
+    return I
+
+
+def _block_stage(G, I, j):
+    """For a BlockDiagonal G and the repeated Ito integrals I within its
+    blocks at one time step (see `_block_ito_integrals`), column j of the
+    product of each block with its integrals, as a vector of shape (d,)
+    (zero for blocks with no column j)"""
+    if isinstance(G.blocks, np.ndarray):
+        return np.einsum('kil,lk->ki', G.blocks, I[:, j, :]).reshape(-1)
+    return np.concatenate([b.dot(Ib[:, j]) if b.shape[1] > j else
+                           np.zeros(b.shape[0]) for b, Ib in zip(G.blocks, I)])
+
+
+def _block_column(G, j):
+    """Column j of each block of a BlockDiagonal G, as a vector of shape (d,)
+    (zero for blocks with no column j)"""
+    if isinstance(G.blocks, np.ndarray):
+        return G.blocks[:, :, j].reshape(-1)
+    return np.concatenate([b[:, j] if b.shape[1] > j else
+                           np.zeros(b.shape[0]) for b in G.blocks])
+
+
+def _check_args(f, G, y0, tspan, noise='general'):
+    """Validation common to the SDE algorithms. A scalar equation is converted
+    to a 1D vector system.
+
+    Returns:
+      (f, G, y0, h, m, dot) where y0 is the initial state as an array, h is
+      the time step, m is the number of independent Wiener processes and
+      dot(G, dW, out) computes the noise term for this structure of noise.
+    """
+    if not np.isclose(min(np.diff(tspan)), max(np.diff(tspan))):
+        raise ValueError('Currently time steps must be equally spaced.')
+    if isinstance(y0, numbers.Number):
+        y0_orig = y0
+        y0 = np.array([y0])
+        if isinstance(f(y0_orig, tspan[0]), numbers.Number):
+            f = _make_vector_fn(f)
+        if isinstance(G(y0_orig, tspan[0]), numbers.Number):
+            G = _make_matrix_fn(G)
+    y0 = np.asarray(y0)
+    if y0.dtype.kind in 'iub':
+        y0 = y0.astype(np.float64)
+    G, G0, m, dot = _check_noise(G, y0, tspan[0], noise)
+    h = (tspan[len(tspan)-1] - tspan[0])/(len(tspan) - 1)
+    return f, G, y0, h, m, dot
+
+
+def _check_noise(G, y0, t0, noise):
+    """Check the noise coefficient function G against its declared structure
+    (see module docstring). For additive noise, G is evaluated just once.
+
+    Returns:
+      (G, G0, m, dot) where G0 is the value of G at y0, m is the number of
+      independent Wiener processes and dot(G, dW, out) computes the noise term
+    """
+    if noise not in ('general', 'additive', 'diagonal'):
+        raise ValueError("noise should be 'general', 'additive' or 'diagonal'")
+    G0 = G(y0, t0)
+    if not isinstance(G0, BlockDiagonal):
+        G0 = np.asarray(G0)
+    if noise == 'diagonal':
+        if G0.shape != y0.shape:
+            raise ValueError('for diagonal noise, G(y0, t0) should have '
+                             'shape %s' % (y0.shape,))
+        return G, G0, y0.shape[0], _diagonal_dot
+    if G0.ndim < 2 or G0.shape[0] != y0.shape[0]:
+        raise ValueError('G(y0, t0) should have shape (%d, m)' % y0.shape[0])
+    if noise == 'additive':
+        G = _constant_fn(G0)
+    return G, G0, G0.shape[1], _dot
+
+
+def _diagonal_dot(G, dW, out=None):
+    """Noise term for diagonal noise, where G holds only the diagonal"""
+    return np.multiply(G, dW, out)
+
+
+def _diagonal_to_matrix(G):
+    """Wrap a function G that returns the diagonal of the noise matrix, of
+    shape (d,) or (d, n), to return the full matrix (d, d) or (d, d, n)"""
+    def matrix_G(y, t):
+        return _diagonal_matrix(G(y, t))
+    return matrix_G
+
+
+def _diagonal_matrix(diag):
+    """Noise matrix of shape (d, d) or (d, d, n) with the given diagonal"""
+    diag = np.asarray(diag)
+    d = diag.shape[0]
+    res = np.zeros((d, d) + diag.shape[1:], dtype=diag.dtype)
+    res[np.arange(d), np.arange(d)] = diag
+    return res
+
+
+def _constant_fn(value):
+    def constant(y, t):
+        return value
+    return constant
+
+
+def _dense_noise(G):
+    """Wrap a noise function G so that it always returns an ordinary array
+    (converting any BlockDiagonal matrix to dense form)"""
+    def dense_G(y, t):
+        Gn = G(y, t)
+        if isinstance(Gn, BlockDiagonal):
+            return Gn.toarray()
+        return Gn
+    return dense_G
+
+
+def _noise_dtype(G0, h):
+    """dtype of the product of a noise matrix G0 with Wiener increments"""
+    if isinstance(G0, BlockDiagonal):
+        return np.result_type(G0.dtype, h)
+    return np.result_type(G0, h)
+
+
+def _make_vector_fn(fn):
+    def newfn(y, t):
+        return np.array([fn(y[0], t)])
+    newfn.__name__ = fn.__name__
+    return newfn
+
+
+def _make_matrix_fn(fn):
+    def newfn(y, t):
+        return np.array([[fn(y[0], t)]])
+    newfn.__name__ = fn.__name__
+    return newfn
@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 from .basic_sde import OU
 from .oscillators import Oscillator, Oscillator1D
-from .neural_mass import JansenRit
+from .neural_mass import JansenRit, JansenRitPopulation
 
-__all__ = ['JansenRit', 'OU', 'Oscillator', 'Oscillator1D']
+__all__ = ['JansenRit', 'JansenRitPopulation', 'OU', 'Oscillator',
+           'Oscillator1D']
@@ -12,13 +12,13 @@ classes:
   OU   1D Ornstein Uhlenbeck model
 """
 
-from nsim import ItoModel
+from nsim import LinearItoModel
 import numpy as np
 from scipy import stats
 
 
-class OU(ItoModel):
-
+class OU(LinearItoModel):
+    """dy = lam y dt + sigma dW, integrated exactly (see LinearItoModel)"""
     dimension = 1
     output_vars = [0]
 
@@ -26,10 +26,12 @@ class OU(ItoModel):
     sigma = 0.8
     y0 = np.array([0.])
 
-    def f(self, y, t):
-        return self.lam * y
+    @property
+    def A(self):
+        return np.array([[self.lam]])
 
-    def G(self, y, t):
+    @property
+    def B(self):
         return np.array([[self.sigma]])
 
 
@@ -10,10 +10,13 @@ Large scale population models for neuroscience.
 
 classes:
   JansenRit
+  JansenRitPopulation  network of many Jansen-Rit columns, evaluated together
 """
 
-from nsim import StratonovichModel
+from nsim import StratonovichModel, NetworkModel, SimValueError
+from nsim import integrators
 import numpy as np
+import numbers
 from scipy import stats
 
 
@@ -73,6 +76,11 @@ class JansenRit(StratonovichModel):
     y0 = np.array([12.214, 23.925, 16.841, 3.0534, 13.564, -11.803, -109.62,
                     3.3909])
 
+    # f, G and coupling also accept a batch of states of shape (8, n)
+    vectorized = True
+    # G does not depend on the state, so need only be evaluated once
+    noise = 'additive'
+
     def S(self, y):
         return (2.0*self.e0)/(1.0 + np.exp(self.rho1*(self.rho2 - y)))
 
@@ -80,13 +88,13 @@ class JansenRit(StratonovichModel):
         """Aburn2012 equations right hand side, noise free term
         Args: 
           v: (8,) array 
-             state vector
+             state vector (or (8, n) array for a batch of n states)
           t: number
              scalar time
         Returns:
-          (8,) array
+          (8,) array (or (8, n) array)
         """
-        ret = np.zeros(8)
+        ret = np.zeros_like(v)
         ret[0] = v[4]
         ret[4] = (self.He1*self.ke1*(self.g1*self.S(v[1]-v[2]) + self.u_mean) -
                   2*self.ke1*v[4] - self.ke1*self.ke1*v[0])
@@ -133,6 +141,143 @@ class JansenRit(StratonovichModel):
           input (array of shape (8,)): value to drive each variable of the
             target node.
         """
-        v_pyramidal = source_y[1] - source_y[2]
-        return (np.array([0, 0, 0, 0, 0, 1.0, 0, 0]) *
-                (weight*self.g1*self.He2*self.ke2*self.S(v_pyramidal)))
+        return self.coupling_batch(source_y, target_y, weight)
+
+    def coupling_batch(self, source_Y, target_Y, weights):
+        """The coupling for E connections at once.
+        Args:
+          source_Y (array of shape (8, E)): states of the source nodes
+          target_Y (array of shape (8, E)): states of the target nodes
+          weights (array of shape (E,)): the connection strengths
+        Returns:
+          inputs (array of shape (8, E)): value to drive each variable of the
+            target node of each connection.
+        """
+        v_pyramidal = source_Y[1] - source_Y[2]
+        ret = np.zeros_like(target_Y, dtype=np.float64)
+        ret[5] = weights*self.g1*self.He2*self.ke2*self.S(v_pyramidal)
+        return ret
+
+    def coupling_terms(self, Y):
+        """The coupling in separable form: the input to each node is driven
+        only by the firing rate S(v1 - v2) of each source node.
+        Args:
+          Y (array of shape (8, n)): states of all n nodes
+        Returns:
+          U (array of shape (1, n)), V (array of shape (8, 1, n))
+        """
+        U = self.S(Y[1] - Y[2])[np.newaxis]
+        V = np.zeros((8, 1, Y.shape[1]))
+        V[5] = self.g1*self.He2*self.ke2
+        return U, V
+
+
+class JansenRitPopulation(NetworkModel):
+    """A network of Jansen-Rit columns, with the parameters of all N columns
+    held as arrays so that the whole network is evaluated by one vectorized f.
+
+    This is a drop-in replacement for NetworkModel(columns, network) with
+    JansenRit columns coupled by JansenRit.coupling: it has the same state
+    layout, timeseries and output. The columns may have different parameter
+    values. (Each connection drives the target column with that column's own
+    parameters g1, He2 and ke2.)
+    """
+    # the parameters that may vary between columns
+    parameters = ('rho1', 'rho2', 'e0', 'He1', 'He2', 'He3', 'Hi', 'ke1',
+                  'ke2', 'ke3', 'ki', 'g1', 'g2', 'g3', 'g4', 'u_sdev',
+                  'u_mean', 'p_sdev', 'p_mean')
+
+    def __init__(self, columns, network, coupling_function=None,
+                 independent_noise=True):
+        """
+        Args:
+          columns (int or sequence of JansenRit): the number of columns (with
+            default parameters), or the JansenRit instances to simulate.
+          network (array of shape (n, n)): Adjacency matrix, as for
+            NetworkModel (can also be a scipy.sparse matrix or a low-rank
+            tuple (P, Q)).
+          coupling_function: only the Jansen-Rit coupling is supported, so
+            this should be None (or JansenRit.coupling).
+          independent_noise (bool, optional): as for NetworkModel.
+        """
+        if isinstance(columns, numbers.Integral):
+            columns = [JansenRit() for i in range(columns)]
+        if not all(isinstance(m, JansenRit) or m is JansenRit for
+                   m in columns):
+            raise SimValueError(
+                    'JansenRitPopulation columns must be JansenRit models')
+        jr_coupling = getattr(JansenRit.coupling, '__func__',
+                              JansenRit.coupling)
+        if (coupling_function is not None and getattr(
+                coupling_function, '__func__', None) is not jr_coupling):
+            raise SimValueError(
+                    'JansenRitPopulation supports only the Jansen-Rit coupling')
+        super(JansenRitPopulation, self).__init__(
+                columns, network, independent_noise=independent_noise)
+        self._homogeneous = False
+        n = self._n
+        p = dict((k, np.array([getattr(m, k) for m in self.submodels],
+                              dtype=np.float64)) for k in self.parameters)
+        self._p = p
+        # combined coefficients of each column's equations
+        self._c = {
+          'A0': p['He1']*p['ke1']*p['g1'], 'B0': p['He1']*p['ke1']*p['u_mean'],
+          'A1': p['He2']*p['ke2']*p['g2'], 'B1': p['He2']*p['ke2']*p['p_mean'],
+          'A2': p['Hi']*p['ki']*p['g4'],
+          'A3': p['He3']*p['ke3']*p['g3'],
+          'coupling': p['g1']*p['He2']*p['ke2']}
+        for k, rate in enumerate(('ke1', 'ke2', 'ki', 'ke3')):
+            self._c['a%d' % k] = 2*p[rate]
+            self._c['b%d' % k] = p[rate]*p[rate]
+        self._noise_blocks = np.zeros((n, 8, 1))
+        self._noise_blocks[:, 4, 0] = p['ke1']*p['He1']*p['u_sdev']
+        self._noise_blocks[:, 5, 0] = p['ke2']*p['He2']*p['p_sdev']
+        self._out = np.empty((n, 8)) # preallocated result of f
+
+    def S(self, y):
+        p = self._p
+        return (2.0*p['e0'])/(1.0 + np.exp(p['rho1']*(p['rho2'] - y)))
+
+    def f(self, y, t, ylag=None):
+        """Deterministic term of all columns of the network together.
+        (The returned array is reused by the next call of f.)
+
+        Args:
+          y (array of shape (8n,)): state of the network, column by column
+
+        Returns:
+          array of shape (8n,)
+        """
+        v = y.reshape((self._n, 8)).T
+        # a view of _out as shape (8, n), taken on each call so that it
+        # stays valid when the model is copied or pickled
+        ret = self._out.T
+        c = self._c
+        ret[0:4] = v[4:8]
+        pyramidal = self.S(v[1] - v[2])
+        ret[4] = (c['A0']*pyramidal + c['B0'] - c['a0']*v[4] -
+                  c['b0']*v[0])
+        ret[5] = (c['A1']*self.S(v[0]) + c['B1'] - c['a1']*v[5] -
+                  c['b1']*v[1])
+        ret[6] = c['A2']*self.S(v[3]) - c['a2']*v[6] - c['b2']*v[2]
+        ret[7] = c['A3']*pyramidal - c['a3']*v[7] - c['b3']*v[3]
+        # input from the pyramidal firing rate of the source columns
+        if self._mean_field is not None:
+            P, Q, D = self._mean_field
+            inputs = pyramidal.dot(P).dot(Q.T) + pyramidal*D
+            ret[5] += c['coupling']*inputs
+        elif len(self._weights) > 0:
+            inputs = self._incidence.dot(self._weights *
+                                         pyramidal[self._sources])
+            ret[5] += c['coupling']*inputs
+        return self._out.reshape(-1)
+
+    def G(self, y, t):
+        """Noise coefficient matrix of the network (see NetworkModel.G)"""
+        if self._independent_noise:
+            return self._block_G(y, t).toarray()
+        else:
+            return self._noise_blocks.reshape((self.dimension, 1))
+
+    def _block_G(self, y, t):
+        return integrators.BlockDiagonal(self._noise_blocks)
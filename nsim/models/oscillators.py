@@ -26,9 +26,10 @@ class Oscillator(ItoModel):
     sigma2 = 0.01
 
     y0 = np.array([1.0, 1.0])
+    vectorized = True
 
     def f(self, y, t):
-        ret = np.zeros(2)
+        ret = np.empty_like(y)
         ret[0] = self.lam*y[0] - self.omega*y[1]
         ret[1] = self.lam*y[1] + self.omega*y[0]
         return ret
@@ -42,6 +43,7 @@ class Oscillator1D(ItoModel):
     epsilon = 0.6
     sigma = 0.03
     y0 = np.array([0.])
+    vectorized = True
 
     def f(self, y, t):
         return 1 + self.epsilon*np.cos(y)
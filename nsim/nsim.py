@@ -13,12 +13,17 @@ Classes:
 ``Model``   base class for different kinds of dynamical model
 ``ODEModel``   system of ordinary differential equations
 ``ItoModel``   system of Ito stochastic differential equations
+``LinearItoModel``   linear Ito system with additive noise, solved exactly
 ``StratonovichModel``  system of Stratonovich stochastic differential equations
+``DDEModel``   system of delay differential equations
+``DelayItoModel``   system of Ito stochastic delay differential equations
 ``NetworkModel``   many coupled instances of a submodel connected in a network
 
 ``Simulation``   single simulation run of a model, with simulation results
 ``RepeatedSim``   repeated simulations of the same model (to get statistics)
 ``ParameterSim``  multiple simulations of a model exploring parameter space
+``AdaptiveParameterSim``  parameter search refined where the behaviour changes
+``ContinuationSim``  parameter sweep, each run starting where the last ended
 
 ``RemoteTimeseries`` Local proxy representing a Timeseries on a remote engine 
 ``DistTimeseries`` Timeseries with one axis distributed onto multiple engines 
@@ -32,17 +37,23 @@ functions:
 from __future__ import absolute_import
 from .timeseries import Timeseries, _Timeslice
 from . import analysesN
+from . import integrators
 import sdeint
 import distob
 from scipy import stats
 from scipy import integrate
+from scipy import sparse
 import numpy as np
 from collections import Sequence
 import copy
+import os
+import pickle
+import time
 import types
 import warnings
 import numbers
 import random
+import itertools
 #from memory_profiler import profile
 
 # types for compatibility across python 2 and 3
@@ -728,14 +739,39 @@ def _dts_from_da(da, tspan, labels):
     return da
 
 
-class Model(object):
+class _ModelType(type):
+    """Metaclass of models, counting assignments to attributes of any model
+    class, so that what is derived from the class attributes can be cached
+    until they change."""
+    version = 0
+
+    def __setattr__(cls, name, value):
+        type.__setattr__(cls, name, value)
+        _ModelType.version += 1
+
+    def __delattr__(cls, name):
+        type.__delattr__(cls, name)
+        _ModelType.version += 1
+
+
+class Model(_ModelType('_ModelBase', (object,), {})):
     """Base class for different kinds of dynamical systems
 
     Attributes:
       integrator (sequence containing a single function): Which function to use
         by default to integrate systems of this class.
+      rng (numpy.random.Generator, optional): Where the random numbers used
+        to integrate the system are drawn from. If None, numpy's global random
+        state is used. (A seeded Simulation sets this.)
+      levy_rng (numpy.random.Generator, optional): Where the extra random
+        numbers needed by some integrators (the Levy areas of
+        `nsim.integrators.itoSRI2`) are drawn from, if not from rng. (A seeded
+        Simulation sets this to a second independent stream, so that the
+        Wiener increments drawn from rng do not depend on the integrator.)
     """
     integrator = (None,)
+    rng = None
+    levy_rng = None
 
     def __init__(self):
         """When making each new instance from the Model class, we will convert
@@ -743,17 +779,72 @@ class Model(object):
         specified distribution. Thus each individual object made from the 
         class 'recipe' will receive slightly different parameter values.
         """
-        for attrib in dir(self):
-            if isinstance(getattr(self,attrib), stats.distributions.rv_frozen):
-                setattr(self, attrib, getattr(self,attrib).rvs())
+        for attrib in self._random_attributes():
+            value = getattr(self, attrib)
+            if isinstance(value, stats.distributions.rv_frozen):
+                setattr(self, attrib, value.rvs())
+        for attrib, value in list(vars(self).items()):
+            if isinstance(value, stats.distributions.rv_frozen):
+                setattr(self, attrib, value.rvs())
+
+    @classmethod
+    def _random_attributes(cls):
+        """Names of the class attributes that are random variables. (Found
+        once for each class, then cached until an attribute of a model class
+        is assigned.)"""
+        cached = cls.__dict__.get('_random_attribs')
+        if cached is not None and cached[0] == _ModelType.version:
+            return cached[1]
+        found = {}
+        for c in cls.__mro__:
+            for attrib, value in vars(c).items():
+                found.setdefault(attrib, value)
+        names = tuple(sorted(attrib for attrib, value in found.items() if
+                             isinstance(value, stats.distributions.rv_frozen)))
+        # (stored without counting as a change to the class)
+        type.__setattr__(cls, '_random_attribs', (_ModelType.version, names))
+        return names
+
+    @classmethod
+    def sample(cls, n):
+        """Make n instances of this model class, drawing the values of each
+        random-variable parameter for all n instances at once, in a single
+        call rvs(size=n). (Much faster than calling the class n times.)
+
+        Args:
+          n (int): number of instances to make
+
+        Returns:
+          list of n Model instances
+        """
+        draws = [(attrib, getattr(cls, attrib).rvs(size=n)) for
+                 attrib in cls._random_attributes()]
+        models = []
+        for i in range(n):
+            m = cls.__new__(cls)
+            for attrib, values in draws:
+                setattr(m, attrib, values[i])
+            m.__init__()
+            models.append(m)
+        return models
+
+    def integrate(self, tspan, y0=None):
+        """Integrate the system over the time points tspan.
+
+        Args:
+          tspan (array): the sequence of time points to integrate over
+          y0 (array, optional): state of the system at time tspan[0]. If None,
+            start from the model's initial state self.y0
 
-    def integrate(self, tspan):
+        Returns:
+          Timeseries
+        """
         pass 
 
 
 class _DEModel(Model):
-    """Base class with some common code shared by the finite dimensional DE
-    systems ODEModel, ItoModel and StratonovichModel
+    """Base class with some common code shared by the DE systems ODEModel,
+    ItoModel, StratonovichModel, DDEModel and DelayItoModel
 
     Attributes:
       dimension (integer): Dimension of the state space
@@ -767,11 +858,17 @@ class _DEModel(Model):
 
     integrator (sequence containing a single function): Which function to use
       by default to integrate systems of this class
+
+    vectorized (bool): True if the functions defining the system also accept
+      a batch of states, an array of shape (dimension, n), and evaluate all n
+      of them at once. This allows many realizations of the system to be
+      simulated together as an ensemble.
     """
     y0 = np.array([0.0])
     output_vars = [0]
     labels = None
     integrator = (None,)
+    vectorized = False
 
     def __init__(self):
         super(_DEModel, self).__init__()
@@ -816,26 +913,57 @@ class ODEModel(_DEModel):
       integrator (sequence containing a single function): Which function to use
         by default to integrate systems of this class
 
+      vectorized (bool): True if f also accepts a batch of states, an array of
+        shape (dimension, n), returning the derivatives as shape (dimension, n)
+
+      jac_sparsity (array of shape (dimension, dimension), optional): which
+        entries of the Jacobian of f can be nonzero, if not all of them.
+
     Methods:
       f(y, t): right hand side of the ODE system
+      jac(y, t) (optional): Jacobian matrix of f with respect to y, an array
+        (or scipy.sparse matrix) of shape (dimension, dimension). If defined,
+        it is given to the integrator instead of estimating the Jacobian by
+        finite differences, which helps for stiff systems. (For a stiff
+        system choose `integrator=nsim.integrators.bdf` in the Simulation.)
     """
     y0 = np.array([0.0])
     output_vars = [0]
     labels = None
     integrator = (integrate.odeint,)
+    jac = None
+    jac_sparsity = None
 
     def __init__(self):
         """Create an instance of this system, ready to simulate"""
         super(ODEModel, self).__init__()
 
-    def integrate(self, tspan):
-        ar = self.integrator[0](self.f, self.y0, tspan)
+    def integrate(self, tspan, y0=None):
+        if y0 is None:
+            y0 = self.y0
+        ar = _integrate_ode(self, y0, tspan)
         return Timeseries(ar, tspan)
 
     def f(self, y, t):
         pass
 
 
+def _integrate_ode(model, y0, tspan):
+    """Integrate an ODE system with its chosen integrator, also giving the
+    integrator the model's Jacobian (or Jacobian sparsity) if it can use it"""
+    integrator = model.integrator[0]
+    jac = getattr(model, 'jac', None)
+    jac_sparsity = getattr(model, 'jac_sparsity', None)
+    if integrator is integrate.odeint and jac is not None:
+        return integrator(model.f, y0, tspan, Dfun=integrators._dense_jac(jac))
+    elif (getattr(integrator, '__module__', None) == integrators.__name__ and
+            (jac is not None or jac_sparsity is not None)):
+        return integrator(model.f, y0, tspan, jac=jac,
+                          jac_sparsity=jac_sparsity)
+    else:
+        return integrator(model.f, y0, tspan)
+
+
 class ItoModel(_DEModel):
     """Model defined by system of Ito stochastic differential equations
     dy = f(y, t) dt + G(y, t) dW
@@ -853,6 +981,23 @@ class ItoModel(_DEModel):
       integrator (sequence containing a single function): Which function to use
         by default to integrate systems of this class.
 
+      vectorized (bool): True if f and G also accept a batch of states, an
+        array of shape (dimension, n), returning arrays of shape (dimension, n)
+        and (dimension, m, n) respectively. (If G does not depend on the state
+        it is fine to return the same (dimension, m) array for any batch.)
+
+      noise (str): the structure of the noise, which integrators can exploit:
+        'general' (the default), 'additive' if G does not depend on y or t
+        (so it need only be evaluated once), or 'diagonal' if G(y, t) returns
+        only the diagonal of a (dimension, dimension) matrix, as an array of
+        shape (dimension,), meaning that each variable has its own
+        independent noise (each element then depends on the state only
+        through its own variable). For 'additive' or 'diagonal' noise, and
+        in a seeded simulation, the default sdeint.itoint is replaced by
+        nsim.integrators.itoSRI2: the same algorithm, but one that exploits
+        the noise structure and draws from the model's own generators. (Give
+        an integrator explicitly to keep a particular one.)
+
     Methods:
       f(y, t): deterministic part of Ito SDE system 
       G(y, t): noise coefficient matrix of Ito SDE system 
@@ -861,13 +1006,16 @@ class ItoModel(_DEModel):
     output_vars = [0]
     labels = None
     integrator = (sdeint.itoint,)
+    noise = 'general'
 
     def __init__(self):
         """Create an instance of this system, ready to simulate"""
         super(ItoModel, self).__init__()
 
-    def integrate(self, tspan):
-        ar = self.integrator[0](self.f, self.G, self.y0, tspan)
+    def integrate(self, tspan, y0=None):
+        if y0 is None:
+            y0 = self.y0
+        ar = _integrate_sde(self, self.G, y0, tspan)
         return Timeseries(ar, tspan)
 
     def f(self, y, t):
@@ -877,6 +1025,136 @@ class ItoModel(_DEModel):
         pass
 
 
+class LinearItoModel(ItoModel):
+    """Model defined by a linear system of Ito stochastic differential
+    equations with additive noise
+    dy = (A.dot(y) + c) dt + B dW
+
+    By default this is integrated exactly (see `nsim.integrators.itoLinear`):
+    the transition over one time step is computed once for the time step in
+    use, after which each step is one matrix-vector product and one
+    correlated normal draw. So there is no discretization error, and the
+    time step can be as large as the output requires.
+
+    Attributes:
+      A (array of shape (dimension, dimension)): drift matrix
+      B (array of shape (dimension, m)): noise coefficient matrix
+      c (array of shape (dimension,), optional): constant drift term
+
+      (and the other attributes of ItoModel)
+
+    When a batch of n systems with different parameters is integrated
+    together (see `ParameterSim`), A, B and c may instead carry a last axis
+    of length n, giving the matrices for each system.
+
+    If another integrator is chosen, the system is integrated through f and
+    G as for any ItoModel.
+    """
+    y0 = np.array([0.0])
+    output_vars = [0]
+    labels = None
+    integrator = (integrators.itoLinear,)
+    noise = 'additive'
+    vectorized = True
+    A = np.array([[0.0]])
+    B = np.array([[0.0]])
+    c = None
+
+    def __init__(self):
+        """Create an instance of this system, ready to simulate"""
+        super(LinearItoModel, self).__init__()
+        self._transition = None
+
+    def integrate(self, tspan, y0=None):
+        if y0 is None:
+            y0 = self.y0
+        if self.integrator[0] is not integrators.itoLinear:
+            return super(LinearItoModel, self).integrate(tspan, y0)
+        h = (tspan[-1] - tspan[0]) / (len(tspan) - 1)
+        ar = integrators.itoLinear(self.A, self.B, y0, tspan, self.c,
+                                   self._cached_transition(h), rng=self.rng)
+        return Timeseries(ar, tspan)
+
+    def _cached_transition(self, h):
+        """The exact transition for time step h, computed only when the time
+        step or the system matrices have changed"""
+        key = (h, np.array(self.A, dtype=np.float64),
+               np.array(self.B, dtype=np.float64),
+               None if self.c is None else np.array(self.c, dtype=np.float64))
+        cached = getattr(self, '_transition', None)
+        if cached is not None and all(
+                np.array_equal(k1, k2) for k1, k2 in zip(cached[0], key)):
+            return cached[1]
+        transition = integrators._linear_transition(*key[1:3] + (h, key[3]))
+        self._transition = (key, transition)
+        return transition
+
+    def f(self, y, t):
+        res = np.einsum('ij...,j...->i...', self.A, y)
+        if self.c is not None:
+            c = np.asarray(self.c)
+            res += c.reshape(c.shape + (1,)*(res.ndim - c.ndim))
+        return res
+
+    def G(self, y, t):
+        return np.asarray(self.B)
+
+
+def _sde_integrator(model):
+    """Choose the function to integrate an SDE system: the model's chosen
+    integrator, except that the default from sdeint is replaced by the nsim
+    integrator of the same order for declared additive or diagonal noise and
+    for a network with independent noise (whose structure it exploits), and
+    for a seeded model (so that the model gives the same results alone as in
+    a seeded ensemble, see `_batch_integrator`)"""
+    integrator = model.integrator[0]
+    if (getattr(model, 'noise', 'general') != 'general' or
+            getattr(model, 'rng', None) is not None or
+            isinstance(model, NetworkModel) and model._independent_noise):
+        if integrator is sdeint.itoint:
+            integrator = integrators.itoSRI2
+        elif integrator is sdeint.stratint:
+            integrator = integrators.stratHeun
+    return integrator
+
+
+def _integrate_sde(model, G, y0, tspan, integrator=None):
+    """Integrate an SDE system with noise coefficients G, telling the
+    integrator the declared structure of the noise if it can use it"""
+    if integrator is None:
+        integrator = _sde_integrator(model)
+    noise = getattr(model, 'noise', 'general')
+    kwargs = _rng_kwargs(model, integrator)
+    if getattr(integrator, '__module__', None) == integrators.__name__:
+        return integrator(model.f, G, y0, tspan, noise=noise, **kwargs)
+    if noise == 'diagonal':
+        G = integrators._diagonal_to_matrix(G)
+    return integrator(model.f, G, y0, tspan, **kwargs)
+
+
+def _rng_kwargs(model, integrator):
+    """Keyword arguments that give an SDE integrator the model's random
+    number generator (none, if the model does not have one)
+
+    Raises:
+      SimValueError: if the integrator cannot be given a generator
+    """
+    rng = getattr(model, 'rng', None)
+    if rng is None:
+        return {}
+    module = getattr(integrator, '__module__', None) or ''
+    if integrator is integrators.itoSRI2:
+        return {'rng': rng, 'levy_rng': getattr(model, 'levy_rng', None)}
+    elif module == integrators.__name__:
+        return {'rng': rng}
+    elif module.split('.')[0] == 'sdeint':
+        return {'generator': rng}
+    raise SimValueError(
+        """%s cannot be given a random number generator, so it cannot be
+        used for a seeded simulation""" % getattr(integrator, '__name__',
+                                                   integrator))
+
+
 class StratonovichModel(_DEModel):
     """Model defined by system of Stratonovich stochastic differential
     equations   dy = f(y, t) dt + G(y, t) \circ dW
@@ -894,6 +1172,24 @@ class StratonovichModel(_DEModel):
       integrator (sequence containing a single function): Which function to use
         by default to integrate systems of this class.
 
+      vectorized (bool): True if f and G also accept a batch of states, an
+        array of shape (dimension, n), returning arrays of shape (dimension, n)
+        and (dimension, m, n) respectively. (If G does not depend on the state
+        it is fine to return the same (dimension, m) array for any batch.)
+
+      noise (str): the structure of the noise, which integrators can exploit:
+        'general' (the default), 'additive' if G does not depend on y or t
+        (so it need only be evaluated once), or 'diagonal' if G(y, t) returns
+        only the diagonal of a (dimension, dimension) matrix, as an array of
+        shape (dimension,), meaning that each variable has its own
+        independent noise (each element then depends on the state only
+        through its own variable). For 'additive' or 'diagonal' noise, the
+        default sdeint.stratint is replaced by nsim.integrators.stratHeun,
+        which has strong order 1.0 for such noise. It also replaces it in a
+        seeded simulation, to give the same results as a seeded ensemble,
+        though for general noise it then has strong order only 0.5. (Give an
+        integrator explicitly to keep a particular one.)
+
     Methods:
       f(y, t): deterministic part of Stratonovich SDE system 
       G(y, t): noise coefficient matrix of Stratonovich SDE system 
@@ -902,13 +1198,16 @@ class StratonovichModel(_DEModel):
     output_vars = [0]
     labels = None
     integrator = (sdeint.stratint,)
+    noise = 'general'
 
     def __init__(self):
         """Create an instance of this system, ready to simulate"""
         super(StratonovichModel, self).__init__()
 
-    def integrate(self, tspan):
-        ar = self.integrator[0](self.f, self.G, self.y0, tspan)
+    def integrate(self, tspan, y0=None):
+        if y0 is None:
+            y0 = self.y0
+        ar = _integrate_sde(self, self.G, y0, tspan)
         return Timeseries(ar, tspan)
 
     def f(self, y, t):
@@ -918,16 +1217,156 @@ class StratonovichModel(_DEModel):
         pass
 
 
-class DDEModel(Model):
+class DDEModel(_DEModel):
     """Model defined by a system of delay differential equations
+    dy/dt = f(y, t, ylag)
+
+    where ylag[k] is the delayed state y(t - delays[k]). Before the start of
+    the simulation the history is taken to be constant, equal to y0.
+
+    The recent history is kept in a ring buffer just long enough to cover the
+    longest delay (see `nsim.integrators.DelayBuffer`). The buffer is kept
+    between calls to integrate(), so a simulation that is integrated a block
+    at a time continues from the history of the previous block.
+
+    Attributes:
+      dimension (integer): Dimension of the state space
+
+      output_vars (list of integers): If i is in this list then y[i] is 
+        considered an output variable
+
+      y0 (array of shape (dimension,)): Initial state
+
+      delays (sequence of float): The time delays, in seconds. Each must be
+        at least as long as the simulation time step.
+
+      labels (sequence of str): optional names for the dynamical variables
+
+      integrator (sequence containing a single function): Which function to use
+        by default to integrate systems of this class. It is called as
+        integrator(f, y0, tspan, delays, buffer)
+
+      vectorized (bool): True if f also accepts a batch of states, an array of
+        shape (dimension, n) with ylag of shape (len(delays), dimension, n),
+        returning the derivatives as shape (dimension, n)
+
+    Methods:
+      f(y, t, ylag): right hand side of the DDE system
     """
-    pass
+    y0 = np.array([0.0])
+    output_vars = [0]
+    labels = None
+    delays = (1.0,)
+    integrator = (integrators.ddeRK4,)
 
+    def __init__(self):
+        """Create an instance of this system, ready to simulate"""
+        super(DDEModel, self).__init__()
+        self._history = None
+
+    def integrate(self, tspan, y0=None):
+        if y0 is None:
+            y0 = self.y0
+            self._history = None
+        history = _delay_history(self, tspan, y0, hermite=True)
+        ar = self.integrator[0](self.f, y0, tspan, self.delays, history)
+        return Timeseries(ar, tspan)
 
-class DelayItoModel(Model):
+    def f(self, y, t, ylag):
+        pass
+
+
+class DelayItoModel(_DEModel):
     """Model defined by a system of Ito stochastic delay differential equations
+    dy = f(y, t, ylag) dt + G(y, t) dW
+
+    where ylag[k] is the delayed state y(t - delays[k]). Before the start of
+    the simulation the history is taken to be constant, equal to y0.
+
+    As for DDEModel, the recent history is kept in a bounded ring buffer that
+    carries over between calls to integrate().
+
+    Attributes:
+      dimension (integer): Dimension of the state space
+
+      output_vars (list of integers): If i is in this list then y[i] is 
+        considered an output variable
+
+      y0 (array of shape (dimension,)): Initial state
+
+      delays (sequence of float): The time delays, in seconds. Each must be
+        at least as long as the simulation time step.
+
+      labels (sequence of str): optional names for the dynamical variables
+
+      integrator (sequence containing a single function): Which function to use
+        by default to integrate systems of this class. It is called as
+        integrator(f, G, y0, tspan, delays, buffer)
+
+      vectorized (bool): True if f and G also accept a batch of states, an
+        array of shape (dimension, n) (with ylag of shape (len(delays),
+        dimension, n)), returning arrays of shape (dimension, n) and
+        (dimension, m, n) respectively.
+
+      noise (str): the structure of the noise: 'general', 'additive' or
+        'diagonal', as for ItoModel.
+
+    Methods:
+      f(y, t, ylag): deterministic part of the Ito SDDE system
+      G(y, t): noise coefficient matrix of the Ito SDDE system
     """
-    pass
+    y0 = np.array([0.0])
+    output_vars = [0]
+    labels = None
+    delays = (1.0,)
+    integrator = (integrators.itoEulerDelay,)
+    noise = 'general'
+
+    def __init__(self):
+        """Create an instance of this system, ready to simulate"""
+        super(DelayItoModel, self).__init__()
+        self._history = None
+
+    def integrate(self, tspan, y0=None):
+        if y0 is None:
+            y0 = self.y0
+            self._history = None
+        history = _delay_history(self, tspan, y0, hermite=False)
+        ar = _integrate_delay_sde(self, self.G, y0, tspan, history)
+        return Timeseries(ar, tspan)
+
+    def f(self, y, t, ylag):
+        pass
+
+    def G(self, y, t):
+        pass
+
+
+def _integrate_delay_sde(model, G, y0, tspan, history):
+    """Integrate a stochastic delay system, telling the integrator the
+    declared structure of the noise if it can use it"""
+    integrator = model.integrator[0]
+    noise = getattr(model, 'noise', 'general')
+    kwargs = _rng_kwargs(model, integrator)
+    if getattr(integrator, '__module__', None) == integrators.__name__:
+        return integrator(model.f, G, y0, tspan, model.delays, history,
+                          noise=noise, **kwargs)
+    if noise == 'diagonal':
+        G = integrators._diagonal_to_matrix(G)
+    return integrator(model.f, G, y0, tspan, model.delays, history, **kwargs)
+
+
+def _delay_history(model, tspan, y0, hermite):
+    """The history buffer for integrating a system with delays from state y0
+    at time tspan[0]: the model's stored history if it ends with that state
+    at that time, otherwise a new constant history equal to y0."""
+    history = getattr(model, '_history', None)
+    if history is None or not history.continues(y0, tspan[0]):
+        h = (tspan[-1] - tspan[0]) / (len(tspan) - 1)
+        history = integrators.DelayBuffer(y0, tspan[0], h, max(model.delays),
+                                          hermite)
+    model._history = history
+    return history
 
 
 class NetworkModel(Model):
@@ -944,14 +1383,16 @@ class NetworkModel(Model):
     Indexing with [i] gives access to the ith sub-model in the network.
 
     Attributes:
-      network (array of shape (n, n)): adjacency matrix defining the network.
+      network (array or sparse matrix of shape (n, n)): adjacency matrix
+        defining the network. (or a tuple (P, Q) for a low-rank network)
       timeseries: resulting timeseries: all variables of all nodes.
       output: resulting timeseries: only output variables of output nodes.
       output_nodes (optional list of int): which nodes of the network should be
         used to define the output of the overall network (default: all nodes)
     """
     def __init__(self, submodels, network, coupling_function=None,
-                 independent_noise=True):
+                 independent_noise=True, delays=None, coupling_jac=None,
+                 coupling_batch=None, coupling_terms=None):
         """Construct a network model from submodels and a connectivity matrix.
 
         Arguments:
@@ -962,6 +1403,11 @@ class NetworkModel(Model):
             network edges as a weighted, directed graph. If network[i, j] is
             nonzero, this means subsystem i provides input to subsystem j with
             connection strength (weight) given by the value of network[i, j].
+            For a large sparse network, this can be a scipy.sparse matrix.
+            (Either way it is converted once to a list of the nonzero
+            connections, so only those are visited during the simulation.)
+            A low-rank network can instead be given as a tuple (P, Q) of
+            arrays of shape (n, r), meaning the adjacency matrix P.dot(Q.T).
 
           coupling_function (callable): Function `coupling(source_y, target_y,
             weight)` How the output of a source subsystem should be coupled to
@@ -982,8 +1428,56 @@ class NetworkModel(Model):
             submodel will be independent (this may be suitable if the noise is
             modelling processes intrinsic to each submodel). If False, all
             submodels will share the same noise inputs (suitable in some cases
-            where the noise is extrinsic).
+            where the noise is extrinsic). With independent noise, the noise
+            matrix is kept block diagonal, and the default sdeint integrator
+            is replaced by the nsim one (itoSRI2 or stratHeun) that applies it
+            block by block, never forming the dense matrix.
+
+          delays (optional scalar, or array or sparse matrix of shape (n, n)):
+            Transmission delays in seconds. If delays[i, j] is nonzero, the
+            input from subsystem i to subsystem j is driven by the state of
+            subsystem i at that time in the past. (A scalar gives the same
+            delay for every connection.) A network with delays, or with DDEModel or
+            DelayItoModel submodels, is integrated as a delay system with a
+            bounded history buffer.
+
+          coupling_jac (callable, optional): Function `coupling_jac(source_y,
+            target_y, weight)` returning the pair of arrays (J_source,
+            J_target): the derivatives of the coupling function with respect
+            to source_y and to target_y. If `None`, the default is to look for
+            `submodels[0].coupling_jac()` (when also using the submodel's
+            coupling function). For an ODE network whose submodels all define
+            jac(), this allows the network to provide its Jacobian as a sparse
+            matrix assembled from the submodel Jacobians. (Without it the
+            network still provides `jac_sparsity`, the pattern of nonzero
+            entries, which stiff integrators can use to estimate the Jacobian
+            cheaply.)
+
+          coupling_batch (callable, optional): Function `coupling_batch(
+            source_Y, target_Y, weights)` computing the coupling for all
+            connections at once: given the source and target states as arrays
+            of shape (d, E) and the E connection weights, it returns the
+            inputs as an array of shape (d, E). If `None`, the default is to
+            look for `submodels[0].coupling_batch()` (when also using the
+            submodel's coupling function). When the submodels all have the
+            same dimension, the network then evaluates its coupling with a few
+            array operations instead of one function call per connection.
+
+          coupling_terms (callable, optional): Declares that the coupling is
+            separable: coupling(source_y, target_y, weight) equals
+            weight * V_j.dot(U_i) for the node states y_i and y_j. Function
+            `coupling_terms(Y)` takes the states of all n nodes as an array
+            of shape (d, n) and returns the pair of arrays U of shape (K, n)
+            and V of shape (d, K, n). If `None`, the default is to look for
+            `submodels[0].coupling_terms()` (when also using the submodel's
+            coupling function). If the network is uniform all-to-all or was
+            given in low-rank form (and has no transmission delays), the
+            coupling is then computed through the K mean fields in O(n)
+            operations per step, instead of visiting every connection.
         """
+        # kept to build the network again if its submodels are changed
+        self._arguments = (coupling_function, independent_noise, delays,
+                           coupling_jac, coupling_batch, coupling_terms)
         self.submodels = [m() if (isinstance(m, type) and issubclass(m, Model))
                           else m for m in submodels] # permit classes
         self.submodels = [self._scalar_to_vector(m) for m in self.submodels]
@@ -1015,21 +1509,20 @@ class NetworkModel(Model):
                 submodel_classes.append(StratonovichModel)
                 self.submodel_class = StratonovichModel
                 self.integrator = (sdeint.stratint,)
+            elif isinstance(m, DDEModel):
+                submodel_classes.append(DDEModel)
+            elif isinstance(m, DelayItoModel):
+                submodel_classes.append(DelayItoModel)
             else:
                 raise SimValueError(
                   """currently only instances of an ODEModel, ItoModel, 
-                  StratonovichModel or NetworkModel are supported as 
-                  subsystems of a NetworkModel""")
-        if (ItoModel in submodel_classes and 
-                StratonovichModel in submodel_classes):
+                  StratonovichModel, DDEModel, DelayItoModel or NetworkModel
+                  are supported as subsystems of a NetworkModel""")
+        if (StratonovichModel in submodel_classes and
+                (ItoModel in submodel_classes or
+                 DelayItoModel in submodel_classes)):
             raise SimValueError(
               "can't use Ito and Stratonovich submodels in the same network")
-        network = np.array(network)
-        if network.shape != (self._n, self._n):
-            raise SimValueError(
-              'for %d submodels, adjacency matrix should be shape (%d,%d)' % (
-              self._n, self._n, self._n))
-        self.network = network
         # Validate coupling function
         test_suby0 = self.submodels[0].y0
         test_weight = 0.5
@@ -1054,6 +1547,107 @@ class NetworkModel(Model):
                 """Coupling function must return an array with the same shape
                 as the state vector y of the target system: %s""" %
                 test_suby0.shape)
+        self._coupling_batch = None
+        if coupling_batch is not None:
+            self._coupling_batch = (coupling_batch,)
+        elif coupling_function is None:
+            if self.coupling_function[0] == self.coupling:
+                if type(self).coupling == NetworkModel.coupling:
+                    self._coupling_batch = (self.coupling_batch,)
+            elif (hasattr(self.submodels[0], 'coupling_batch') and
+                  callable(self.submodels[0].coupling_batch)):
+                self._coupling_batch = (self.submodels[0].coupling_batch,)
+        if self._coupling_batch is not None:
+            if len(set(self._sublengths)) > 1:
+                self._coupling_batch = None # can't stack unequal states
+            else:
+                test_Y = np.stack([test_suby0]*2, axis=-1)
+                test_res = self._coupling_batch[0](test_Y, test_Y,
+                                                   np.array([test_weight]*2))
+                if not np.shape(test_res) == test_Y.shape:
+                    raise SimValueError(
+                        """Batch coupling function must return an array with
+                        the same shape as its target_Y argument: %s""" % (
+                        test_Y.shape,))
+        self.network = network
+        if isinstance(network, tuple):
+            factors = self._low_rank_factors(network)
+        else:
+            if not sparse.issparse(network):
+                network = np.array(network)
+            if network.shape != (self._n, self._n):
+                raise SimValueError(
+                  'for %d submodels, adjacency matrix should be shape '
+                  '(%d,%d)' % (self._n, self._n, self._n))
+            factors = _uniform_factors(network)
+        self._coupling_terms = None
+        if coupling_terms is not None:
+            self._coupling_terms = (coupling_terms,)
+        elif coupling_function is None:
+            if self.coupling_function[0] == self.coupling:
+                if type(self).coupling == NetworkModel.coupling:
+                    self._coupling_terms = (self.coupling_terms,)
+            elif (hasattr(self.submodels[0], 'coupling_terms') and
+                  callable(self.submodels[0].coupling_terms)):
+                self._coupling_terms = (self.submodels[0].coupling_terms,)
+        if (factors is not None and self._coupling_terms is not None and
+                len(set(self._sublengths)) == 1 and
+                (delays is None or np.ndim(delays) == 0 and delays == 0)):
+            # coupling through the mean field: no need to list the edges
+            self._mean_field = factors
+            self._init_edges(sparse.csc_matrix((self._n, self._n)))
+            test_Y = np.stack([test_suby0]*2, axis=-1)
+            U, V = self._coupling_terms[0](test_Y)
+            if (np.ndim(U) != 2 or np.shape(U)[1] != 2 or
+                    np.shape(V) != test_Y.shape[:1] + np.shape(U)):
+                raise SimValueError(
+                    """For states Y of shape (d, n), coupling_terms(Y) must
+                    return arrays U of shape (K, n) and V of shape (d, K, n)""")
+        else:
+            self._mean_field = None
+            if isinstance(network, tuple):
+                network = factors[0].dot(factors[1].T)
+            self._init_edges(network)
+        if (delays is not None or DDEModel in submodel_classes or
+                DelayItoModel in submodel_classes):
+            if StratonovichModel in submodel_classes:
+                raise SimValueError(
+                    'delays are not supported for Stratonovich networks')
+            if ItoModel in submodel_classes or (
+                    DelayItoModel in submodel_classes):
+                self.submodel_class = DelayItoModel
+                self.integrator = (integrators.itoEulerDelay,)
+            else:
+                self.submodel_class = DDEModel
+                self.integrator = (integrators.ddeRK4,)
+            self._init_delays(delays)
+        else:
+            self._edgelags = None
+        self._coupling_jac = None
+        if coupling_jac is not None:
+            self._coupling_jac = (coupling_jac,)
+        elif (coupling_function is None and
+              hasattr(self.submodels[0], 'coupling_jac') and
+              callable(self.submodels[0].coupling_jac)):
+            self._coupling_jac = (self.submodels[0].coupling_jac,)
+        if (self.submodel_class is ODEModel and self._mean_field is None and
+                self._coupling_jac is not None and
+                all(getattr(m, 'jac', None) is not None for
+                    m in self.submodels)):
+            self.jac = self._network_jac
+        else:
+            self.jac = None
+        if self.submodel_class is ODEModel and self._mean_field is None:
+            self.jac_sparsity = self._network_jac_sparsity()
+        else:
+            self.jac_sparsity = None
+        # identical vectorized submodels can be evaluated all at once
+        m0 = self.submodels[0]
+        self._homogeneous = (
+                (self._coupling_batch is not None or
+                 self._mean_field is not None) and self._edgelags is None and
+                getattr(m0, 'vectorized', False) and
+                all(_same_parameters(m, m0) for m in self.submodels[1:]))
         self.y0 = np.concatenate([m.y0 for m in self.submodels], axis=0)
         self._independent_noise = independent_noise
         self._nsubnoises = []
@@ -1064,6 +1658,78 @@ class NetworkModel(Model):
             self.nnoises = sum(p for p in self._nsubnoises)
         else:
             self.nnoises = max(p for p in self._nsubnoises)
+        # the network noise is additive if that of every noisy submodel is
+        noisy = [m for j, m in enumerate(self.submodels) if
+                 self._nsubnoises[j] > 0]
+        if noisy and all(getattr(m, 'noise', 'general') == 'additive' for
+                         m in noisy):
+            self.noise = 'additive'
+        else:
+            self.noise = 'general'
+
+    def _init_edges(self, network):
+        """Convert the adjacency matrix once into a list of the E nonzero
+        connections, ordered by target node (in the manner of a CSR matrix):
+        the connections into node j are numbered _inptr[j] to _inptr[j+1]-1,
+        with source nodes _sources and weights _weights. Also make a sparse
+        (n, E) incidence matrix that sums the inputs arriving at each node."""
+        A = sparse.csc_matrix(network, dtype=np.float64)
+        A.eliminate_zeros()
+        A.sort_indices()
+        self._inptr = A.indptr
+        self._sources = A.indices
+        self._weights = A.data
+        E = len(self._sources)
+        self._targets = np.repeat(np.arange(self._n), np.diff(self._inptr))
+        self._incidence = sparse.csr_matrix(
+                (np.ones(E), np.arange(E), self._inptr), shape=(self._n, E))
+
+    def _low_rank_factors(self, network):
+        """Check a network given in low-rank form (P, Q), meaning the
+        adjacency matrix P.dot(Q.T), and return it as mean field factors."""
+        P, Q = [np.asarray(a, dtype=np.float64) for a in network]
+        if P.ndim == 1:
+            P = P[:, np.newaxis]
+        if Q.ndim == 1:
+            Q = Q[:, np.newaxis]
+        if P.ndim != 2 or P.shape != Q.shape or P.shape[0] != self._n:
+            raise SimValueError(
+              'for %d submodels, low-rank network factors (P, Q) should both '
+              'be shape (%d, r)' % (self._n, self._n))
+        return (P, Q, np.zeros(self._n))
+
+    def _init_delays(self, delays):
+        """Collect the delays of all submodels and connections into a single
+        sequence self.delays, recording for each submodel (and for each
+        connection) the indices of its delays in that sequence."""
+        if delays is None:
+            delays = 0.0
+        if np.ndim(delays) == 0:
+            edgedelays = np.full(len(self._sources), float(delays))
+        elif np.shape(delays) != (self._n, self._n):
+            raise SimValueError(
+              'for %d submodels, delays should be scalar or shape (%d,%d)' % (
+              self._n, self._n, self._n))
+        elif sparse.issparse(delays):
+            edgedelays = np.asarray(sparse.csr_matrix(delays)[
+                    self._sources, self._targets], dtype=np.float64).ravel()
+        else:
+            edgedelays = np.asarray(delays, dtype=np.float64)[self._sources,
+                                                              self._targets]
+        alldelays = set(edgedelays[edgedelays > 0])
+        for m in self.submodels:
+            if isinstance(m, (DDEModel, DelayItoModel)):
+                alldelays.update(m.delays)
+        self.delays = tuple(sorted(alldelays))
+        index = dict((d, k) for k, d in enumerate(self.delays))
+        self._sublags = [
+            [index[d] for d in m.delays] if
+            isinstance(m, (DDEModel, DelayItoModel)) else None for
+            m in self.submodels]
+        # for each connection, index of its delay or -1 for no delay
+        self._edgelags = np.array([index[d] if d > 0 else -1 for
+                                   d in edgedelays], dtype=int)
+        self._history = None
 
     def coupling(self, source_y, target_y, weight):
         """How to couple the output of one subsystem to the input of another.
@@ -1083,10 +1749,42 @@ class NetworkModel(Model):
         Returns:
           input (array of shape (d,)): Values to drive each variable of the
             target system.
+
+        (This also accepts a batch of E connections: source_y and target_y of
+        shape (d, E) and weight of shape (E,), returning shape (d, E).)
         """
-        return np.ones_like(target_y)*np.mean(source_y)*weight
+        return np.ones_like(target_y)*np.mean(source_y, axis=0)*weight
 
-    def f(self, y, t):
+    def coupling_batch(self, source_Y, target_Y, weights):
+        """The default coupling function applied to all E connections of the
+        network at once.
+
+        Arguments:
+          source_Y (array of shape (d, E)): States of the source subsystems.
+          target_Y (array of shape (d, E)): States of the target subsystems.
+          weights (array of shape (E,)): the connection strengths.
+
+        Returns:
+          inputs (array of shape (d, E)): Values to drive each variable of
+            the target system of each connection.
+        """
+        return np.ones_like(target_Y)*np.mean(source_Y, axis=0)*weights
+
+    def coupling_terms(self, Y):
+        """The default coupling function in separable form (see __init__):
+        it depends only on the mean of the variables of the source subsystem.
+
+        Arguments:
+          Y (array of shape (d, n)): States of all n subsystems.
+
+        Returns:
+          U (array of shape (1, n)), V (array of shape (d, 1, n))
+        """
+        U = np.mean(Y, axis=0)[np.newaxis]
+        V = np.ones((Y.shape[0], 1, Y.shape[1]))
+        return U, V
+
+    def f(self, y, t, ylag=None):
         """Deterministic term f of the complete network system
         dy = f(y, t)dt + G(y, t).dot(dW)
 
@@ -1095,25 +1793,186 @@ class NetworkModel(Model):
         Args:
           y (array of shape (d,)): where d is the dimension of the overall
             state space of the complete network system. 
+          ylag (array of shape (len(self.delays), d), optional): for a network
+            with delays, the delayed states of the complete network system.
 
         Returns: 
           f (array of shape (d,)):  Defines the deterministic term of the
             complete network system
         """
+        if self._homogeneous:
+            return self._homogeneous_f(y, t)
         coupling = self.coupling_function[0]
         res = np.empty_like(self.y0)
+        batch = self._coupling_batch is not None or self._mean_field is not None
         for j, m in enumerate(self.submodels):
             slicej = slice(self._si[j], self._si[j+1])
             target_y = y[slicej] # target node state
-            res[slicej] = m.f(target_y, t) # deterministic part of submodel j
-            # get indices of all source nodes that provide input to node j:
-            sources = np.nonzero(self.network[:,j])[0]
-            for i in sources:
-                weight = self.network[i, j]
-                source_y = y[slice(self._si[i], self._si[i+1])] # source state
+            # deterministic part of submodel j
+            if ylag is not None and self._sublags[j] is not None:
+                res[slicej] = m.f(target_y, t, ylag[self._sublags[j], slicej])
+            else:
+                res[slicej] = m.f(target_y, t)
+            if batch:
+                continue
+            # all connections that provide input to node j:
+            for e in range(self._inptr[j], self._inptr[j+1]):
+                i = self._sources[e]
+                weight = self._weights[e]
+                slicei = slice(self._si[i], self._si[i+1])
+                if ylag is not None and self._edgelags[e] >= 0:
+                    # delayed source state
+                    source_y = ylag[self._edgelags[e], slicei]
+                else:
+                    source_y = y[slicei] # source state
                 res[slicej] += coupling(source_y, target_y, weight)
+        if self._mean_field is not None:
+            res += self._mean_field_inputs(y)
+        elif batch and len(self._weights) > 0:
+            res += self._batch_inputs(y, ylag)
         return res
 
+    def _mean_field_inputs(self, y):
+        """Total coupling input to each node of the network, computed from
+        the separable coupling terms and the factors (P, Q, D) of the network,
+        whose adjacency matrix is P.dot(Q.T) + diag(D).
+
+        Returns:
+          array of shape (d,), in the same layout as the network state y
+        """
+        Y = y.reshape((self._n, -1)).T
+        U, V = self._coupling_terms[0](Y)
+        P, Q, D = self._mean_field
+        # field[k, j] is the sum over sources i of network[i, j] * U[k, i]
+        field = U.dot(P).dot(Q.T) + U*D
+        inputs = np.einsum('dkn,kn->dn', V, field)
+        return inputs.T.ravel()
+
+    def _batch_inputs(self, y, ylag=None):
+        """Total coupling input to each node of the network, computed for all
+        connections with one call of the batch coupling function. (Requires
+        submodels of equal dimension.)
+
+        Returns:
+          array of shape (d,), in the same layout as the network state y
+        """
+        Y = y.reshape((self._n, -1)).T
+        source_Y = Y[:, self._sources]
+        if ylag is not None:
+            delayed = np.nonzero(self._edgelags >= 0)[0]
+            if len(delayed) > 0:
+                lagged = ylag.reshape((ylag.shape[0], self._n, -1))
+                source_Y[:, delayed] = lagged[self._edgelags[delayed],
+                                              self._sources[delayed]].T
+        inputs = self._coupling_batch[0](source_Y, Y[:, self._targets],
+                                         self._weights)
+        return self._incidence.dot(inputs.T).ravel()
+
+    def _homogeneous_f(self, y, t):
+        """f for a network of identical vectorized submodels. The node states
+        are viewed as one array of shape (subdim, n), the submodel f is
+        evaluated once for all nodes and the coupling once for all edges."""
+        Y = y.reshape((self._n, -1)).T
+        res = self.submodels[0].f(Y, t)
+        if self._mean_field is not None:
+            return res.T.ravel() + self._mean_field_inputs(y)
+        if len(self._weights) > 0:
+            coupling = self._coupling_batch[0]
+            inputs = coupling(Y[:, self._sources], Y[:, self._targets],
+                              self._weights)
+            res = res + self._incidence.dot(inputs.T).T
+        return res.T.ravel()
+
+    def _homogeneous_G(self, y, t):
+        """The submodel noise matrices of a network of identical vectorized
+        submodels, as an array of shape (n, subdim, m), evaluating the
+        submodel G once for all nodes. With shared noise, returns G."""
+        n = self._n
+        Y = y.reshape((n, -1)).T
+        Gs = _noise_matrix(self.submodels[0], Y, t)
+        d, m = Gs.shape[:2]
+        if Gs.ndim == 2:
+            Gs = np.broadcast_to(Gs[np.newaxis], (n, d, m))
+        else:
+            Gs = Gs.transpose((2, 0, 1))
+        if self._independent_noise:
+            return Gs
+        else:
+            return np.ascontiguousarray(Gs).reshape((n*d, m))
+
+    def _block_G(self, y, t):
+        """G for a network with independent noise, as a BlockDiagonal matrix
+        holding only the noise matrix of each submodel. Integrators from
+        nsim.integrators multiply this by the Wiener increments block by
+        block, without forming the dense (d, m) matrix."""
+        if self._homogeneous:
+            return integrators.BlockDiagonal(self._homogeneous_G(y, t))
+        blocks = []
+        for j, m in enumerate(self.submodels):
+            if self._nsubnoises[j] == 0:
+                # deterministic submodel
+                blocks.append(np.zeros((self._sublengths[j], 0)))
+            else:
+                blocks.append(_noise_matrix(m, y[self._si[j]:self._si[j+1]], t))
+        return integrators.BlockDiagonal(blocks)
+
+    def _network_jac(self, y, t):
+        """Jacobian of f for the complete ODE network system, assembled as a
+        sparse matrix from the submodel Jacobians and the coupling Jacobians.
+
+        Args:
+          y (array of shape (d,)): state of the complete network system
+
+        Returns:
+          scipy.sparse.csr_matrix of shape (d, d)
+        """
+        coupling_jac = self._coupling_jac[0]
+        rows, cols, values = [], [], []
+        def add_block(j, i, J):
+            # derivatives of node j variables with respect to node i variables
+            J = np.asarray(J, dtype=np.float64)
+            rows.append(np.repeat(np.arange(self._si[j], self._si[j+1]),
+                                  J.shape[1]))
+            cols.append(np.tile(np.arange(self._si[i], self._si[i+1]),
+                                J.shape[0]))
+            values.append(J.ravel())
+        for j, m in enumerate(self.submodels):
+            target_y = y[self._si[j]:self._si[j+1]]
+            add_block(j, j, m.jac(target_y, t))
+            for e in range(self._inptr[j], self._inptr[j+1]):
+                i = self._sources[e]
+                source_y = y[self._si[i]:self._si[i+1]]
+                Js, Jt = coupling_jac(source_y, target_y, self._weights[e])
+                add_block(j, i, Js)
+                add_block(j, j, Jt)
+        J = sparse.coo_matrix(
+                (np.concatenate(values),
+                 (np.concatenate(rows), np.concatenate(cols))),
+                shape=(self.dimension, self.dimension))
+        return J.tocsr() # duplicate entries are summed
+
+    def _network_jac_sparsity(self):
+        """Which entries of the Jacobian of the network system f can be
+        nonzero (scipy.sparse matrix of shape (d, d)): the blocks of each node
+        with itself and the blocks of each target node with its sources."""
+        rows, cols = [], []
+        for j in range(self._n):
+            sources = self._sources[self._inptr[j]:self._inptr[j+1]]
+            for i in [j] + list(sources):
+                pattern = getattr(self.submodels[j], 'jac_sparsity', None)
+                if i == j and pattern is not None:
+                    r, c = np.nonzero(pattern)
+                else:
+                    r, c = np.nonzero(np.ones((self._sublengths[j],
+                                               self._sublengths[i])))
+                rows.append(r + self._si[j])
+                cols.append(c + self._si[i])
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+        S = sparse.coo_matrix((np.ones(len(rows)), (rows, cols)),
+                              shape=(self.dimension, self.dimension))
+        return (S.tocsr() != 0).astype(np.float64)
+
     def G(self, y, t):
         """Noise coefficient matrix G of the complete network system
         dy = f(y, t)dt + G(y, t).dot(dW)
@@ -1131,30 +1990,50 @@ class NetworkModel(Model):
         """
         if self._independent_noise:
             # then G matrix consists of submodel Gs diagonally concatenated:
-            res = np.zeros((self.dimension, self.nnoises))
-            offset = 0
-            for j, m in enumerate(self.submodels):
-                slicej = slice(self._si[j], self._si[j+1])
-                ix = (slicej, slice(offset, offset + self._nsubnoises[j]))
-                res[ix] = m.G(y[slicej], t) # submodel noise coefficient matrix
-                offset += self._nsubnoises[j]
+            return self._block_G(y, t).toarray()
+        if self._homogeneous:
+            return self._homogeneous_G(y, t)
         else:
             # identical driving: G consists of submodel Gs stacked vertically
-            res = np.empty((self.dimension, self.nnoises))
+            res = np.zeros((self.dimension, self.nnoises))
             for j, m in enumerate(self.submodels):
+                if self._nsubnoises[j] == 0:
+                    continue # deterministic submodel
                 slicej = slice(self._si[j], self._si[j+1])
                 ix = (slicej, slice(None))
-                res[ix] = m.G(y[slicej], t) # submodel noise coefficient matrix
+                res[ix] = _noise_matrix(m, y[slicej], t) # submodel noise
         return res
 
-    def integrate(self, tspan):
+    def integrate(self, tspan, y0=None):
+        if y0 is None:
+            y0 = self.y0
+            self._history = None
         if self.submodel_class is ODEModel:
-            ar = self.integrator[0](self.f, self.y0, tspan)
+            ar = _integrate_ode(self, y0, tspan)
         elif (self.submodel_class is ItoModel or
               self.submodel_class is StratonovichModel):
-            ar = self.integrator[0](self.f, self.G, self.y0, tspan)
+            integrator = _sde_integrator(self)
+            ar = _integrate_sde(self, self._noise_function(integrator), y0,
+                                tspan, integrator)
+        elif self.submodel_class is DDEModel:
+            history = _delay_history(self, tspan, y0, hermite=True)
+            ar = self.integrator[0](self.f, y0, tspan, self.delays, history)
+        elif self.submodel_class is DelayItoModel:
+            history = _delay_history(self, tspan, y0, hermite=False)
+            ar = _integrate_delay_sde(
+                    self, self._noise_function(self.integrator[0]), y0, tspan,
+                    history)
         return Timeseries(ar, tspan)
 
+    def _noise_function(self, integrator):
+        """With independent noise, give the nsim integrators the block
+        diagonal form of G. (Other integrators need the dense matrix.)"""
+        if (self._independent_noise and
+                getattr(integrator, '__module__', None) ==
+                integrators.__name__):
+            return self._block_G
+        return self.G
+
     def __len__(self):
         return len(self.submodels)
 
@@ -1162,11 +2041,11 @@ class NetworkModel(Model):
         return self.submodels[key]
 
     def _number_of_driving_noises(self, submodel):
-        if isinstance(submodel, ODEModel):
+        if isinstance(submodel, (ODEModel, DDEModel)):
             return 0
         else:
             t0 = 0.0
-            return submodel.G(submodel.y0, t0).shape[1]
+            return _noise_matrix(submodel, submodel.y0, t0).shape[1]
 
     @property
     def output_nodes(self):
@@ -1187,6 +2066,9 @@ class NetworkModel(Model):
         """
         if not isinstance(m.y0, numbers.Number):
             return m
+        elif isinstance(m, (DDEModel, DelayItoModel)):
+            raise SimValueError(
+                'Please give y0 as an array for submodels with delays')
         else:
             m = copy.deepcopy(m)
             t0 = 0.0
@@ -1214,7 +2096,10 @@ class NetworkModel(Model):
             if isinstance(m.f(y0_orig, t0), numbers.Number):
                 m.f = make_vector_fn(m.f)
             if hasattr(m, 'G') and isinstance(m.G(y0_orig,t0), numbers.Number):
-                m.G = make_matrix_fn(m.G)
+                if getattr(m, 'noise', 'general') == 'diagonal':
+                    m.G = make_vector_fn(m.G)
+                else:
+                    m.G = make_matrix_fn(m.G)
             if (hasattr(m, 'coupling') and
                     isinstance(m.coupling(y0_orig, y0_orig, 0.5),
                                numbers.Number)):
@@ -1229,7 +2114,7 @@ class NetworkModel(Model):
         if np.count_nonzero(np.diff(self._sublengths)) == 0:
             # then all submodels have the same dimension, so can reshape array
             # in place without copying data:
-            subdim = self.dimension / self._n
+            subdim = self.dimension // self._n
             shp = list(ts.shape)
             shp[1] = self._n
             shp.insert(2, subdim)
@@ -1259,10 +2144,13 @@ class NetworkModel(Model):
         """Introduce a new axis 2 that ranges across nodes of the network"""
         subodim = len(self.submodels[0].output_vars)
         shp = list(ts.shape)
-        shp[1] = subodim
-        shp.insert(2, self._n)
-        ts = ts.reshape(tuple(shp))
-        ts.labels[2] = self._node_labels()
+        # output_vars are ordered node by node, so split axis 1 as
+        # (node, variable) then swap to put the nodes on axis 2
+        shp[1] = len(self._output_nodes)
+        shp.insert(2, subodim)
+        ts = ts.reshape(tuple(shp)).swapaxes(1, 2)
+        node_labels = self._node_labels()
+        ts.labels[2] = [node_labels[k] for k in self._output_nodes]
         return ts
 
 
@@ -1278,7 +2166,10 @@ class Simulation(object):
       output: Some function of the simulated timeseries, for example a 
         univariate time series of a single output variable. 
     """
-    def __init__(self, system, T=60.0, dt=0.005, integrator=None):
+    def __init__(self, system, T=60.0, dt=0.005, integrator=None, stride=1,
+                 output_only=False, filename=None, checkpoint=None,
+                 checkpoint_interval=600.0, warmup=0.0, seed=None,
+                 cache=None):
         """
         Args:
           system (Model): The dynamical system to simulate. (Here you can
@@ -1288,34 +2179,353 @@ class Simulation(object):
             will be instantiated with specific values from the distribution.)
           T (Number, optional): Total length of time to simulate, in seconds.
           dt (Number, optional): Timestep for numerical integration.
+          stride (int, optional): Record the state only every `stride` time
+            steps. The system is still integrated with timestep dt, but the
+            resulting time series has timestep stride*dt.
+          output_only (bool, optional): If True, record only the output
+            variables of the system (for a NetworkModel: the output variables
+            of the output nodes). Then `output` is available without copying,
+            but `timeseries` is not.
           integrator (callable, optional): Which numerical integration
             algorithm to use. If None, the model's default algorithm will be
             used. The integrator function should accept the same arguments as
             the sdeint library, e.g. y = integrator(f, y0, tspan) for an ODE or
-            y = integrator(f, G, y0, tspan) for a SDE.
+            y = integrator(f, G, y0, tspan) for a SDE. nsim's own fixed-step
+            algorithms are in the module `nsim.integrators`, for example
+            `nsim.integrators.itoEuler` or `nsim.integrators.stratHeun`, or
+            for stiff ODE systems `nsim.integrators.bdf`, which makes use of
+            any Jacobian the model defines.
+          filename (str, optional): If given, the results are written into a
+            memory-mapped file of this name as the integration proceeds,
+            instead of being held in memory. This allows runs too long to fit
+            in RAM. The results can be re-opened later, without loading them,
+            using `nsim.timeseries_from_memmap(filename)`.
+          checkpoint (str, optional): If given, periodically save the state of
+            the computation to a file of this name, so that after an
+            interruption `resume()` can continue from there instead of
+            starting again. (Requires a filename for the results, as the
+            partial results are kept in that file.)
+          checkpoint_interval (Number, optional): Minimum wall-clock time in
+            seconds between checkpoints.
+          warmup (Number, optional): Length of initial transient to discard,
+            in seconds. The system is integrated from time 0 but nothing is
+            recorded until time `warmup`, so the time series runs from warmup
+            to T and no memory is spent on the transient.
+          seed (int or numpy.random.SeedSequence, optional): If given, the
+            random numbers for this simulation are drawn from a generator
+            made from this seed, so a new Simulation with the same seed gives
+            identical results. (The simulation then works on a copy of a
+            given model instance, whose `rng` is this generator, leaving the
+            original unseeded.) If None, numpy's global random state is used.
+          cache (str or ResultCache, optional): A directory (or an
+            `nsim.ResultCache`) of results of earlier simulations. If the
+            same simulation was done before (the same model class, parameter
+            values, y0, T, dt, integrator, seed and recording options), its
+            results are memory-mapped from the cache instead of computed.
+            Otherwise they are computed and stored in the cache. Only results
+            that are reproducible are cached: those of systems without noise,
+            or with a seed. The cache is not used if a filename is given.
         """
         if isinstance(system, type):
             self.system = system()
+        elif seed is not None:
+            # the generator belongs to this simulation, not the caller's model
+            self.system = copy.deepcopy(system)
         else:
             self.system = system
         if integrator is not None:
             self.system.integrator = [integrator]
+        if seed is not None:
+            self.system.rng, self.system.levy_rng = _seed_streams(seed)
+        if not isinstance(stride, numbers.Integral) or stride < 1:
+            raise SimValueError('stride should be a positive integer')
+        if checkpoint is not None and filename is None:
+            raise SimValueError(
+                'To use checkpoints, please also give a filename for results')
+        if not 0 <= warmup < T:
+            raise SimValueError('warmup should be at least 0 and less than T')
         self.T = T
         self.dt = dt
+        self.stride = stride
+        self.output_only = output_only
+        self.filename = filename
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.warmup = warmup
+        self.seed = seed
+        if isinstance(cache, str):
+            from .cache import ResultCache
+            cache = ResultCache(cache)
+        self.cache = cache
         self._timeseries = None
+        self._final_state = None
 
     def compute(self):
-         tspan = np.arange(0, self.T + self.dt, self.dt)
-         if hasattr(self.system, 'labels'):
-             labels = [None, self.system.labels]
-         else:
-             labels = [None, None]
-         ar = self.system.integrate(tspan)
-         self._timeseries = Timeseries(ar, tspan, labels)
+        key = self._cache_key()
+        if key is not None and self._load_cached(key):
+            return
+        if (self.stride == 1 and not self.output_only and
+                self.filename is None and self.warmup == 0):
+            tspan = np.arange(0, self.T + self.dt, self.dt)
+            ar = self.system.integrate(tspan)
+            self._timeseries = Timeseries(ar, tspan, self._labels())
+            self._final_state = np.array(ar[-1])
+        else:
+            y = self._warm_up(self.system.y0)
+            self._compute_blocks(y, self._warmup_steps())
+        if key is not None:
+            self._store_cached(key)
+
+    def _cache_key(self):
+        """Hash of everything that determines the results, to find them in
+        the cache (None if they are not to be cached)"""
+        if (self.cache is None or self.filename is not None or
+                not _reproducible(self.system)):
+            return None
+        system = self.system
+        integrator = getattr(system, 'integrator',
+                             (getattr(system, '_integrator', None),))[0]
+        return self.cache.key(system, integrator, self.T, self.dt,
+                              self.stride, self.output_only, self.warmup)
+
+    def _load_cached(self, key):
+        """If the results are in the cache, memory-map them from there,
+        restoring the final state (and random number generators) as if they
+        had been computed. Returns whether they were found."""
+        found = self.cache.get(key)
+        if found is None:
+            return False
+        ar, info, state = found
+        tspan = info['t0'] + info['dt'] * np.arange(ar.shape[0])
+        self._timeseries = Timeseries(ar, tspan, info['labels'])
+        self._final_state = state['final_state']
+        for g, rng_state in zip(_generators(self.system), state['rng']):
+            g.bit_generator.state = rng_state
+        return True
+
+    def _store_cached(self, key):
+        ts = self._timeseries
+        state = {'final_state': self._final_state,
+                 'rng': [g.bit_generator.state for
+                         g in _generators(self.system)]}
+        self.cache.put(key, np.asarray(ts), ts.tspan[0], self.dt*self.stride,
+                       ts.labels, state)
+
+    def extend(self, extra_T):
+        """Continue the simulation for a further length of time extra_T,
+        integrating onwards from the final state (computing the simulation
+        first, if not yet done). The new results are appended to the stored
+        time series. If the results are in a file, the file is grown in place
+        without copying the existing data. (In memory, the existing results
+        must be copied once into a larger array.)
+
+        Args:
+          extra_T (Number): additional length of time to simulate, in seconds.
+        """
+        if self._timeseries is None:
+            self.compute()
+        start = self._nsteps()
+        self.T = self.T + extra_T
+        nrec = (self._nsteps() - self._warmup_steps()) // self.stride + 1
+        if self._nsteps() == start:
+            return
+        ar = self._timeseries
+        i = len(ar)
+        shape = (nrec,) + ar.shape[1:]
+        if self.filename is not None:
+            from .readfile import _resize_memmap
+            ar = _resize_memmap(self.filename, shape)
+        else:
+            ar = np.concatenate((np.asarray(ar),
+                                 np.empty((nrec - i,) + shape[1:], ar.dtype)))
+        self._compute_blocks(self._final_state, start, ar, i)
+
+    def resume(self):
+        """Continue the computation from the last checkpoint saved (or start
+        it, if there is no checkpoint file yet). The model, the integrator
+        state, the random number generator state and the partial results are
+        restored from the checkpoint, so this can be called on a newly
+        created Simulation after the original process was killed.
+        (The random state saved is that of the system's generator for a
+        seeded simulation, otherwise that of numpy's global generator, which
+        is what the integrators in `nsim.integrators` draw from by default.)
+        """
+        if self.checkpoint is None:
+            raise SimValueError('No checkpoint file was given')
+        if not os.path.isfile(self.checkpoint):
+            return self.compute()
+        with open(self.checkpoint, 'rb') as f:
+            state = pickle.load(f)
+        from .readfile import _open_memmap
+        ar, info = _open_memmap(self.filename, 'r+')
+        self.system = state['system']
+        self.T = state['T']
+        np.random.set_state(state['random_state'])
+        self._compute_blocks(state['y'], state['step'], ar, state['rows'])
+
+    def _compute_blocks(self, y, start, ar=None, i=0):
+        """Integrate from state y at time step `start` to the end, at the fine
+        timestep a block at a time, recording the chosen time points and
+        variables of each block into ar (allocating it if None), where i time
+        points have already been recorded."""
+        stride = self.stride
+        nsteps = self._nsteps()
+        w = self._warmup_steps()
+        nrec = (nsteps - w) // stride + 1
+        columns = self._recorded_vars()
+        labels = self._labels()
+        if self.output_only and labels[1] is not None:
+            labels[1] = [labels[1][j] for j in columns]
+        elif self.output_only:
+            labels[1] = None
+        step = start
+        saved = time.time()
+        blocks = self._integrate_blocks(y, start, nsteps, self._block_steps())
+        for tspan, block in blocks:
+            # record every stride steps from the end of warmup. The first
+            # point of a block was already recorded, unless it is the first
+            first = (w - step) % stride
+            if first == 0 and i > 0:
+                first = stride
+            rows = np.asarray(block)[first::stride, columns]
+            if ar is None:
+                ar = self._allocate((nrec,) + rows.shape[1:], rows.dtype,
+                                    labels)
+            ar[i:(i + len(rows))] = rows
+            i += len(rows)
+            step += len(tspan) - 1
+            y = block[-1]
+            if (self.checkpoint is not None and (step == nsteps or
+                    time.time() - saved >= self.checkpoint_interval)):
+                self._save_checkpoint(ar, y, step, i)
+                saved = time.time()
+        if self.filename is not None:
+            ar.flush()
+        tspan = self.dt * (w + stride * np.arange(nrec))
+        self._timeseries = Timeseries(ar, tspan, labels)
+        self._final_state = np.array(y)
+
+    def _warm_up(self, y):
+        """Integrate from initial state y through the warmup period without
+        recording anything, returning the state at the end of warmup."""
+        blocks = self._integrate_blocks(y, 0, self._warmup_steps(),
+                                        self._block_steps())
+        for tspan, ar in blocks:
+            y = ar[-1]
+        return np.asarray(y)
+
+    def _save_checkpoint(self, ar, y, step, rows):
+        """Save what is needed to continue the computation after time step
+        `step`, with `rows` time points recorded in the memmap ar so far."""
+        ar.flush()
+        state = {'system': self.system,
+                 'T': self.T,
+                 'step': step,
+                 'y': np.array(y),
+                 'rows': rows,
+                 'random_state': np.random.get_state()}
+        # write then rename, so an interruption cannot corrupt the checkpoint
+        tmpname = self.checkpoint + '.tmp'
+        with open(tmpname, 'wb') as f:
+            pickle.dump(state, f, protocol=2)
+        os.rename(tmpname, self.checkpoint)
+
+    def _allocate(self, shape, dtype, labels):
+        """Make the array that recorded results will be written into. This is
+        in memory, or is a memory-mapped file if a filename was given."""
+        if self.filename is None:
+            return np.empty(shape, dtype=dtype)
+        from .readfile import _create_memmap
+        return _create_memmap(self.filename, shape, dtype,
+                              self.dt * self._warmup_steps(),
+                              self.dt * self.stride, labels)
+
+    def iter_chunks(self, chunk_seconds=10.0, output=False):
+        """Integrate the system one block of time at a time, yielding each
+        block as soon as it is computed. The integrator state is carried over
+        from the end of one block to the start of the next, so the blocks join
+        up into the same simulation as compute() would give, but only one block
+        is held in memory at a time however long T is. (The results are not
+        stored in this Simulation.)
+
+        Args:
+          chunk_seconds (Number, optional): length of time in each block.
+          output (bool, optional): If True, yield blocks of the model output
+            variables (as `Simulation.output`) instead of all variables.
+
+        Yields:
+          Timeseries for successive blocks of time covering warmup to T. Each
+            time point appears in exactly one block.
+        """
+        block_steps = max(1, int(round(chunk_seconds / self.dt)))
+        labels = self._labels()
+        y = self._warm_up(self.system.y0)
+        blocks = self._integrate_blocks(y, self._warmup_steps(),
+                                        self._nsteps(), block_steps)
+        for i, (tspan, ar) in enumerate(blocks):
+            if i > 0:
+                # first point is the last point of the previous block
+                ar = ar[1:]
+                tspan = tspan[1:]
+            ts = Timeseries(ar, tspan, labels[:])
+            if output:
+                ts = ts[:, self.system.output_vars]
+                if isinstance(self.system, NetworkModel):
+                    ts = self.system._reshape_output(ts)
+            elif isinstance(self.system, NetworkModel):
+                ts = self.system._reshape_timeseries(ts)
+            yield ts
+
+    def _integrate_blocks(self, y, start, stop, block_steps):
+        """Integrate from state y at time step `start` until time step `stop`,
+        at most `block_steps` steps at a time, carrying the final state of
+        each block over as the initial state of the next.
+
+        Yields:
+          (tspan, ar) for each block, where ar[0] is the state at tspan[0]
+        """
+        while start < stop:
+            end = min(start + block_steps, stop)
+            tspan = self.dt * np.arange(start, end + 1)
+            ar = self.system.integrate(tspan, y)
+            y = np.array(ar[-1]) # copy, so the block can be freed
+            yield tspan, ar
+            start = end
+
+    def _block_steps(self):
+        """Number of time steps to integrate at once when recording with a
+        stride: a multiple of the stride, giving blocks of about 2**20 numbers
+        """
+        per_step = np.size(self.system.y0) * self.stride
+        return max(1, 2**20 // per_step) * self.stride
+
+    def _recorded_vars(self):
+        if self.output_only:
+            return list(self.system.output_vars)
+        else:
+            return slice(None)
+
+    def _warmup_steps(self):
+        """Number of time steps of size dt in the warmup period"""
+        return int(round(self.warmup / self.dt))
+
+    def _nsteps(self):
+        """Number of time steps of size dt to simulate from 0 to T"""
+        # same count as np.arange(0, T + dt, dt), without making the array
+        return int(np.ceil((self.T + self.dt) / self.dt)) - 1
+
+    def _labels(self):
+        if hasattr(self.system, 'labels'):
+            return [None, self.system.labels]
+        else:
+            return [None, None]
 
     @property
     def timeseries(self):
         """Simulated time series"""
+        if self.output_only:
+            raise SimValueError(
+                'only the output was recorded (output_only=True). Use .output')
         if self._timeseries is None:
             self.compute()
         if isinstance(self.system, NetworkModel):
@@ -1328,7 +2538,10 @@ class Simulation(object):
         """Simulated model output"""
         if self._timeseries is None:
             self.compute()
-        output = self._timeseries[:, self.system.output_vars]
+        if self.output_only:
+            output = self._timeseries
+        else:
+            output = self._timeseries[:, self.system.output_vars]
         if isinstance(self.system, NetworkModel):
             return self.system._reshape_output(output)
         else:
@@ -1344,7 +2557,9 @@ class MultipleSim(object):
       timeseries: resulting timeseries: all variables of all simulations
       output: resulting timeseries: output variables of all simulations
     """
-    def __init__(self, systems, T=60.0, dt=0.005, integrator=None):
+    def __init__(self, systems, T=60.0, dt=0.005, integrator=None,
+                 ensemble=False, filename=None, checkpoint=None,
+                 warmup=0.0, parameters=None, seed=None, cache=None):
         """
         Args:
           systems: sequence of Model instances that should be simulated.
@@ -1355,14 +2570,105 @@ class MultipleSim(object):
             used. The integrator function should accept the same arguments as
             the sdeint library, e.g. y = integrator(f, y0, tspan) for an ODE or
             y = integrator(f, G, y0, tspan) for a SDE.
+          ensemble (bool, optional): If True, integrate all the systems 
+            together, stacking their states into a single array of shape
+            (dimension, n) that is advanced by one vectorized update at each
+            time step. This requires identical, vectorized systems (see
+            `Model.vectorized`) that differ only in their initial state.
+          filename (str or sequence of str, optional): If given, write the
+            results into memory-mapped files instead of holding them in memory
+            (see `Simulation`). Either one filename for each system, or a
+            single filename which is then numbered for each system, e.g.
+            'run.dat' becomes 'run_0.dat', 'run_1.dat', ... In ensemble mode,
+            a single file holds the whole batch, as an array of shape
+            (len(tspan), dimension, n).
+          checkpoint (str or sequence of str, optional): If given, save
+            checkpoints so that `resume()` can continue after an interruption
+            (see `Simulation`). Checkpoint filenames are numbered in the same
+            way as `filename`.
+          warmup (Number, optional): Length of initial transient to integrate
+            without recording, in seconds. (see `Simulation`)
+          parameters (sequence of str, optional): In ensemble mode, names of
+            parameters whose values may differ between the systems. In the
+            batch each of these is an array of shape (n,), which the model's
+            f and G must broadcast against the states of shape (dimension, n).
+          seed (int, SeedSequence or sequence, optional): If given, each
+            simulation draws its random numbers from its own independent
+            stream, seeded by a child spawned from this seed for each system.
+            (Or give a list of one seed for each system.) In ensemble mode,
+            each realization of the batch still draws from its own stream.
+          cache (str or ResultCache, optional): directory of cached results
+            (see `Simulation`). Each simulation is cached separately, or in
+            ensemble mode the batch is cached as a whole.
         """
         self.T = T
         self.dt = dt
-        self.sims = [Simulation(s, T, dt, integrator) for s in systems]
+        self.ensemble = ensemble
+        self.seeds = _spawn_seeds(seed, len(systems))
+        if seed is None:
+            _check_streams(systems)
+        if ensemble:
+            for fn in (filename, checkpoint):
+                if fn is not None and not isinstance(fn, str):
+                    raise SimValueError(
+                        'in ensemble mode, give a single filename')
+            self.sims = [Simulation(s, T, dt, integrator, warmup=warmup,
+                                    seed=sd) for
+                         s, sd in zip(systems, self.seeds)]
+            batch = _Ensemble([s.system for s in self.sims], parameters)
+            self._batchsim = Simulation(batch, T, dt, filename=filename,
+                                        checkpoint=checkpoint, warmup=warmup,
+                                        cache=cache)
+        else:
+            filenames = _numbered_filenames(filename, len(systems))
+            checkpoints = _numbered_filenames(checkpoint, len(systems))
+            self.sims = [Simulation(s, T, dt, integrator, filename=fn,
+                                    checkpoint=cp, warmup=warmup, seed=sd,
+                                    cache=cache) for
+                         s, fn, cp, sd in zip(systems, filenames, checkpoints,
+                                              self.seeds)]
 
     def compute(self):
-        for s in self.sims:
-            s.compute()
+        if self.ensemble:
+            self._compute_ensemble()
+        else:
+            for s in self.sims:
+                s.compute()
+
+    def resume(self):
+        """Continue each simulation from its last checkpoint"""
+        if self.ensemble:
+            self._compute_ensemble(resume=True)
+        else:
+            for s in self.sims:
+                s.resume()
+
+    def extend(self, extra_T):
+        """Continue all simulations for a further length of time extra_T,
+        from their final states (see `Simulation.extend`)"""
+        self.T = self.T + extra_T
+        if self.ensemble:
+            self._batchsim.extend(extra_T)
+            self._split_ensemble()
+        else:
+            for s in self.sims:
+                s.extend(extra_T)
+
+    def _compute_ensemble(self, resume=False):
+        """Integrate all simulations at once as a batch of shape (d, n). Each
+        simulation's timeseries is then a view on the batch result."""
+        if resume:
+            self._batchsim.resume()
+        else:
+            self._batchsim.compute()
+        self._split_ensemble()
+
+    def _split_ensemble(self):
+        ts = self._batchsim._timeseries
+        ar = np.asarray(ts)
+        for i, s in enumerate(self.sims):
+            s.T = self._batchsim.T
+            s._timeseries = Timeseries(ar[..., i], ts.tspan, ts.labels[:2])
 
     def __len__(self):
         return len(self.sims)
@@ -1418,6 +2724,278 @@ class MultipleSim(object):
         return ts
 
 
+class _Ensemble(object):
+    """A batch of identical vectorized systems that differ only in their
+    initial state, presented as one system whose state has shape
+    (dimension, n). A MultipleSim in ensemble mode simulates this.
+
+    The systems may also differ in the values of the named `parameters`. The
+    batch is then integrated by a copy of the first system in which each of
+    those parameters is an array of shape (n,) holding every system's value.
+    If the systems have random number generators, each realization draws
+    from the generator of its own system.
+    """
+    def __init__(self, systems, parameters=None):
+        parameters = tuple(parameters or ())
+        _check_ensemble(systems, parameters)
+        self.systems = systems
+        system = systems[0]
+        rngs = [m.rng for m in systems]
+        if parameters or rngs[0] is not None:
+            system = copy.deepcopy(system)
+            for name in parameters:
+                setattr(system, name,
+                        np.array([getattr(m, name) for m in systems]))
+            if rngs[0] is not None:
+                system.rng = rngs
+                if systems[0].levy_rng is not None:
+                    system.levy_rng = [m.levy_rng for m in systems]
+        self._system = system
+        self.dimension = system.dimension
+        self.labels = system.labels
+        self.output_vars = system.output_vars
+        self.y0 = np.column_stack([m.y0 for m in systems])
+        self._integrator = _batch_integrator(system)
+
+    def integrate(self, tspan, y0=None):
+        system = self._system
+        if y0 is None:
+            y0 = self.y0
+        if isinstance(system, ODEModel):
+            return self._integrator(system.f, y0, tspan)
+        elif self._integrator is integrators.itoLinear:
+            return np.asarray(system.integrate(tspan, y0))
+        else:
+            return self._integrator(system.f, system.G, y0, tspan,
+                                    noise=system.noise,
+                                    **_rng_kwargs(system, self._integrator))
+
+
+def _reproducible(system):
+    """Whether simulating the system always gives the same results: either
+    it has no noise, or it draws its noise from its own generator"""
+    if isinstance(system, _Ensemble):
+        system = system._system
+    if system.rng is not None:
+        return True
+    if isinstance(system, NetworkModel):
+        return system.submodel_class in (ODEModel, DDEModel)
+    return isinstance(system, (ODEModel, DDEModel))
+
+
+def _generators(system):
+    """The random number generators a system draws from, as a list"""
+    if isinstance(system, _Ensemble):
+        system = system._system
+    generators = []
+    for rng in (getattr(system, 'rng', None),
+                getattr(system, 'levy_rng', None)):
+        if isinstance(rng, (list, tuple)):
+            generators.extend(rng)
+        elif rng is not None:
+            generators.append(rng)
+    return generators
+
+
+def _check_streams(systems):
+    """Validate that no two systems would draw the same random numbers (as
+    copies of a model with its own generator would).
+
+    Raises:
+      SimValueError
+    """
+    states = [repr(g.bit_generator.state) for m in systems for
+              g in _generators(m)]
+    if len(set(states)) < len(states):
+        raise SimValueError(
+            """Some systems have random number generators in the same state,
+            so they would all receive the same noise. Give a seed to make
+            independent streams, or set their rng to None.""")
+
+
+def _seed_streams(seed):
+    """Make the two generators of a seeded simulation: one for the Wiener
+    increments and one for the Levy areas (see `Model.levy_rng`). They are
+    children of the seed, made without spawning from it, so that a given
+    SeedSequence always gives the same streams."""
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [np.random.default_rng(np.random.SeedSequence(
+                seed.entropy, spawn_key=tuple(seed.spawn_key) + (k,),
+                pool_size=seed.pool_size)) for k in (0, 1)]
+
+
+def _spawn_seeds(seed, n):
+    """Make a seed for each of n simulations, giving independent streams of
+    random numbers: child SeedSequences are spawned from the given seed,
+    unless it is already a sequence of n seeds. (If seed is None, returns
+    None for each.)"""
+    if seed is None:
+        return [None] * n
+    if isinstance(seed, (list, tuple)):
+        if len(seed) != n:
+            raise SimValueError('expected %d seeds' % n)
+        return list(seed)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+
+def _numbered_filenames(filename, n):
+    """Make a distinct filename for each of n simulations, by numbering the
+    given filename e.g. 'run.dat' -> ['run_0.dat', 'run_1.dat', ...]
+    (If filename is None, or is already a sequence of filenames, it is
+    returned as a list of length n.)"""
+    if filename is None:
+        return [None] * n
+    if not isinstance(filename, str):
+        if len(filename) != n:
+            raise SimValueError('expected %d filenames' % n)
+        return list(filename)
+    root, ext = os.path.splitext(filename)
+    return ['%s_%d%s' % (root, i, ext) for i in range(n)]
+
+
+def _block_filenames(filename, sublengths, ensemble):
+    """Split the numbered filenames for the simulations of a DistSim into the
+    blocks given to each MultipleSim. In ensemble mode each block has a single
+    file (numbered by block) rather than one for each simulation."""
+    if ensemble:
+        return _numbered_filenames(filename, len(sublengths))
+    filenames = _numbered_filenames(filename, sum(sublengths))
+    blocks = []
+    low = 0
+    for length in sublengths:
+        blocks.append(filenames[low:(low + length)])
+        low += length
+    return blocks
+
+
+def _check_ensemble(systems, parameters=()):
+    """Validate that a list of systems can be integrated together as a batch.
+    (They may differ only in y0 and in the values of the named parameters.)
+
+    Raises:
+      SimValueError
+    """
+    system = systems[0]
+    if not isinstance(system, (ODEModel, ItoModel, StratonovichModel)):
+        raise SimValueError(
+            'ensemble mode supports ODEModel, ItoModel and StratonovichModel')
+    if not system.vectorized:
+        raise SimValueError(
+            """%s does not declare vectorized = True, so it cannot be
+            integrated as an ensemble.""" % type(system).__name__)
+    if any((m.rng is None) != (system.rng is None) for m in systems):
+        raise SimValueError(
+            'in ensemble mode, either all or none of the systems are seeded')
+    if not all(_same_parameters(m, system, parameters) for
+               m in systems[1:]):
+        raise SimValueError(
+            """ensemble mode requires identical systems (they may differ only
+            in their initial state y0 and any parameters named by
+            `parameters`)""")
+
+
+def _broadcasts(systems, parameters):
+    """Whether systems differing in the named parameters can be integrated
+    together as a batch: they satisfy `_check_ensemble`, and f and G of a
+    batch of two of them, with those parameters as arrays, return arrays of
+    the batch shapes"""
+    try:
+        _check_ensemble(systems, parameters)
+    except SimValueError:
+        return False
+    probe = (list(systems) * 2)[:2]
+    system = copy.deepcopy(probe[0])
+    for name in parameters:
+        setattr(system, name, np.array([getattr(m, name) for m in probe]))
+    y = np.column_stack([m.y0 for m in probe])
+    try:
+        with np.errstate(all='ignore'):
+            if np.shape(system.f(y, 0.0)) != y.shape:
+                return False
+            if isinstance(system, ODEModel):
+                return True
+            shape = np.shape(system.G(y, 0.0))
+    except Exception:
+        return False
+    if system.noise == 'diagonal':
+        return shape == y.shape
+    return len(shape) in (2, 3) and shape[0] == y.shape[0] and (
+            len(shape) == 2 or shape[2] == 2)
+
+
+def _uniform_factors(network):
+    """If the adjacency matrix is uniform all-to-all (every connection i->j
+    with i != j has the same nonzero weight, and each node the same self
+    connection), return factors (P, Q, D) such that network equals
+    P.dot(Q.T) + diag(D). Otherwise return None."""
+    n = network.shape[0]
+    if n < 2:
+        return None
+    if sparse.issparse(network):
+        if network.nnz < n*(n - 1):
+            return None
+        network = network.toarray()
+    c = network[0, 1]
+    diag = np.diagonal(network)
+    if (c == 0 or np.any(diag != diag[0]) or
+            np.any(network[~np.eye(n, dtype=bool)] != c)):
+        return None
+    return (np.full((n, 1), float(c)), np.ones((n, 1)),
+            np.full(n, float(diag[0] - c)))
+
+
+def _noise_matrix(model, y, t):
+    """The noise coefficient matrix G of a model at state y, of shape (d, m)
+    (or (d, m, n) for a batch), also for a model declaring diagonal noise"""
+    G = model.G(y, t)
+    if getattr(model, 'noise', 'general') == 'diagonal':
+        return integrators._diagonal_matrix(G)
+    return np.asarray(G)
+
+
+def _same_parameters(m1, m2, ignore=()):
+    """Whether two model instances have the same class and parameter values
+    (ignoring the initial state y0, the random number generators and any
+    parameters named in `ignore`)"""
+    if type(m1) is not type(m2):
+        return False
+    d1 = vars(m1)
+    d2 = vars(m2)
+    if set(d1) != set(d2):
+        return False
+    return all(np.array_equal(d1[k], d2[k]) for k in d1 if
+               k not in ('y0', 'rng', 'levy_rng') and k not in ignore)
+
+
+def _batch_integrator(system):
+    """Choose an integration function able to advance a batch of states of
+    this system together. Uses the system's integrator if it supports batches
+    (after replacing an sdeint default as `_sde_integrator` does), otherwise
+    the default nsim integrator for that kind of system."""
+    integrator = system.integrator[0]
+    if isinstance(system, (ItoModel, StratonovichModel)):
+        chosen = _sde_integrator(system)
+    else:
+        chosen = integrator
+    if getattr(chosen, '__module__', None) == integrators.__name__:
+        return chosen
+    if isinstance(system, ODEModel):
+        default = integrators.odeint
+    elif isinstance(system, ItoModel):
+        default = integrators.itoSRI2
+    else:
+        default = integrators.stratHeun
+    if integrator is not type(system).integrator[0]:
+        warnings.warn(
+            '%s cannot integrate an ensemble. Using nsim.integrators.%s' % (
+                getattr(integrator, '__name__', integrator), default.__name__),
+            RuntimeWarning, 1)
+    return default
+
+
 @distob.proxy_methods(Simulation)
 class RemoteSimulation(distob.Remote, Simulation):
     """Local object representing a remote Simulation"""
@@ -1435,6 +3013,16 @@ class RemoteSimulation(distob.Remote, Simulation):
         from distob import methodcall
         methodcall(self, 'compute', prefer_local=False, block=False)
 
+    def resume(self):
+        """Continue the computation asynchronously from the last checkpoint"""
+        from distob import methodcall
+        methodcall(self, 'resume', prefer_local=False, block=False)
+
+    def extend(self, extra_T):
+        """Start extending the simulation in time, asynchronously"""
+        from distob import methodcall
+        methodcall(self, 'extend', extra_T, prefer_local=False, block=False)
+
     def __repr__(self):
         return '<%s at %s on engine %d>' % (
                 self.__class__.__name__, hex(self._id[0]), self._id[1])
@@ -1457,6 +3045,16 @@ class RemoteMultipleSim(distob.Remote, MultipleSim):
         from distob import methodcall
         methodcall(self, 'compute', prefer_local=False, block=False)
 
+    def resume(self):
+        """Continue the computation asynchronously from the last checkpoint"""
+        from distob import methodcall
+        methodcall(self, 'resume', prefer_local=False, block=False)
+
+    def extend(self, extra_T):
+        """Start extending the simulation in time, asynchronously"""
+        from distob import methodcall
+        methodcall(self, 'extend', extra_T, prefer_local=False, block=False)
+
     def __repr__(self):
         s = '%s([\n' % self.__class__.__name__
         for i in range(len(self)):
@@ -1476,7 +3074,9 @@ class DistSim(object):
       timeseries: resulting timeseries: all variables of all simulations
       output: resulting timeseries: output variables of all simulations
     """
-    def __init__(self, systems, T=60.0, dt=0.005, integrator=None):
+    def __init__(self, systems, T=60.0, dt=0.005, integrator=None,
+                 ensemble=False, filename=None, checkpoint=None,
+                 warmup=0.0, parameters=None, seed=None, cache=None):
         """
         Args:
           systems: sequence of Model instances that should be simulated.
@@ -1487,44 +3087,99 @@ class DistSim(object):
             used. The integrator function should accept the same arguments as
             the sdeint library, e.g. y = integrator(f, y0, tspan) for an ODE or
             y = integrator(f, G, y0, tspan) for a SDE.
+          ensemble (bool, optional): If True, each compute engine integrates
+            its whole block of simulations together as one batch. (see
+            `MultipleSim`)
+          filename (str, optional): If given, each simulation writes its
+            results into its own memory-mapped file, named by numbering this
+            filename, e.g. 'run.dat' becomes 'run_0.dat', 'run_1.dat', ...
+            In ensemble mode there is one such file for each block of
+            simulations. The files must be on storage the engines can reach.
+          checkpoint (str, optional): If given, each block of simulations
+            saves checkpoints to numbered files of this name. Then if an
+            engine is lost, creating the DistSim again with the same arguments
+            (or calling `resume()`) redoes only the work done since the last
+            checkpoints. (see `Simulation`)
+          warmup (Number, optional): Length of initial transient to integrate
+            without recording, in seconds. (see `Simulation`)
+          parameters (sequence of str, optional): In ensemble mode, names of
+            parameters whose values may differ between the systems of a
+            batch. (see `MultipleSim`)
+          seed (int or SeedSequence, optional): If given, a child seed is
+            spawned for each simulation, so each draws its random numbers
+            from its own independent stream whichever engine it runs on. Then
+            the ith simulation can be repeated on its own, without the
+            others, by `Simulation(system, ..., seed=self.seeds[i])`. This
+            gives the same results (up to rounding, in ensemble mode) as long
+            as the same integrator is used: in ensemble mode, an integrator
+            that cannot integrate a batch is replaced by a default one, so
+            give one from `nsim.integrators` to both.
+          cache (str or ResultCache, optional): directory of cached results,
+            on storage that the engines can reach. Each block of simulations
+            looks up and stores its results there. (see `MultipleSim`)
         """
         self.T = T
         self.dt = dt
         self._n = len(systems)
         n = self._n
+        self.seeds = _spawn_seeds(seed, n)
+        if seed is None:
+            _check_streams(systems)
         if n == 1:
-            return distob.scatter(Simulation(systems[0], T, dt, integrator))
+            return distob.scatter(Simulation(systems[0], T, dt, integrator,
+                                             filename=filename,
+                                             checkpoint=checkpoint,
+                                             warmup=warmup,
+                                             seed=self.seeds[0], cache=cache))
+        if ensemble:
+            _check_ensemble(systems, parameters or ())
         if distob.engine is None:
             distob.setup_engines()
         ne = distob.engine.nengines
         blocksize = ((n - 1) // ne) + 1
         if blocksize > n:
             blocksize = n
+        sublengths = [blocksize] * (n // blocksize)
+        if n % blocksize != 0:
+            sublengths.append(n % blocksize)
+        filenames = _block_filenames(filename, sublengths, ensemble)
+        checkpoints = _block_filenames(checkpoint, sublengths, ensemble)
         self._subsims = []
-        sublengths = []
         si = [0]
         low = 0
-        for i in range(0, n // blocksize):
-            high = low + blocksize
-            self._subsims.append(
-                    MultipleSim(systems[low:high], T, dt, integrator))
-            sublengths.append(blocksize)
-            si.append(si[-1] + sublengths[-1])
-            low += blocksize
-        if n % blocksize != 0:
-            high = low + (n % blocksize)
-            self._subsims.append(
-                    MultipleSim(systems[low:high], T, dt, integrator))
-            sublengths.append(high - low)
-            si.append(si[-1] + sublengths[-1])
+        for b, length in enumerate(sublengths):
+            high = low + length
+            self._subsims.append(MultipleSim(
+                    systems[low:high], T, dt, integrator, ensemble,
+                    filenames[b], checkpoints[b], warmup, parameters,
+                    self.seeds[low:high], cache))
+            si.append(high)
+            low = high
         self._sublengths = tuple(sublengths)
         self._si = tuple(si)
         # a surragate ndarray to help with slicing
         self._placeholders = np.arange(n, dtype=int)
         # distribute them on cluster and start computation:
         self._subsims = distob.scatter(self._subsims)
+        if checkpoint is None:
+            for rms in self._subsims:
+                rms.compute()
+        else:
+            # continue from any checkpoints left by an earlier attempt
+            self.resume()
+
+    def resume(self):
+        """Continue the computation of each block of simulations from its
+        last checkpoint"""
         for rms in self._subsims:
-            rms.compute()
+            rms.resume()
+
+    def extend(self, extra_T):
+        """Continue all simulations for a further length of time extra_T,
+        from their final states (see `Simulation.extend`)"""
+        self.T = self.T + extra_T
+        for rms in self._subsims:
+            rms.extend(extra_T)
 
     def __len__(self):
         return self._n
@@ -1648,7 +3303,8 @@ class RepeatedSim(DistSim):
       output: resulting timeseries: output variables of all simulations
     """
     def __init__(self, system, T=60.0, dt=0.005, repeat=1, identical=True,
-                 integrator=None):
+                 integrator=None, ensemble=False, filename=None,
+                 checkpoint=None, warmup=0.0, seed=None, cache=None):
         """
         Args:
           system (Model): The dynamical system to simulate. (Here you can
@@ -1675,6 +3331,35 @@ class RepeatedSim(DistSim):
             used. The integrator function should accept the same arguments as
             the sdeint library, e.g. y = integrator(f, y0, tspan) for an ODE or
             y = integrator(f, G, y0, tspan) for a SDE.
+
+          ensemble (bool, optional): If True, the repetitions on each compute
+            engine are stacked into a single state array of shape
+            (dimension, repeat) and advanced together by vectorized updates,
+            instead of integrating each repetition separately. This requires
+            a model with vectorized = True. (With identical=False, the random
+            parameters are then held as arrays of shape (repeat,), which the
+            model's f and G must broadcast against the states. This is not
+            available for a NetworkModel.)
+
+          filename (str, optional): If given, write the results into numbered
+            memory-mapped files instead of holding them in memory. (see
+            `DistSim`)
+
+          checkpoint (str, optional): If given, save checkpoints to numbered
+            files of this name, so that an interrupted run can be continued by
+            creating the RepeatedSim again with the same arguments, or by
+            calling `resume()`. (see `DistSim`)
+
+          warmup (optional): length of initial transient to integrate without
+            recording, in seconds. The time series then run from warmup to T.
+
+          seed (int or SeedSequence, optional): If given, each repetition
+            draws its noise from its own independent stream of random numbers
+            spawned from this seed, so the results are reproducible and any
+            one repetition can be re-run alone. (see `DistSim`)
+
+          cache (str or ResultCache, optional): directory of cached results.
+            (see `DistSim`)
         """
         if isinstance(system, type):
             self.modelclass = system # class
@@ -1682,32 +3367,480 @@ class RepeatedSim(DistSim):
         else:
             self.modelclass = type(system) # class
             model = system # instance
+        parameters = None
         if identical is True:
             systems = [copy.deepcopy(model) for i in range(repeat)]
+            for m in systems:
+                # copies of a generator would give every repetition the same
+                # noise. (With a seed, each gets its own generator instead.)
+                m.rng = None
+                m.levy_rng = None
         else:
             if isinstance(model, NetworkModel):
-                network = model.network
-                coupling = model.coupling_function[0]
-                independent_noise = model._independent_noise
-                systems = []
-                for i in range(repeat):
-                    # generate new, non-identical instances of each sub-model
-                    submodels = [type(m)() for m in model.submodels]
-                    networkmodel = self.modelclass(submodels, network,
-                                                   coupling, independent_noise)
-                    systems.append(networkmodel)
+                if ensemble:
+                    raise SimValueError(
+                        'ensemble mode requires identical=True for a network')
+                systems = _sampled_networks(model, repeat)
             else:
-                systems = [self.modelclass() for i in range(repeat)]
-        super(RepeatedSim, self).__init__(systems, T, dt, integrator)
+                systems = self.modelclass.sample(repeat)
+                parameters = [attrib for attrib in
+                              self.modelclass._random_attributes() if
+                              attrib != 'y0']
+        super(RepeatedSim, self).__init__(systems, T, dt, integrator,
+                                          ensemble, filename, checkpoint,
+                                          warmup, parameters, seed, cache)
 
     def _node_labels(self):
         return ['repetition %d' % i for i in range(self._n)]
 
 
 class ParameterSim(DistSim):
-    """Separate simulations of a model to explore a lattice of different
-    parameter values."""
-    pass
+    """Simulations of a model to explore a lattice of different parameter
+    values, distributed on multiple compute engines.
+
+    Like a list, indexing the object with [i] gives access to the ith simulation
+
+    For a vectorized model, each compute engine integrates its whole block of
+    the lattice as one batch, with the varied parameters held as arrays of
+    shape (n,) that broadcast against the states of shape (dimension, n).
+    (Unless f or G cannot take the varied parameters as arrays: then each
+    point is simulated separately. See the `ensemble` argument.)
+
+    Attributes:
+      modelclass: the Model class common to all the simulations
+      parameters (list of str): names of the parameters that are varied
+      lattice (array of shape (n, len(parameters))): parameter values of
+        each of the n simulations
+      timeseries: resulting timeseries: all variables of all simulations
+      output: resulting timeseries: output variables of all simulations
+    """
+    def __init__(self, system, parameters, T=60.0, dt=0.005,
+                 integrator=None, ensemble=None, filename=None,
+                 checkpoint=None, warmup=0.0, points=None, seed=None,
+                 cache=None):
+        """
+        Args:
+          system (Model): The dynamical system to simulate. (Either a Model
+            class or a Model instance.) Parameters that are not varied keep
+            the values of this model.
+
+          parameters (dict or sequence of pairs): maps the name of each
+            parameter to vary to a sequence of values. Every combination of
+            values is simulated, with the last parameter varying fastest.
+            (The items of a dict are taken in order of parameter name.)
+
+          T (optional): total length of time to simulate, in seconds.
+
+          dt (optional): timestep for numerical integration.
+
+          integrator (callable, optional): Which numerical integration
+            algorithm to use. If None, the model's default algorithm will be
+            used.
+
+          ensemble (bool, optional): If True, the simulations on each compute
+            engine are integrated together as one batch. This requires a
+            vectorized model whose f and G also accept each varied parameter
+            as an array of shape (n,) (e.g. `self.lam * y` broadcasts over
+            the batch, but a parameter used to build a matrix usually does
+            not). If None, batches are used if the model is vectorized and
+            evaluating its f and G once with the varied parameters as arrays
+            gives results of the batch shapes.
+
+          filename (str, optional): If given, write the results into numbered
+            memory-mapped files. (see `DistSim`)
+
+          checkpoint (str, optional): If given, save checkpoints to numbered
+            files of this name. (see `DistSim`)
+
+          warmup (optional): length of initial transient to integrate without
+            recording, in seconds.
+
+          points (array of shape (n, len(parameters)), optional): If given,
+            simulate exactly these points in parameter space instead of the
+            whole lattice. Then `parameters` may be just the parameter names.
+
+          seed (int or SeedSequence, optional): If given, each simulation
+            draws its noise from its own independent, reproducible stream of
+            random numbers. (see `DistSim`)
+
+          cache (str or ResultCache, optional): directory of cached results.
+            (see `DistSim`)
+        """
+        if isinstance(system, type):
+            self.modelclass = system
+            model = self.modelclass()
+        else:
+            self.modelclass = type(system)
+            model = system
+        if isinstance(parameters, dict):
+            parameters = sorted(parameters.items())
+        if points is None:
+            self.parameters = [name for name, values in parameters]
+            values = [np.ravel(values) for name, values in parameters]
+            self.lattice = np.array(list(itertools.product(*values)))
+        else:
+            self.parameters = [p if isinstance(p, str) else p[0] for
+                               p in parameters]
+            self.lattice = np.array(points, dtype=np.float64).reshape(
+                    (-1, len(self.parameters)))
+        systems = []
+        for point in self.lattice:
+            s = copy.deepcopy(model)
+            for name, value in zip(self.parameters, point):
+                setattr(s, name, value)
+            systems.append(s)
+        if ensemble is None:
+            ensemble = _broadcasts(systems, self.parameters)
+        super(ParameterSim, self).__init__(systems, T, dt, integrator,
+                                           ensemble, filename, checkpoint,
+                                           warmup, self.parameters, seed,
+                                           cache)
+
+    def _node_labels(self):
+        return [', '.join('%s=%g' % pair for pair in
+                          zip(self.parameters, point)) for
+                point in self.lattice]
+
+
+class AdaptiveParameterSim(object):
+    """Explores parameter space with simulations that are concentrated where
+    the behaviour of the model changes.
+
+    A coarse lattice of parameter values is simulated first, and a scalar
+    summary of each simulation is computed (for example the mean of an
+    order parameter, or the frequency of the peak of the power spectrum).
+    Then each cell of the lattice across which the summary changes by more
+    than `threshold` is divided in two along every parameter axis, and only
+    the new points of those cells are simulated. This is repeated `levels`
+    times. Each round of simulations is a `ParameterSim`, distributed on the
+    compute engines, and the summaries are computed on the engines where
+    the simulations are. So boundaries between dynamical regimes are
+    resolved as finely as a uniform lattice 2**levels times denser would,
+    using a fraction of the simulations.
+
+    Attributes:
+      parameters (list of str): names of the parameters that are varied
+      points (array of shape (n, len(parameters))): parameter values of all
+        the n simulations done, in the order they were scheduled
+      summaries (array of shape (n,)): the summary of each simulation
+      rounds (list of ParameterSim): the simulations done in each round
+    """
+    def __init__(self, system, parameters, summary, levels=3, threshold=None,
+                 T=60.0, dt=0.005, integrator=None, ensemble=None,
+                 warmup=0.0):
+        """
+        Args:
+          system (Model): The dynamical system to simulate. (Either a Model
+            class or a Model instance.)
+
+          parameters (dict or sequence of pairs): maps the name of each
+            parameter to vary to an increasing sequence of values, giving the
+            coarse lattice. (A dict is taken in order of parameter name.)
+
+          summary (callable): function f(output) -> Number, computing a
+            summary of the output Timeseries of one simulation.
+
+          levels (int, optional): how many times cells may be subdivided.
+
+          threshold (Number, optional): subdivide a cell if the summary varies
+            by more than this between its corners. If None, uses one tenth
+            of the range of the summary over the coarse lattice.
+
+          T, dt, integrator, ensemble, warmup (optional): see `ParameterSim`
+        """
+        if isinstance(system, type):
+            system = system()
+        if isinstance(parameters, dict):
+            parameters = sorted(parameters.items())
+        self.parameters = [name for name, values in parameters]
+        self._values = [np.ravel(values) for name, values in parameters]
+        self.summary = summary
+        self.levels = levels
+        self.threshold = threshold
+        self._system = system
+        self._simargs = dict(T=T, dt=dt, integrator=integrator,
+                             ensemble=ensemble, warmup=warmup)
+        self.rounds = []
+        self._points = None
+        self._summaries = None
+
+    def compute(self):
+        self.rounds = []
+        indices, summaries = _adaptive_refinement(
+                [len(v) for v in self._values], self._evaluate, self.levels,
+                self.threshold)
+        self._points = self._to_values(indices)
+        self._summaries = summaries
+
+    def _to_values(self, indices):
+        """Convert indices on the finest lattice to parameter values"""
+        scale = 2.0**self.levels
+        indices = np.asarray(indices, dtype=np.float64).reshape(
+                (-1, len(self._values)))
+        return np.column_stack(
+                [np.interp(indices[:, k] / scale, np.arange(len(v)), v) for
+                 k, v in enumerate(self._values)])
+
+    def _evaluate(self, indices):
+        """Simulate the given points of the finest lattice as one round,
+        returning the summary of each"""
+        points = self._to_values(indices)
+        if len(points) == 1:
+            # (a DistSim of a single simulation is not a sequence of sims)
+            points = np.concatenate((points, points))
+        sims = ParameterSim(self._system, self.parameters, points=points,
+                            **self._simargs)
+        self.rounds.append(sims)
+        results = [distob.call(_summarize, rms, self.summary,
+                               prefer_local=False, block=False) for
+                   rms in sims._subsims]
+        results = [distob.convert_result(r) for r in results]
+        summaries = np.concatenate([np.ravel(r) for r in results])
+        return summaries[:len(indices)]
+
+    @property
+    def points(self):
+        if self._points is None:
+            self.compute()
+        return self._points
+
+    @property
+    def summaries(self):
+        if self._summaries is None:
+            self.compute()
+        return self._summaries
+
+
+def _summarize(sims, summary):
+    """Summary of the output of each simulation of a MultipleSim"""
+    return np.array([summary(s.output) for s in sims], dtype=np.float64)
+
+
+def _adaptive_refinement(shape, evaluate, levels, threshold=None):
+    """Schedule evaluations of a function on a lattice, refining the cells
+    across which its value changes sharply.
+
+    Points are identified by their integer indices on the finest lattice
+    (the coarse lattice of the given shape, with each cell divided
+    2**levels times along each axis).
+
+    Args:
+      shape (sequence of int): number of coarse lattice values on each axis.
+      evaluate (callable): function taking a list of points (index tuples)
+        and returning an array of the value at each, for one round.
+      levels (int): maximum number of times to subdivide a cell.
+      threshold (Number, optional): subdivide a cell if the values at its
+        corners differ by more than this. If None, uses one tenth of the
+        range of the values on the coarse lattice.
+
+    Returns:
+      (indices, values) where indices is an int array of shape (n, ndim)
+      giving all points that were evaluated, in order, and values the value
+      at each.
+    """
+    ndim = len(shape)
+    size = 2**levels
+    points = list(itertools.product(*[range(0, size*(m - 1) + 1, size) for
+                                      m in shape]))
+    values = list(evaluate(points))
+    computed = dict(zip(points, values))
+    if threshold is None:
+        threshold = 0.1 * (np.nanmax(values) - np.nanmin(values))
+    cells = list(itertools.product(*[range(0, size*(m - 1), size) for
+                                     m in shape]))
+    corners = list(itertools.product((0, 1), repeat=ndim))
+    for level in range(levels):
+        half = size // 2
+        new_cells = []
+        new_points = []
+        for cell in cells:
+            v = [computed[tuple(c + size*o for c, o in zip(cell, offset))] for
+                 offset in corners]
+            if not np.nanmax(v) - np.nanmin(v) > threshold:
+                continue
+            for offset in corners:
+                new_cells.append(tuple(c + half*o for c, o in
+                                       zip(cell, offset)))
+            for offset in itertools.product((0, 1, 2), repeat=ndim):
+                p = tuple(c + half*o for c, o in zip(cell, offset))
+                if p not in computed:
+                    computed[p] = None
+                    new_points.append(p)
+        if not new_points:
+            break
+        new_values = list(evaluate(new_points))
+        computed.update(zip(new_points, new_values))
+        points.extend(new_points)
+        values.extend(new_values)
+        cells = new_cells
+        size = half
+    return (np.array(points, dtype=int).reshape((-1, ndim)),
+            np.array(values, dtype=np.float64))
+
+
+class ContinuationSim(MultipleSim):
+    """Simulations of a model stepping through an ordered sequence of values
+    of one parameter, each one starting from the final state of the one
+    before, on a single host.
+
+    Only the first simulation integrates the full initial transient. Each
+    later one is a small step in parameter space from an attractor that has
+    already been reached, so it needs only a short warmup. Sweeping the
+    values up and then back down shows any hysteresis directly: where the
+    system is multistable, the two sweeps follow different attractors.
+
+    Like a list, indexing the object with [i] gives access to the ith simulation
+
+    Attributes:
+      parameter (str): name of the parameter that is varied
+      values (array): parameter value of each simulation, in the order they
+        were simulated (for sweep='both', up and then back down)
+      timeseries: resulting timeseries: all variables of all simulations
+      output: resulting timeseries: output variables of all simulations
+    """
+    def __init__(self, system, parameter, values, T=60.0, dt=0.005,
+                 integrator=None, warmup=0.0, continuation_warmup=None,
+                 sweep='up', seed=None, cache=None):
+        """
+        Args:
+          system (Model): The dynamical system to simulate. (Either a Model
+            class or a Model instance.) The first simulation starts from its
+            initial state y0.
+
+          parameter (str): name of the parameter to vary. (For a NetworkModel
+            that has no such attribute itself, the parameter is set on each
+            of its submodels, and the network is built again from them.)
+
+          values (sequence): ordered parameter values to step through.
+
+          T (optional): total length of time to simulate in the first
+            simulation, in seconds. Each simulation records T - warmup
+            seconds.
+
+          dt (optional): timestep for numerical integration.
+
+          integrator (callable, optional): Which numerical integration
+            algorithm to use. If None, the model's default algorithm will be
+            used.
+
+          warmup (optional): length of initial transient to integrate without
+            recording in the first simulation, in seconds.
+
+          continuation_warmup (optional): length of transient to integrate
+            without recording in each later simulation, which starts from the
+            previous final state. Defaults to warmup/10. (The time series of
+            the later simulations then run from continuation_warmup, but are
+            aligned with the first in `timeseries` and `output`.)
+
+          sweep (str, optional): 'up' to step through the values in the order
+            given, 'down' for the reverse order, or 'both' for the order given
+            followed by the reverse order (to look for hysteresis).
+
+          seed (int, SeedSequence or sequence, optional): If given, each
+            simulation draws its random numbers from its own independent
+            stream, seeded by a child spawned from this seed. (see
+            `MultipleSim`)
+
+          cache (str or ResultCache, optional): directory of cached results
+            (see `Simulation`). Each simulation is cached separately, under
+            the state it starts from, so a repeated sweep is read from the
+            cache.
+        """
+        if sweep not in ('up', 'down', 'both'):
+            raise SimValueError("sweep should be 'up', 'down' or 'both'")
+        if isinstance(system, type):
+            system = system()
+        values = np.ravel(values)
+        if sweep == 'down':
+            values = values[::-1]
+        elif sweep == 'both':
+            values = np.concatenate((values, values[::-1]))
+        if continuation_warmup is None:
+            continuation_warmup = warmup / 10.0
+        self.T = T
+        self.dt = dt
+        self.ensemble = False
+        self.parameter = parameter
+        self.values = values
+        self.seeds = _spawn_seeds(seed, len(values))
+        self.sims = []
+        for i, value in enumerate(values):
+            model = _set_parameter(copy.deepcopy(system), parameter, value)
+            if i == 0:
+                sim = Simulation(model, T, dt, integrator, warmup=warmup,
+                                 seed=self.seeds[i], cache=cache)
+            else:
+                # record the same length of time after a shorter warmup
+                sim = Simulation(model, T - warmup + continuation_warmup, dt,
+                                 integrator, warmup=continuation_warmup,
+                                 seed=self.seeds[i], cache=cache)
+            self.sims.append(sim)
+
+    def compute(self):
+        y = None
+        for s in self.sims:
+            if y is not None:
+                s.system.y0 = y
+            s.compute()
+            y = s._final_state
+
+    def resume(self):
+        raise SimValueError('ContinuationSim does not save checkpoints')
+
+    def _node_labels(self):
+        return ['%s=%g' % (self.parameter, v) for v in self.values]
+
+
+def _sampled_networks(model, repeat):
+    """Make `repeat` copies of a network, each with new, non-identical
+    instances of its submodels (drawing those of each class for all the
+    copies at once)"""
+    classes = [type(m) for m in model.submodels]
+    pools = dict((c, iter(c.sample(repeat * classes.count(c)))) for
+                 c in set(classes))
+    return [_rebuild_network(model, [next(pools[c]) for c in classes]) for
+            i in range(repeat)]
+
+
+def _rebuild_network(model, submodels):
+    """Construct a network like `model` (with the same adjacency matrix,
+    coupling, delays etc.) from the given submodels.
+
+    Raises:
+      SimValueError: if the network is of a subclass with its own
+        constructor, and was made with arguments that it may not accept
+    """
+    cls = type(model)
+    if cls.__init__ is NetworkModel.__init__:
+        return cls(submodels, model.network, *model._arguments)
+    independent_noise = model._arguments[1]
+    if any(a is not None for a in model._arguments[:1] + model._arguments[2:]):
+        raise SimValueError(
+            """%s has its own constructor, so it cannot be rebuilt from new
+            submodels""" % cls.__name__)
+    return cls(submodels, model.network, independent_noise=independent_noise)
+
+
+def _set_parameter(model, name, value):
+    """Set a parameter of a model. For a NetworkModel without that parameter,
+    set it on every submodel, then build the network again from them (as it
+    derives its noise, Jacobian etc. from the submodels when constructed).
+
+    Returns:
+      the model, or for a network the new NetworkModel
+
+    Raises:
+      SimValueError: if the network is of a subclass that cannot be rebuilt
+    """
+    if isinstance(model, NetworkModel) and not hasattr(model, name):
+        for m in model.submodels:
+            setattr(m, name, value)
+        network = _rebuild_network(model, model.submodels)
+        network.y0 = model.y0
+        network.output_nodes = model.output_nodes
+        return network
+    setattr(model, name, value)
+    return model
 
 
 def newsim(f, G, y0, name='NewModel', modelType=ItoModel, T=60.0, dt=0.005, repeat=1, identical=True):
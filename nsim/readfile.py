@@ -10,12 +10,14 @@ functions:
   `timeseries_from_mat()` load a Timeseries from a MATLAB .mat file
   `timeseries_from_file()` load a Timeseries from many file types
   `save_mat()`  save a Timeseries to a MATLAB .mat file
+  `timeseries_from_memmap()` open simulation results saved in a memmap file
 """
 
 from __future__ import absolute_import
 from nsim import Timeseries, Error
 import numpy as np
 from os import path
+import json
 
 
 def timeseries_from_mat(filename, varname=None, fs=1.0):
@@ -58,6 +60,75 @@ def save_mat(ts, filename):
     return
 
 
+def timeseries_from_memmap(filename, mode='r'):
+    """Open simulation results that were written to a memory-mapped file
+    (e.g. by `Simulation(..., filename=filename)`), without reading the data
+    into memory.
+
+    The data are in `filename` as a raw array. The shape, dtype, time points
+    and labels are in a small metadata file named `filename` + '.json'
+
+    Args:
+      filename (str): the data file
+      mode (str, optional): 'r' for read only access (default) or 'r+' to
+        allow modifying the data in the file.
+
+    Returns:
+      Timeseries (backed by the file)
+    """
+    ar, info = _open_memmap(filename, mode)
+    tspan = info['t0'] + info['dt'] * np.arange(ar.shape[0])
+    return Timeseries(ar, tspan, info['labels'])
+
+
+def _open_memmap(filename, mode='r'):
+    """Open an existing memmap results file.
+
+    Returns:
+      (np.memmap, dict of metadata)
+    """
+    if not path.isfile(filename):
+        raise Error("file not found: '%s'" % filename)
+    with open(filename + '.json') as f:
+        info = json.load(f)
+    ar = np.memmap(filename, dtype=np.dtype(info['dtype']), mode=mode,
+                   shape=tuple(info['shape']))
+    return ar, info
+
+
+def _create_memmap(filename, shape, dtype, t0, dt, labels):
+    """Create a file of the given shape and dtype, and its metadata file, for
+    evenly spaced results starting at time t0 with timestep dt.
+
+    Returns:
+      np.memmap open for writing
+    """
+    info = {'shape': list(shape),
+            'dtype': np.dtype(dtype).str,
+            't0': float(t0),
+            'dt': float(dt),
+            'labels': labels}
+    with open(filename + '.json', 'w') as f:
+        json.dump(info, f)
+    return np.memmap(filename, dtype=dtype, mode='w+', shape=shape)
+
+
+def _resize_memmap(filename, shape):
+    """Change the shape of an existing memmap results file, growing the file
+    in place if needed. (Only the length of axis 0 should be changed.)
+
+    Returns:
+      np.memmap open for writing
+    """
+    with open(filename + '.json') as f:
+        info = json.load(f)
+    info['shape'] = list(shape)
+    with open(filename + '.json', 'w') as f:
+        json.dump(info, f)
+    return np.memmap(filename, dtype=np.dtype(info['dtype']), mode='r+',
+                     shape=shape)
+
+
 def timeseries_from_file(filename):
     """Load a multi-channel Timeseries from any file type supported by `biosig`
 
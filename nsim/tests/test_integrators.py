@@ -0,0 +1,355 @@
+"""Tests for the batch integration algorithms in nsim.integrators
+"""
+
+import pytest
+import nsim
+from nsim import integrators
+import numpy as np
+import copy
+import scipy.linalg
+import sdeint
+
+
+def test_batch_shape():
+    y0 = np.array([[1.0, 2.0, 3.0], [0.0, 0.0, 0.0]])
+    tspan = np.arange(0.0, 1.0, 0.01)
+    f = lambda y, t: -y
+    G = lambda y, t: np.array([[0.1], [0.2]])
+    for integrator in (integrators.itoEuler, integrators.itoSRI2,
+                       integrators.stratHeun):
+        y = integrator(f, G, y0, tspan)
+        assert(y.shape == (len(tspan), 2, 3))
+        assert(np.all(y[0] == y0))
+    y = integrators.odeint(f, y0, tspan)
+    assert(y.shape == (len(tspan), 2, 3))
+    assert(np.allclose(y[-1], y0 * np.exp(-tspan[-1]), rtol=1e-5))
+
+
+def test_given_increments():
+    y0 = np.array([1.0, 0.5])
+    tspan = np.arange(0.0, 1.0, 0.01)
+    f = lambda y, t: -y
+    G = lambda y, t: np.array([[0.1, 0.0], [0.2, 0.3]])
+    dW = np.random.normal(0.0, 0.1, (len(tspan) - 1, 2))
+    y = integrators.itoEuler(f, G, y0, tspan, dW)
+    expected = sdeint.itoEuler(f, G, y0, tspan, dW=dW)
+    assert(np.allclose(y, expected))
+
+
+def test_block_diagonal():
+    blocks = [np.array([[0.1], [0.2]]), np.zeros((1, 0)),
+              np.array([[0.3, 0.4]])]
+    y0 = np.array([1.0, 0.5, 2.0, 1.0])
+    tspan = np.arange(0.0, 1.0, 0.01)
+    f = lambda y, t: -y
+    G = lambda y, t: integrators.BlockDiagonal(blocks)
+    dense = G(y0, 0.0).toarray()
+    assert(dense.shape == (4, 3))
+    assert(np.all(dense[:2, 0] == [0.1, 0.2]) and np.all(dense[3, 1:] == [0.3, 0.4]))
+    dW = np.random.normal(0.0, 0.1, (len(tspan) - 1, 3))
+    for integrator in (integrators.itoEuler, integrators.itoSRI2,
+                       integrators.stratHeun):
+        y = integrator(f, G, y0, tspan, dW)
+        assert(np.allclose(y, integrator(f, lambda y, t: dense, y0, tspan, dW)))
+    stacked = integrators.BlockDiagonal(np.random.normal(size=(3, 2, 2)))
+    dW = np.random.normal(size=6)
+    assert(np.allclose(stacked.dot(dW), stacked.toarray().dot(dW)))
+
+
+def test_noise_structure():
+    y0 = np.array([1.0, 0.5])
+    tspan = np.arange(0.0, 1.0, 0.01)
+    f = lambda y, t: -y
+    diag = lambda y, t: 0.1*y
+    dW = np.random.normal(0.0, 0.1, (len(tspan) - 1, 2))
+    for integrator in (integrators.itoEuler, integrators.itoSRI2,
+                       integrators.stratHeun):
+        y = integrator(f, diag, y0, tspan, dW, noise='diagonal')
+        expected = integrator(f, lambda y, t: np.diag(diag(y, t)), y0, tspan,
+                              dW)
+        assert(np.allclose(y, expected))
+        G = lambda y, t: np.array([[0.1, 0.0], [0.2, 0.3]])
+        y = integrator(f, G, y0, tspan, dW, noise='additive')
+        assert(np.allclose(y, integrator(f, G, y0, tspan, dW)))
+    with pytest.raises(ValueError):
+        integrators.itoEuler(f, G, y0, tspan, noise='diagonal')
+
+
+class Multiplicative(nsim.ItoModel):
+    y0 = np.array([1.0, 2.0])
+    noise = 'diagonal'
+
+    def f(self, y, t):
+        return -y
+
+    def G(self, y, t):
+        return 0.1*y
+
+
+def test_diagonal_sri2():
+    tspan = np.arange(0.0, 1.0, 0.01)
+    f = lambda y, t: -y
+    calls = []
+    def g(y, t):
+        calls.append(t)
+        return 0.5*np.sin(y)
+    y0 = np.array([1.0, 2.0, 3.0])
+    dW = np.random.normal(0.0, 0.1, (len(tspan) - 1, 3))
+    y = integrators.itoSRI2(f, g, y0, tspan, dW, noise='diagonal')
+    # G is never formed as a matrix, and is evaluated 3 times per step
+    assert(len(calls) - 3*(len(tspan) - 1) <= 2)
+    G = lambda y, t: np.diag(0.5*np.sin(y))
+    expected = integrators.itoSRI2(f, G, y0, tspan, dW)
+    assert(np.allclose(y, expected))
+
+
+def test_block_diagonal_sri2():
+    tspan = np.arange(0.0, 1.0, 0.01)
+    f = lambda y, t: -y
+    y0 = np.arange(1.0, 7.0)
+    # one Wiener process for each block: no Levy areas are needed, so the
+    # results equal those of the dense matrix for the same increments
+    G1 = lambda y, t: integrators.BlockDiagonal(
+            0.3*np.sin(y).reshape((3, 2, 1)))
+    dW = np.random.normal(0.0, 0.1, (len(tspan) - 1, 3))
+    y = integrators.itoSRI2(f, G1, y0, tspan, dW)
+    dense = lambda y, t: G1(y, t).toarray()
+    assert(np.allclose(y, integrators.itoSRI2(f, dense, y0, tspan, dW)))
+    # blocks of equal shape, or as a list, draw the same numbers
+    def blocks(y):
+        Y = 0.2*np.cos(y).reshape((3, 2))
+        return np.stack([Y, Y[:, ::-1]], axis=-1) # (3, 2, 2)
+    G2 = lambda y, t: integrators.BlockDiagonal(blocks(y))
+    G3 = lambda y, t: integrators.BlockDiagonal(list(blocks(y)))
+    y2 = integrators.itoSRI2(f, G2, y0, tspan, rng=np.random.default_rng(4))
+    y3 = integrators.itoSRI2(f, G3, y0, tspan, rng=np.random.default_rng(4))
+    assert(np.allclose(y2, y3))
+
+
+def test_network_noise_not_dense(monkeypatch):
+    def fail(self, *args):
+        raise AssertionError('dense noise matrix formed')
+    monkeypatch.setattr(integrators.BlockDiagonal, 'toarray', fail)
+    monkeypatch.setattr(integrators.BlockDiagonal, '__array__', fail)
+    net = nsim.NetworkModel([Coupled() for i in range(3)], np.ones((3, 3)),
+                            coupling_function=lambda s, t, w: 0.1*w*s)
+    assert(net.noise == 'general')
+    assert(nsim.nsim._sde_integrator(net) is integrators.itoSRI2)
+    for seed in (None, 2):
+        sim = nsim.Simulation(net, T=1.0, dt=0.01, seed=seed)
+        assert(np.all(np.isfinite(np.asarray(sim.timeseries))))
+
+
+def test_declared_noise():
+    sim = nsim.Simulation(Multiplicative(), T=1.0, dt=0.01)
+    assert(sim.timeseries.shape == (101, 2))
+    net = nsim.NetworkModel([Multiplicative(), nsim.models.OU()],
+                            np.zeros((2, 2)), coupling_function=
+                            lambda source_y, target_y, weight: 0*target_y)
+    assert(net.nnoises == 3 and net.noise == 'general')
+    assert(np.all(net.G(net.y0, 0.0)[:2, :2] == np.diag([0.1, 0.2])))
+    ou = nsim.NetworkModel([nsim.models.OU() for i in range(3)],
+                           np.zeros((3, 3)))
+    assert(ou.noise == 'additive')
+    sim = nsim.Simulation(ou, T=1.0, dt=0.01)
+    assert(sim.timeseries.shape == (101, 1, 3))
+
+
+def test_ensemble():
+    systems = [nsim.models.OU() for i in range(4)]
+    sims = nsim.nsim.MultipleSim(systems, T=1.0, dt=0.01, ensemble=True)
+    sims.compute()
+    assert(sims.output.shape == (101, 1, 4))
+    # realizations receive independent noise
+    out = np.asarray(sims.output)
+    assert(not np.allclose(out[:, :, 0], out[:, :, 1]))
+    systems[1].lam = -2.0
+    with pytest.raises(nsim.SimValueError):
+        nsim.nsim.MultipleSim(systems, T=1.0, dt=0.01, ensemble=True)
+
+
+class LinearDelay(nsim.DDEModel):
+    """dy/dt = -y(t - 1), with history y = 1"""
+    y0 = np.array([1.0])
+    delays = (1.0,)
+
+    def f(self, y, t, ylag):
+        return -ylag[0]
+
+
+def test_dde():
+    sim = nsim.Simulation(LinearDelay, T=2.0, dt=0.05)
+    ts = np.asarray(sim.timeseries)[:, 0]
+    t = sim.timeseries.tspan
+    exact = np.where(t <= 1.0, 1.0 - t, 1.0 - t + 0.5*(t - 1.0)**2)
+    assert(np.allclose(ts, exact, atol=1e-8))
+    assert(sim.system._history.size == 22)
+    # integrating in blocks continues from the stored history
+    blocks = nsim.Simulation(LinearDelay, T=2.0, dt=0.05, stride=2)
+    blocks._block_steps = lambda: 6
+    assert(np.allclose(np.asarray(blocks.timeseries)[:, 0], ts[::2]))
+    with pytest.raises(ValueError):
+        nsim.Simulation(LinearDelay, T=2.0, dt=2.0).compute()
+
+
+def test_linear_exact():
+    A = np.array([[-1.0, 0.5], [0.0, -2.0]])
+    y0 = np.array([1.0, 2.0])
+    tspan = np.arange(0.0, 5.0, 0.5)
+    # without noise the solution is exact at any time step
+    y = integrators.itoLinear(A, np.zeros((2, 1)), y0, tspan)
+    expected = np.array([scipy.linalg.expm(A*t).dot(y0) for t in tspan])
+    assert(np.allclose(y, expected))
+    # OU ensemble with a large time step has the stationary variance
+    systems = [nsim.models.OU() for i in range(2000)]
+    sims = nsim.nsim.MultipleSim(systems, T=20.0, dt=2.0, ensemble=True)
+    sims.compute()
+    out = np.asarray(sims.output)
+    stationary = 0.8**2 / 2.0
+    assert(np.isclose(np.var(out[-5:]), stationary, rtol=0.1))
+    # cached transition is recomputed when a parameter changes
+    ou = nsim.models.OU()
+    ou.integrate(tspan)
+    ou.lam = -2.0
+    Phi = ou._cached_transition(0.5)[0]
+    assert(np.isclose(Phi[0, 0], np.exp(-1.0)))
+
+
+def test_parameter_ensemble():
+    # a batch of OU systems with different parameters, integrated together
+    lams = np.array([-0.5, -1.0, -2.0, -4.0])
+    sigmas = np.array([0.0, 0.0, 0.5, 1.0])
+    systems = []
+    for lam, sigma in zip(lams, sigmas):
+        ou = nsim.models.OU()
+        ou.lam, ou.sigma, ou.y0 = lam, sigma, np.array([1.0])
+        systems.append(ou)
+    with pytest.raises(nsim.SimValueError):
+        nsim.nsim.MultipleSim(systems, T=1.0, dt=0.1, ensemble=True,
+                              parameters=['lam'])
+    sims = nsim.nsim.MultipleSim(systems, T=1.0, dt=0.1, ensemble=True,
+                                 parameters=['lam', 'sigma'])
+    sims.compute()
+    out = np.asarray(sims.output)
+    t = sims.timeseries.tspan
+    assert(np.allclose(out[:, 0, :2], np.exp(np.outer(t, lams[:2]))))
+    # stationary variances of the noisy systems
+    systems = [nsim.models.OU() for i in range(2000)]
+    for i, ou in enumerate(systems):
+        ou.lam = lams[i % 4]
+    sims = nsim.nsim.MultipleSim(systems, T=20.0, dt=2.0, ensemble=True,
+                                 parameters=['lam'])
+    sims.compute()
+    out = np.asarray(sims.output)[-5:, 0, :]
+    for k in range(4):
+        stationary = 0.8**2 / (-2.0*lams[k])
+        assert(np.isclose(np.var(out[:, k::4]), stationary, rtol=0.15))
+    # f and G of the batch also suit the generic SDE integrators
+    ou = nsim.models.OU()
+    ou.lam, ou.sigma = lams, np.zeros(4)
+    y = integrators.itoEuler(ou.f, ou.G, np.ones((1, 4)), t, noise='additive')
+    expected = (1.0 + 0.1*lams)**np.arange(len(t))[:, np.newaxis]
+    assert(np.allclose(y[:, 0, :], expected))
+
+
+class MatrixNoise(nsim.ItoModel):
+    y0 = np.array([1.0])
+    vectorized = True
+    lam = -1.0
+    sigma = 0.5
+
+    def f(self, y, t):
+        return self.lam * y
+
+    def G(self, y, t):
+        res = np.zeros((1, 1))
+        res[0, 0] = self.sigma # cannot hold an array of values
+        return res
+
+
+def test_batchable_parameters():
+    from nsim.nsim import _broadcasts
+    systems = [MatrixNoise() for i in range(3)]
+    for m, value in zip(systems, [-1.0, -2.0, -3.0]):
+        m.lam = value
+    assert(_broadcasts(systems, ['lam']))
+    for m, value in zip(systems, [0.1, 0.2, 0.3]):
+        m.sigma = value
+    assert(not _broadcasts(systems, ['lam', 'sigma']))
+    # a model that is not vectorized is never batched
+    assert(not _broadcasts([Multiplicative() for i in range(3)], []))
+
+
+def test_seeded_streams():
+    tspan = np.arange(0.0, 1.0, 0.01)
+    f = lambda y, t: -y
+    G = lambda y, t: 0.1*np.array([[1.0, y[0]], [y[1], 1.0]])
+    y0 = np.array([1.0, 0.5])
+    for integrator in (integrators.itoEuler, integrators.itoSRI2,
+                       integrators.stratHeun):
+        y1 = integrator(f, G, y0, tspan, rng=np.random.default_rng(3))
+        y2 = integrator(f, G, y0, tspan, rng=np.random.default_rng(3))
+        assert(np.array_equal(y1, y2))
+        # each realization of a batch draws from its own stream
+        ones = np.ones(3)
+        Gb = lambda y, t: 0.1*np.array([[ones, y[0]], [y[1], ones]])
+        rngs = [np.random.default_rng(s) for s in (1, 2, 3)]
+        yb = integrator(f, Gb, np.tile(y0[:, np.newaxis], 3), tspan, rng=rngs)
+        assert(np.allclose(yb[..., 2], y1))
+        assert(not np.allclose(yb[..., 1], y1))
+    # a seeded simulation can be repeated exactly
+    sims = [nsim.Simulation(Multiplicative(), T=1.0, dt=0.01, seed=7) for
+            i in range(2)]
+    assert(np.array_equal(sims[0].timeseries, sims[1].timeseries))
+    # realization i of a seeded ensemble is simulation i run on its own
+    systems = [nsim.models.OU() for i in range(4)]
+    batch = nsim.nsim.MultipleSim(systems, T=1.0, dt=0.1, ensemble=True,
+                                  seed=11)
+    batch.compute()
+    alone = nsim.Simulation(nsim.models.OU(), T=1.0, dt=0.1,
+                            seed=batch.seeds[2])
+    assert(np.allclose(np.asarray(batch.output)[:, 0, 2],
+                       np.asarray(alone.output)[:, 0]))
+    again = nsim.Simulation(nsim.models.OU(), T=1.0, dt=0.1,
+                            seed=np.random.SeedSequence(11).spawn(4)[2])
+    assert(np.array_equal(again.output, alone.output))
+
+
+class Coupled(nsim.ItoModel):
+    y0 = np.array([1.0, 0.5])
+    vectorized = True
+
+    def f(self, y, t):
+        return -y
+
+    def G(self, y, t):
+        ones = np.ones_like(y[0])
+        return 0.2*np.array([[ones, y[0]], [y[1], ones]])
+
+
+def test_ensemble_member_reproduced(monkeypatch):
+    # with general noise of two Wiener processes, itoSRI2 needs Levy areas
+    batch = nsim.nsim.MultipleSim([Coupled() for i in range(5)], T=2.0,
+                                  dt=0.01, ensemble=True, seed=5)
+    batch.compute()
+    assert(batch._batchsim.system._integrator is integrators.itoSRI2)
+    # the block length does not change which numbers each stream gives
+    monkeypatch.setattr(integrators, 'block_size', 6)
+    alone = nsim.Simulation(Coupled(), T=2.0, dt=0.01, seed=batch.seeds[3])
+    assert(np.allclose(np.asarray(batch.timeseries)[..., 3],
+                       np.asarray(alone.timeseries), rtol=1e-12, atol=1e-12))
+
+
+def test_seed_not_inherited():
+    m = nsim.models.OU()
+    nsim.Simulation(m, T=1.0, dt=0.1, seed=1).compute()
+    assert(m.rng is None)
+    sims = nsim.nsim.MultipleSim([copy.deepcopy(m) for i in range(3)],
+                                 T=1.0, dt=0.1)
+    out = np.asarray(sims.output)
+    assert(not np.allclose(out[..., 0], out[..., 1]))
+    # copies of a model that has its own generator would share its stream
+    m.rng = np.random.default_rng(1)
+    with pytest.raises(nsim.SimValueError):
+        nsim.nsim.MultipleSim([copy.deepcopy(m) for i in range(3)],
+                              T=1.0, dt=0.1)
@@ -0,0 +1,267 @@
+"""Tests for NetworkModel
+"""
+
+import pytest
+import nsim
+import copy
+import pickle
+import numpy as np
+
+
+class Ramp(nsim.ODEModel):
+    y0 = np.array([0.0])
+
+    def f(self, y, t):
+        return np.ones_like(y)
+
+    def coupling(self, source_y, target_y, weight):
+        return weight * source_y
+
+
+class Still(nsim.ODEModel):
+    y0 = np.array([0.0])
+
+    def f(self, y, t):
+        return np.zeros_like(y)
+
+
+class NoisyDelay(nsim.DelayItoModel):
+    y0 = np.array([0.0, 1.0])
+    delays = (0.02,)
+
+    def f(self, y, t, ylag):
+        return -ylag[0]
+
+    def G(self, y, t):
+        return np.array([[0.1], [0.0]])
+
+    def coupling(self, source_y, target_y, weight):
+        return weight * source_y
+
+
+def test_transmission_delay():
+    network = np.array([[0.0, 1.0], [0.0, 0.0]])
+    model = nsim.NetworkModel([Ramp(), Still()], network, delays=0.5)
+    assert(model.delays == (0.5,))
+    sim = nsim.Simulation(model, T=2.0, dt=0.01)
+    ts = np.asarray(sim.timeseries)
+    assert(np.isclose(ts[-1, 0, 1], 0.5 * 1.5**2))
+
+
+def test_delay_ito_network():
+    network = np.array([[0.0, 0.5, 0.0], [0.0, 0.0, 0.5], [0.5, 0.0, 0.0]])
+    model = nsim.NetworkModel([NoisyDelay() for i in range(3)], network,
+                              delays=0.05)
+    assert(model.delays == (0.02, 0.05))
+    assert(model.integrator[0] is nsim.integrators.itoEulerDelay)
+    sim = nsim.Simulation(model, T=1.0, dt=0.005, stride=4)
+    assert(sim.timeseries.shape == (51, 2, 3))
+    assert(np.all(np.isfinite(np.asarray(sim.timeseries))))
+
+
+class Stiff(nsim.ODEModel):
+    y0 = np.array([1.0, 0.0])
+
+    def f(self, y, t):
+        return np.array([-1000.0*y[0] + y[1], -y[1]])
+
+    def jac(self, y, t):
+        return np.array([[-1000.0, 1.0], [0.0, -1.0]])
+
+    def coupling(self, source_y, target_y, weight):
+        return weight * np.array([0.0, np.tanh(source_y[0])])
+
+    def coupling_jac(self, source_y, target_y, weight):
+        Js = np.array([[0.0, 0.0], [weight / np.cosh(source_y[0])**2, 0.0]])
+        return Js, np.zeros((2, 2))
+
+
+def test_sampled_networks():
+    network = np.array([[0.0, 0.5, 0.0], [0.0, 0.0, 0.5], [0.5, 0.0, 0.0]])
+    model = nsim.NetworkModel([NoisyDelay() for i in range(3)], network,
+                              delays=0.05)
+    # the repetitions of a non-identical RepeatedSim
+    systems = nsim.nsim._sampled_networks(model, 2)
+    for m in systems:
+        assert(m.delays == model.delays)
+        assert(m.integrator[0] is nsim.integrators.itoEulerDelay)
+        assert(all(s not in model.submodels for s in m.submodels))
+    batch = lambda source_Y, target_Y, weights: weights*source_Y
+    batched = nsim.NetworkModel([Ramp() for i in range(3)], network,
+                                coupling_batch=batch)
+    assert(nsim.nsim._sampled_networks(batched, 1)[0]._coupling_batch ==
+           (batch,))
+
+
+def test_network_jacobian():
+    network = np.array([[0.0, 2.0, 0.0], [0.0, 0.0, 0.5], [1.0, 0.0, 0.0]])
+    model = nsim.NetworkModel([Stiff() for i in range(3)], network)
+    y = np.random.normal(size=model.dimension)
+    eps = 1e-6
+    fd = np.array([(model.f(y + eps*e, 0.0) - model.f(y - eps*e, 0.0)) /
+                   (2*eps) for e in np.eye(model.dimension)]).T
+    J = model.jac(y, 0.0)
+    assert(np.allclose(J.toarray(), fd, atol=1e-5))
+    assert(np.all(model.jac_sparsity.toarray()[J.toarray() != 0]))
+    sim = nsim.Simulation(copy.deepcopy(model), T=1.0, dt=0.01)
+    bdfsim = nsim.Simulation(model, T=1.0, dt=0.01,
+                             integrator=nsim.integrators.bdf)
+    assert(np.allclose(np.asarray(bdfsim.timeseries),
+                       np.asarray(sim.timeseries), atol=1e-5))
+
+
+def test_homogeneous_network():
+    n = 6
+    network = np.random.uniform(size=(n, n)) * (np.random.uniform(
+                                                    size=(n, n)) < 0.5)
+    m = nsim.models.JansenRit()
+    for independent_noise in (True, False):
+        model = nsim.NetworkModel([copy.deepcopy(m) for i in range(n)],
+                                  network, independent_noise=independent_noise)
+        assert(model._homogeneous)
+        y = model.y0 + np.random.normal(size=model.dimension)
+        f, G = model.f(y, 0.0), model.G(y, 0.0)
+        if independent_noise:
+            assert(np.all(model._block_G(y, 0.0).toarray() == G))
+        model._homogeneous = False
+        assert(np.allclose(f, model.f(y, 0.0)))
+        assert(np.allclose(G, model.G(y, 0.0)))
+    different = nsim.NetworkModel([nsim.models.JansenRit() for i in range(n)],
+                                  network)
+    different.submodels[1].g1 += 1.0
+    assert(not nsim.NetworkModel(different.submodels, network)._homogeneous)
+
+
+def test_sparse_network():
+    from scipy import sparse
+    n = 20
+    network = np.random.uniform(size=(n, n)) * (np.random.uniform(
+                                                    size=(n, n)) < 0.2)
+    delays = np.where(np.random.uniform(size=(n, n)) < 0.5, 0.1, 0.2)
+    dense = nsim.NetworkModel([Stiff() for i in range(n)], network)
+    sp = nsim.NetworkModel([Stiff() for i in range(n)],
+                           sparse.csr_matrix(network))
+    y = np.random.normal(size=dense.dimension)
+    assert(np.allclose(sp.f(y, 0.0), dense.f(y, 0.0)))
+    assert(np.allclose(sp.jac(y, 0.0).toarray(), dense.jac(y, 0.0).toarray()))
+    assert((sp.jac_sparsity != dense.jac_sparsity).nnz == 0)
+    dense = nsim.NetworkModel([Ramp() for i in range(n)], network, delays=delays)
+    sp = nsim.NetworkModel([Ramp() for i in range(n)],
+                           sparse.csr_matrix(network),
+                           delays=sparse.csr_matrix(delays))
+    assert(sp.delays == dense.delays)
+    ylag = np.random.normal(size=(len(dense.delays), dense.dimension))
+    assert(np.allclose(sp.f(y, 0.0, ylag), dense.f(y, 0.0, ylag)))
+
+
+class Oscillator(nsim.ODEModel):
+    y0 = np.array([0.0, 1.0])
+
+    def f(self, y, t):
+        return np.array([y[1], -y[0]])
+
+    def coupling(self, source_y, target_y, weight):
+        return weight * np.sin(source_y - target_y)
+
+    def coupling_batch(self, source_Y, target_Y, weights):
+        return weights * np.sin(source_Y - target_Y)
+
+
+def test_coupling_batch():
+    n = 10
+    network = np.random.uniform(size=(n, n)) * (np.random.uniform(
+                                                    size=(n, n)) < 0.5)
+    delays = np.where(np.random.uniform(size=(n, n)) < 0.5, 0.0, 0.1)
+    for d in (None, delays):
+        model = nsim.NetworkModel([Oscillator() for i in range(n)], network,
+                                  delays=d)
+        assert(model._coupling_batch is not None)
+        y = np.random.normal(size=model.dimension)
+        args = (y, 0.0)
+        if d is not None:
+            args += (np.random.normal(size=(1, model.dimension)),)
+        f = model.f(*args)
+        model._coupling_batch = None # fall back to per-edge coupling
+        assert(np.allclose(f, model.f(*args)))
+    # the default coupling also has a batch form
+    with pytest.warns(RuntimeWarning):
+        model = nsim.NetworkModel([Still() for i in range(n)], network)
+    assert(model._coupling_batch is not None)
+
+
+class Phase(nsim.ODEModel):
+    y0 = np.array([0.0])
+
+    def f(self, y, t):
+        return np.ones_like(y)
+
+    def coupling(self, source_y, target_y, weight):
+        return weight * np.sin(source_y - target_y)
+
+    def coupling_terms(self, Y):
+        U = np.concatenate([np.sin(Y), np.cos(Y)])
+        V = np.stack([np.cos(Y), -np.sin(Y)], axis=1)
+        return U, V
+
+
+def test_mean_field():
+    n = 8
+    network = (np.ones((n, n)) - np.identity(n)) * 0.3
+    model = nsim.NetworkModel([Phase() for i in range(n)], network)
+    assert(model._mean_field is not None and len(model._weights) == 0)
+    y = np.random.uniform(-np.pi, np.pi, size=n)
+    f = model.f(y, 0.0)
+    edges = nsim.NetworkModel([Phase() for i in range(n)], network,
+                              coupling_function=Phase().coupling)
+    assert(edges._mean_field is None)
+    assert(np.allclose(f, edges.f(y, 0.0)))
+    # low-rank network
+    P = np.random.normal(size=(n, 2))
+    Q = np.random.normal(size=(n, 2))
+    model = nsim.NetworkModel([Phase() for i in range(n)], (P, Q))
+    assert(np.allclose(model.f(y, 0.0), nsim.NetworkModel(
+        [Phase() for i in range(n)], P.dot(Q.T),
+        coupling_function=Phase().coupling).f(y, 0.0)))
+    # identical vectorized submodels
+    network = np.ones((n, n))
+    m = nsim.models.JansenRit()
+    model = nsim.NetworkModel([copy.deepcopy(m) for i in range(n)], network)
+    assert(model._homogeneous and model._mean_field is not None)
+    y = model.y0 + np.random.normal(size=model.dimension)
+    f = model.f(y, 0.0)
+    model._mean_field = None
+    model._init_edges(network)
+    assert(np.allclose(f, model.f(y, 0.0)))
+
+
+def test_jansen_rit_population():
+    n = 10
+    columns = [nsim.models.JansenRit() for i in range(n)]
+    for m in columns:
+        m.p_mean = np.random.uniform(200.0, 240.0)
+    sparse_network = np.random.uniform(size=(n, n)) * (np.random.uniform(
+                                                          size=(n, n)) < 0.3)
+    for network in (sparse_network, np.ones((n, n))):
+        for independent_noise in (True, False):
+            pop = nsim.models.JansenRitPopulation(
+                    columns, network, independent_noise=independent_noise)
+            model = nsim.NetworkModel(columns, network,
+                                      independent_noise=independent_noise)
+            y = model.y0 + np.random.normal(size=model.dimension)
+            assert(np.allclose(pop.f(y, 0.0), model.f(y, 0.0)))
+            assert(np.allclose(pop.G(y, 0.0), model.G(y, 0.0)))
+    sim = nsim.Simulation(nsim.models.JansenRitPopulation(3, np.ones((3, 3))),
+                          T=0.1, dt=0.001)
+    assert(sim.timeseries.shape == (101, 8, 3))
+    assert(sim.output.shape == (101, 2, 3))
+
+
+def test_jansen_rit_population_copies():
+    n = 5
+    W = np.random.uniform(size=(n, n))
+    pop = nsim.models.JansenRitPopulation(n, W)
+    model = nsim.NetworkModel([nsim.models.JansenRit() for i in range(n)], W)
+    y = model.y0 + np.random.normal(size=model.dimension)
+    expected = model.f(y, 0.0).copy()
+    for clone in (copy.deepcopy(pop), pickle.loads(pickle.dumps(pop))):
+        assert(np.allclose(clone.f(y, 0.0), expected))
@@ -0,0 +1,279 @@
+"""Tests for Simulation and related classes
+"""
+
+import pytest
+import nsim
+import numpy as np
+import numbers
+import os
+from scipy import stats
+
+
+class Decay(nsim.ODEModel):
+    y0 = np.array([1.0, 2.0])
+
+    def f(self, y, t):
+        return -y
+
+
+def test_iter_chunks():
+    sim = nsim.Simulation(Decay, T=3.0, dt=0.01)
+    chunks = list(sim.iter_chunks(0.5))
+    assert(len(chunks) == 6)
+    assert(sum(len(ts) for ts in chunks) == 301)
+    tspan = np.concatenate([ts.tspan for ts in chunks])
+    assert(np.all(np.diff(tspan) > 0))
+    ar = np.concatenate([np.asarray(ts) for ts in chunks])
+    assert(np.allclose(ar, np.asarray(sim.timeseries), atol=1e-6))
+
+
+def test_stride_output_only():
+    sim = nsim.Simulation(Decay, T=3.0, dt=0.01)
+    strided = nsim.Simulation(Decay, T=3.0, dt=0.01, stride=10)
+    assert(strided.timeseries.shape == (31, 2))
+    assert(np.allclose(strided.timeseries.tspan, sim.timeseries.tspan[::10]))
+    assert(np.allclose(np.asarray(strided.timeseries),
+                       np.asarray(sim.timeseries)[::10], atol=1e-6))
+    outsim = nsim.Simulation(Decay, T=3.0, dt=0.01, output_only=True)
+    assert(outsim.output.shape == (301, 1))
+    with pytest.raises(nsim.SimValueError):
+        outsim.timeseries
+
+
+def test_memmap(tmpdir):
+    filename = str(tmpdir.join('decay.dat'))
+    sim = nsim.Simulation(Decay, T=3.0, dt=0.01)
+    filesim = nsim.Simulation(Decay, T=3.0, dt=0.01, filename=filename)
+    assert(np.allclose(np.asarray(filesim.timeseries),
+                       np.asarray(sim.timeseries), atol=1e-6))
+    ts = nsim.timeseries_from_memmap(filename)
+    assert(not ts.flags.writeable)
+    assert(np.allclose(ts.tspan, sim.timeseries.tspan))
+    assert(np.array_equal(np.asarray(ts), np.asarray(filesim.timeseries)))
+
+
+def test_checkpoint_resume(tmpdir):
+    filename = str(tmpdir.join('ou.dat'))
+    checkpoint = str(tmpdir.join('ou.ckpt'))
+    np.random.seed(1)
+    euler = nsim.integrators.itoEuler
+    sim = nsim.Simulation(nsim.models.OU(), 4.0, 0.001, euler, 2)
+    sim._block_steps = lambda: 1000
+    expected = np.asarray(sim.timeseries).copy()
+    # interrupt a run partway through, after it has saved checkpoints
+    np.random.seed(1)
+    sim = nsim.Simulation(nsim.models.OU(), 4.0, 0.001, euler, 2,
+                          filename=filename, checkpoint=checkpoint,
+                          checkpoint_interval=0.0)
+    sim._block_steps = lambda: 1000
+    blocks = sim._integrate_blocks
+    def interrupted(*args):
+        for i, block in enumerate(blocks(*args)):
+            if i == 2:
+                raise KeyboardInterrupt
+            yield block
+    sim._integrate_blocks = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        sim.compute()
+    np.random.seed(99)
+    resumed = nsim.Simulation(nsim.models.OU(), 4.0, 0.001, euler, 2,
+                              filename=filename, checkpoint=checkpoint)
+    resumed._block_steps = lambda: 1000
+    resumed.resume()
+    assert(np.allclose(np.asarray(resumed.timeseries), expected))
+
+
+def test_extend(tmpdir):
+    euler = nsim.integrators.itoEuler
+    np.random.seed(2)
+    sim = nsim.Simulation(nsim.models.OU(), 3.0, 0.01, euler, stride=4)
+    expected = np.asarray(sim.timeseries).copy()
+    filename = str(tmpdir.join('ou.dat'))
+    for fn in (None, filename):
+        np.random.seed(2)
+        sim = nsim.Simulation(nsim.models.OU(), 1.0, 0.01, euler, stride=4,
+                              filename=fn)
+        sim.compute()
+        sim.extend(0.5)
+        sim.extend(1.5)
+        assert(sim.T == 3.0)
+        assert(np.allclose(sim.timeseries.tspan, 0.04 * np.arange(76)))
+        assert(np.allclose(np.asarray(sim.timeseries), expected))
+    assert(nsim.timeseries_from_memmap(filename).shape == expected.shape)
+
+
+def test_warmup():
+    sim = nsim.Simulation(Decay, T=3.0, dt=0.01)
+    warm = nsim.Simulation(Decay, T=3.0, dt=0.01, stride=5, warmup=1.0)
+    assert(warm.timeseries.shape == (41, 2))
+    assert(np.allclose(warm.timeseries.tspan, sim.timeseries.tspan[100::5]))
+    assert(np.allclose(np.asarray(warm.timeseries),
+                       np.asarray(sim.timeseries)[100::5], atol=1e-6))
+    chunks = list(warm.iter_chunks(1.0))
+    assert(np.isclose(chunks[0].tspan[0], 1.0))
+    with pytest.raises(nsim.SimValueError):
+        nsim.Simulation(Decay, T=3.0, dt=0.01, warmup=3.0)
+
+
+class Bistable(nsim.ODEModel):
+    """dy/dt = r + y - y**3, bistable for |r| < 2/(3 sqrt(3))"""
+    y0 = np.array([-1.0])
+    r = 0.0
+
+    def f(self, y, t):
+        return self.r + y - y**3
+
+
+def test_continuation(tmpdir):
+    values = np.linspace(-0.6, 0.6, 7)
+    sims = nsim.ContinuationSim(Bistable, 'r', values, T=10.0, dt=0.01,
+                                warmup=5.0, continuation_warmup=1.0,
+                                sweep='both')
+    sims.compute()
+    assert(len(sims) == 14)
+    assert(sims[1].warmup == 1.0)
+    final = np.asarray(sims.output)[-1, 0, :]
+    # at r = 0 the up sweep stays on the lower branch, the down sweep upper
+    assert(np.isclose(final[3], -1.0, atol=1e-3))
+    assert(np.isclose(final[10], 1.0, atol=1e-3))
+    # each run starts from the final state of the one before
+    assert(np.allclose(sims[4].system.y0, sims[3]._final_state))
+    with pytest.raises(nsim.SimValueError):
+        nsim.ContinuationSim(Bistable, 'r', values, sweep='sideways')
+    # a parameter of the submodels of a network: each run has a network
+    # built from submodels with that value
+    net = nsim.NetworkModel([Bistable(), Bistable()], np.zeros((2, 2)),
+                            coupling_function=lambda s, t, w: 0*t)
+    netsims = nsim.ContinuationSim(net, 'r', values, T=10.0, dt=0.01,
+                                   warmup=5.0, continuation_warmup=1.0)
+    netsims.compute()
+    assert(all(m.r == v for s, v in zip(netsims, values) for
+               m in s.system.submodels))
+    assert(net.submodels[0].r == 0.0)
+    assert(np.allclose(np.asarray(netsims.output)[-1, 0, 0, :], final[:7],
+                       atol=1e-3))
+    # a seeded noisy sweep can be repeated, and is then read from the cache
+    runs = [nsim.ContinuationSim(nsim.models.OU, 'sigma', [0.2, 0.4, 0.8],
+                                 T=2.0, dt=0.1, seed=3, cache=str(tmpdir))
+            for i in range(2)]
+    for r in runs:
+        r.compute()
+    assert(np.array_equal(runs[0].timeseries, runs[1].timeseries))
+    assert(len(tmpdir.listdir('*.dat')) == 3)
+    assert(not runs[1][2]._timeseries.flags.writeable)
+
+
+def test_adaptive_refinement():
+    from nsim.nsim import _adaptive_refinement
+    rounds = []
+    def step(points):
+        rounds.append(len(points))
+        x = np.array(points, dtype=np.float64) / 8.0
+        return (x[:, 0] + 0.5*x[:, 1] > 2.3).astype(np.float64)
+    indices, values = _adaptive_refinement((5, 5), step, 3)
+    assert(len(rounds) == 4)
+    assert(rounds[0] == 25)
+    # far fewer points than the uniform lattice of the same resolution
+    assert(len(indices) < 33**2 / 4)
+    assert(len(set(map(tuple, indices))) == len(indices))
+    # the boundary is resolved at the finest spacing along each row
+    x = indices / 8.0
+    for y in np.unique(x[:, 1]):
+        row = np.sort(x[x[:, 1] == y, 0])
+        if len(row) > 5:
+            crossing = 2.3 - 0.5*y
+            assert(np.min(np.abs(row - crossing)) <= 1.0/16)
+    # no refinement of a constant function
+    indices, values = _adaptive_refinement((4,), lambda p: np.zeros(len(p)), 3)
+    assert(len(indices) == 4)
+
+
+class RandomRate(nsim.ODEModel):
+    """dy/dt = -k y, with a random rate k for each instance"""
+    k = stats.uniform(1.0, 1.0)
+    y0 = np.array([1.0])
+    vectorized = True
+
+    def f(self, y, t):
+        return -self.k * y
+
+
+def test_sample():
+    models = RandomRate.sample(500)
+    assert(len(models) == 500)
+    assert(RandomRate._random_attributes() == ('k',))
+    ks = np.array([m.k for m in models])
+    assert(np.all((ks >= 1.0) & (ks <= 2.0)) and np.ptp(ks) > 0.5)
+    assert(all(type(m.k) is not type(RandomRate.k) for m in models))
+    assert(isinstance(RandomRate().k, numbers.Number))
+    # a random attribute given to the class after instances were made
+    class Shifted(RandomRate):
+        pass
+    Shifted()
+    Shifted.b = stats.uniform(-12, 4)
+    assert(-12 <= Shifted().b <= -8)
+    assert(all(-12 <= m.b <= -8 for m in Shifted.sample(5)))
+    # the names are cached until a class attribute changes
+    assert(Shifted._random_attributes() is Shifted._random_attributes())
+    del Shifted.b
+    assert(Shifted._random_attributes() == ('k',))
+    # the random parameters become arrays of the batch in ensemble mode
+    sims = nsim.nsim.MultipleSim(models[:10], T=1.0, dt=0.01, ensemble=True,
+                                 parameters=['k'])
+    sims.compute()
+    final = np.asarray(sims.output)[-1, 0, :]
+    assert(np.allclose(final, np.exp(-ks[:10]), rtol=1e-3))
+
+
+class CountedDecay(Decay):
+    _calls = 0
+
+    def integrate(self, tspan, y0=None):
+        CountedDecay._calls += 1
+        return super(CountedDecay, self).integrate(tspan, y0)
+
+
+def test_cache(tmpdir):
+    cachedir = str(tmpdir.join('cache'))
+    sim = nsim.Simulation(CountedDecay, T=2.0, dt=0.01, cache=cachedir)
+    expected = np.asarray(sim.timeseries)
+    calls = CountedDecay._calls
+    again = nsim.Simulation(CountedDecay, T=2.0, dt=0.01, cache=cachedir)
+    assert(np.array_equal(again.timeseries, expected))
+    assert(CountedDecay._calls == calls)
+    assert(not again._timeseries.flags.writeable) # mapped from the cache
+    again.extend(1.0)
+    assert(np.allclose(again._final_state, np.exp(-3.0)*Decay.y0, rtol=1e-4))
+    other = nsim.Simulation(CountedDecay, T=2.0, dt=0.02, cache=cachedir)
+    other.compute()
+    assert(CountedDecay._calls > calls)
+    # noisy systems are cached only if seeded
+    ou = nsim.models.OU
+    nsim.Simulation(ou, T=1.0, dt=0.1, cache=cachedir).compute()
+    assert(len(tmpdir.join('cache').listdir('*.dat')) == 2)
+    seeded = [nsim.Simulation(ou, T=1.0, dt=0.1, seed=5, cache=cachedir) for
+              i in range(2)]
+    for s in seeded:
+        s.compute()
+        s.extend(1.0) # continues with the same random numbers
+    assert(len(tmpdir.join('cache').listdir('*.dat')) == 3)
+    assert(np.array_equal(seeded[0].timeseries, seeded[1].timeseries))
+
+
+def test_cache_eviction(tmpdir):
+    cache = nsim.ResultCache(str(tmpdir), max_bytes=2000)
+    ar = np.zeros((100, 1))
+    keys = [cache.key('result', i) for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, ar, 0.0, 0.1, [None, None])
+        os.utime(cache._path(key), (i, i))
+    assert(cache.get(keys[0]) is not None) # now the most recently used
+    cache.put(keys[2], ar, 0.0, 0.1, [None, None])
+    assert(cache.get(keys[1]) is None)
+    assert(cache.get(keys[0]) is not None and cache.get(keys[2]) is not None)
+    assert(cache.key(nsim.models.OU()) != cache.key(nsim.models.JansenRit()))
+    # functions of the same name are told apart by their code and closures
+    assert(cache.key(lambda y: -y) != cache.key(lambda y: -2*y))
+    scaled = lambda k: (lambda y: k*y)
+    assert(cache.key(scaled(1.0)) != cache.key(scaled(2.0)))
+    assert(cache.key(scaled(1.0)) == cache.key(scaled(1.0)))
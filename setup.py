@@ -41,9 +41,9 @@ setup(
     author='Matthew J. Aburn',
     install_requires=['ipyparallel>=4.0,<5.0',
                       'distob>=0.3.2',
-                      'sdeint>=0.2.0',
-                      'numpy>=1.6',
-                      'scipy>=0.9',
+                      'sdeint>=0.3.0',
+                      'numpy>=1.17',
+                      'scipy>=1.0',
                       'matplotlib>=1.1'],
     tests_require=['tox'],
     cmdclass = {'test': Tox},